@@ -0,0 +1,329 @@
+"""The gobblers command.
+
+    gobblers simulate --games 1000 --agent mcts --workers 4 > games.jsonl
+    gobblers simulate --games 1000 --format binary --output games.gbr
+    gobblers replay games.gbr --errors-only
+    gobblers bench --games 200
+    gobblers bench --save baseline.json
+    gobblers bench play undo --baseline baseline.json --threshold 0.1
+    gobblers --stats stats.json simulate --games 100
+    gobblers serve --unix /tmp/gobblers.sock --workers 4
+    gobblers tablebase gobblers.gtb --workers 0 --work-dir /scratch
+
+Results are written one game at a time as they come in, so a run of any
+size never holds its games in memory. JSONL output has one object per line;
+binary output is a record file (see records.py). --stats counts and times
+the hot Board and Agent methods in the main process (see instrument.py).
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+from gobblers.benchmark import (
+    BENCHMARKS,
+    compare,
+    load_baseline,
+    run_benchmarks,
+    save_baseline,
+)
+from gobblers import instrument
+from gobblers.records import MAGIC, RecordWriter, iter_records
+from gobblers.replay import replay_games, replay_record_file
+from gobblers.position import ALL_IN_HAND, PIECE_SIZE, UNUSED, Position
+from gobblers.server import serve
+from gobblers.tablebase import build
+from gobblers.tournament import STRATEGIES, play_games
+
+
+def _processes(workers):
+    # 0 means every core, which the pools spell None
+    return workers or None
+
+
+def _open_output(path, binary):
+    if path == "-":
+        return sys.stdout.buffer if binary else sys.stdout
+    return open(path, "wb" if binary else "w")
+
+
+def _read_games(path):
+    """Yield the moves of every game in a record file, or in a JSONL file
+    where each line is a list of moves or an object with a "moves" list"""
+    if path != "-":
+        with open(path, "rb") as f:
+            is_records = f.read(len(MAGIC)) == MAGIC
+        if is_records:
+            yield from iter_records(path)
+            return
+
+    f = sys.stdin if path == "-" else open(path)
+    try:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                game = json.loads(line)
+            except json.JSONDecodeError:
+                raise ValueError("Not a JSON line", path, number)
+            if isinstance(game, dict):
+                game = game.get("moves")
+            if not isinstance(game, list):
+                raise ValueError("Not a list of moves", path, number)
+            yield game
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def simulate(args):
+    opponent = args.opponent or args.agent
+    results = play_games(
+        args.agent,
+        opponent,
+        args.games,
+        _processes(args.workers),
+        args.seed,
+        args.max_moves,
+    )
+    binary = args.format == "binary"
+    output = _open_output(args.output, binary)
+    try:
+        if binary:
+            with RecordWriter(output) as writer:
+                for result in results:
+                    writer.write(result.moves)
+        else:
+            for result in results:
+                output.write(json.dumps(result._asdict()) + "\n")
+    finally:
+        if args.output != "-":
+            output.close()
+    return 0
+
+
+def replay(args):
+    games = _read_games(args.path)
+    results = replay_games(games, _processes(args.workers), args.batch_size)
+    output = _open_output(args.output, False)
+    checked = invalid = 0
+    try:
+        for result in results:
+            checked += 1
+            if result.error is not None:
+                invalid += 1
+            elif args.errors_only:
+                continue
+            output.write(json.dumps(result._asdict()) + "\n")
+    finally:
+        if args.output != "-":
+            output.close()
+    print("{} games checked, {} invalid".format(checked, invalid), file=sys.stderr)
+    return 1 if invalid else 0
+
+
+def _rates(stage, games, moves, seconds):
+    return {
+        "stage": stage,
+        "games": games,
+        "moves": moves,
+        "seconds": seconds,
+        "games_per_s": games / seconds if seconds else 0.0,
+        "moves_per_s": moves / seconds if seconds else 0.0,
+    }
+
+
+def bench(args):
+    """Time playing games and replaying them, then run the corpus benchmarks
+    (see benchmark.py) and compare them with a baseline if there is one.
+
+    The games go to a temporary record file as they come in, and the replay
+    streams it back, so neither stage holds the games in memory. Only the
+    corpus benchmarks are saved and compared, as they do the same work on
+    every run."""
+    opponent = args.opponent or args.agent
+    processes = _processes(args.workers)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "games.gbr")
+        games = moves = 0
+        start = time.perf_counter()
+        with RecordWriter(path) as writer:
+            for result in play_games(
+                args.agent, opponent, args.games, processes, args.seed, args.max_moves
+            ):
+                writer.write(result.moves)
+                games += 1
+                moves += len(result.moves)
+        seconds = time.perf_counter() - start
+        print(json.dumps(_rates("simulate", games, moves, seconds)))
+
+        start = time.perf_counter()
+        for _ in replay_record_file(path, processes):
+            pass
+        seconds = time.perf_counter() - start
+        print(json.dumps(_rates("replay", games, moves, seconds)))
+
+    results = run_benchmarks(args.names or None, args.repeat)
+    for name, result in results.items():
+        print(json.dumps(dict(benchmark=name, **result)))
+    if args.save:
+        save_baseline(args.save, results)
+    if not args.baseline:
+        return 0
+
+    regressions = compare(results, load_baseline(args.baseline), args.threshold)
+    for name, before, after, slowdown in regressions:
+        print(
+            "{} regressed by {:.0%}: {:.0f} moves/s, was {:.0f}".format(
+                name, slowdown, after, before
+            ),
+            file=sys.stderr,
+        )
+    return 1 if regressions else 0
+
+
+def run_server(args):
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix, _processes(args.workers)))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def tablebase(args):
+    sizes = {int(size) for size in args.sizes.split(",")}
+    if not sizes or not sizes <= {1, 2, 3}:
+        raise ValueError("Sizes are 1, 2 and 3, like --sizes 1,2")
+    locations = ALL_IN_HAND
+    for piece in range(12):
+        if PIECE_SIZE[piece] not in sizes:
+            locations |= UNUSED << (4 * piece)
+    root = Position.from_locations(locations)
+
+    def progress(stage, level, positions):
+        message = "{} {}: {} positions".format(stage, level, positions)
+        print(message, file=sys.stderr)
+
+    count = build(args.path, root, args.work_dir, _processes(args.workers), progress)
+    print("{} positions written to {}".format(count, args.path), file=sys.stderr)
+    return 0
+
+
+def _add_play_arguments(parser):
+    parser.add_argument("--agent", choices=sorted(STRATEGIES), default="heuristic")
+    parser.add_argument(
+        "--opponent",
+        choices=sorted(STRATEGIES),
+        help="the agent playing O, the same as --agent by default",
+    )
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument(
+        "--workers", type=int, default=1, help="processes to use, 0 for every core"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-moves", type=int, default=50)
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(prog="gobblers", description="Gobblers games")
+    parser.add_argument(
+        "--stats", help="write call counts and times of the hot methods as JSON"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("simulate", help="play games between agents")
+    _add_play_arguments(command)
+    command.add_argument("--format", choices=["jsonl", "binary"], default="jsonl")
+    command.add_argument("--output", default="-")
+    command.set_defaults(run=simulate)
+
+    command = commands.add_parser(
+        "replay", help="check every game of a record or JSONL file"
+    )
+    command.add_argument("path", help="a record file, a JSONL file or - for stdin")
+    command.add_argument(
+        "--workers", type=int, default=1, help="processes to use, 0 for every core"
+    )
+    command.add_argument("--batch-size", type=int, default=10000)
+    command.add_argument(
+        "--errors-only", action="store_true", help="only write the invalid games"
+    )
+    command.add_argument("--output", default="-")
+    command.set_defaults(run=replay)
+
+    command = commands.add_parser(
+        "bench",
+        help="measure games and moves per second, and time the board and "
+        "agents on a fixed corpus",
+    )
+    _add_play_arguments(command)
+    command.add_argument(
+        "names", nargs="*", help="corpus benchmarks to run: " + ", ".join(BENCHMARKS)
+    )
+    command.add_argument("--repeat", type=int, default=3)
+    command.add_argument("--save", help="write the corpus results as a baseline")
+    command.add_argument(
+        "--baseline", help="compare the corpus results with a baseline"
+    )
+    command.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="the slowdown that counts as a regression, 0.1 for 10%%",
+    )
+    command.set_defaults(run=bench)
+
+    command = commands.add_parser(
+        "serve", help="host games over line-delimited JSON, see server.py"
+    )
+    command.add_argument("--host", default="127.0.0.1")
+    command.add_argument("--port", type=int, default=7777)
+    command.add_argument("--unix", help="listen on a Unix socket at this path")
+    command.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="processes for agent moves, 0 for every core",
+    )
+    command.set_defaults(run=run_server)
+
+    command = commands.add_parser(
+        "tablebase", help="solve the game offline into a tablebase file"
+    )
+    command.add_argument("path", help="the tablebase file to write")
+    command.add_argument(
+        "--sizes", default="1,2,3", help="the piece sizes in play, like 1,2"
+    )
+    command.add_argument(
+        "--workers", type=int, default=1, help="processes to use, 0 for every core"
+    )
+    command.add_argument(
+        "--work-dir", help="where the working files go, the system's temp by default"
+    )
+    command.set_defaults(run=tablebase)
+    return parser
+
+
+def main(argv=None):
+    args = make_parser().parse_args(argv)
+    if args.stats:
+        instrument.reset()
+        instrument.enable()
+    try:
+        return args.run(args)
+    except (OSError, ValueError) as error:
+        print("gobblers: {}".format(error), file=sys.stderr)
+        return 2
+    finally:
+        if args.stats:
+            instrument.disable()
+            with open(args.stats, "w") as f:
+                f.write(instrument.snapshot_json())
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,130 +1,190 @@
 import random
 
+from gobblers.board import PIECES
+from gobblers.cache import THREAT_MOVE, position_key
+from gobblers.threats import analyze, winning_moves
+
+# cached when no move wins, blocks or makes a double threat
+NO_MOVE = -1
+# every (gobbler, location) a player might play, random moves are drawn from
+# these before falling back to listing the legal moves
+CANDIDATES = {
+    player: [
+        (gobbler, (x, y))
+        for gobbler in PIECES
+        if gobbler.player == player
+        for x in range(3)
+        for y in range(3)
+    ]
+    for player in ["X", "O"]
+}
+RANDOM_TRIES = 12
+
 
 class Agent:
-    def __init__(self, board):
+    def __init__(self, board, tablebase=None, book=None, cache=None, rng=None):
         self.board = board
+        self.tablebase = tablebase
+        self.book = book
+        # an EvaluationCache or SharedCache for the threat moves, see forced_play
+        self.cache = cache
+        # every random choice comes from here, so a seeded random.Random
+        # replays the same games
+        self.rng = rng or random.Random()
+        # the threat analysis of the last position looked at, by its exact
+        # key: the hash is the same when two copies of a piece swap places,
+        # but the analysis names the copy to play
+        self._analysis = None
+
+    def perfect_play(self):
+        """Play the best move found in the tablebase, if there is one"""
+        if self.board.game_over or self.tablebase is None:
+            return False
+        move = self.tablebase.best_board_move(self.board)
+        if move is None:
+            return False
+        self.board.push(move)
+        return True
+
+    def book_play(self):
+        """Play the opening book's move, if the book has this position"""
+        if self.board.game_over or self.book is None:
+            return False
+        move = self.book.lookup(self.board)
+        if move is None:
+            return False
+        self.board.push(move)
+        return True
+
+    def _random_move(self, new=False):
+        """A random legal (gobbler, location), of a piece still in hand if new,
+        or None if there is none. Every such move is equally likely: a few
+        guesses are tried before listing them all."""
+        board = self.board
+        candidates = CANDIDATES[board.next_player]
+        for _ in range(RANDOM_TRIES):
+            gobbler, location = candidates[self.rng.randrange(len(candidates))]
+            if new and board.locations[gobbler.id] is not None:
+                continue
+            if board.is_legal(gobbler, location):
+                return gobbler, location
+        moves = [
+            (gobbler, location)
+            for gobbler, location in board.legal_moves()
+            if not new or board.locations[gobbler.id] is None
+        ]
+        if len(moves) == 0:
+            return None
+        return self.rng.choice(moves)
 
     def random_play(self):
         """Play a random move"""
         if self.board.game_over:
             return None
-        player = self.board.next_player
-        player_pieces = [piece for piece in self.board.pieces if piece.player == player]
-        all_locations = [(i, j) for i in range(3) for j in range(3)]
-
-        random.shuffle(player_pieces)
-        random.shuffle(all_locations)
-        for piece in player_pieces:
-            for location in all_locations:
-                try:
-                    self.board.validate_move(piece, location)
-                    self.board.play(player, piece.size, piece.index, location)
-                    return True
-                except ValueError:
-                    continue
+        move = self._random_move()
+        if move is not None:
+            piece, location = move
+            self.board.play(piece.player, piece.size, piece.index, location)
+            return True
         self.board.winner = "Draw"
         self.board.game_over = True
         return False
 
+    def _play_move(self, piece, square):
+        gobbler = self.board.pieces[piece]
+        self.board.play(gobbler.player, gobbler.size, gobbler.index, divmod(square, 3))
+
+    def _analyze(self):
+        key = position_key(self.board)
+        if self._analysis is None or self._analysis[0] != key:
+            self._analysis = (key, analyze(self.board))
+        return self._analysis[1]
+
     def check_winning_move(self):
+        """Play a move that wins at once, if there is one"""
         if self.board.game_over:
             return False
-        player = self.board.next_player
-        player_pieces = [piece for piece in self.board.pieces if piece.player == player]
-
-        for line_indices, visible, actual in self.board.iter_lines():
-            if visible.count(player) != 2:
-                continue
-            for index, gob in zip(line_indices, actual):
-                if len(gob) == 0 or gob[0].player != player:
-                    possible_winning_location = index
-                    for piece in player_pieces:
-                        try:
-                            # This isn't quite right, you might be covering your own piece
-                            # in which case you _can_ move it and still win
-                            if (
-                                piece.location != None
-                                and piece.location in line_indices
-                            ):
-                                continue
-                            self.board.validate_move(piece, possible_winning_location)
-                            self.board.play(
-                                player,
-                                piece.size,
-                                piece.index,
-                                possible_winning_location,
-                            )
-                            return True
-                        except ValueError:
-                            continue
-        return False
+        wins = winning_moves(self.board)
+        if len(wins) == 0:
+            return False
+        self._play_move(*wins[0])
+        return True
 
     def defend(self):
+        """If the opponent could win next move, play a move that stops it"""
         if self.board.game_over:
             return None
-        player = self.board.next_player
-        player_pieces = [piece for piece in self.board.pieces if piece.player == player]
-        opponent = "X" if player == "O" else "O"
+        blocks = self._analyze().blocks
+        if len(blocks) == 0:
+            return False
+        self._play_move(*blocks[0])
+        return True
 
-        for line_indices, visible, actual in self.board.iter_lines():
-            if visible.count(opponent) != 2:
-                continue
-            for index in line_indices:
-                for piece in player_pieces:
-                    try:
-                        self.board.validate_move(piece, index)
-                        self.board.play(
-                            player,
-                            piece.size,
-                            piece.index,
-                            index,
-                        )
-                        if self.check_winning_move():
-                            self.board.undo(2)
-                            continue
-                        return True
-                    except ValueError:
-                        continue
-        return False
+    def threaten(self):
+        """Play a move that leaves two squares to win on, if there is one"""
+        if self.board.game_over:
+            return None
+        double_threats = self._analyze().double_threats
+        if len(double_threats) == 0:
+            return False
+        self._play_move(*double_threats[0])
+        return True
+
+    def _forced_move(self):
+        report = self._analyze()
+        for moves in [report.wins, report.blocks, report.double_threats]:
+            if moves:
+                piece, square = moves[0]
+                return 9 * piece + square
+        return NO_MOVE
+
+    def forced_play(self):
+        """Play the move check_winning_move, defend or threaten would, in that
+        order, looking it up in the cache first if there is one"""
+        if self.board.game_over:
+            return False
+        if self.cache is None:
+            move = self._forced_move()
+        else:
+            key = position_key(self.board, THREAT_MOVE)
+            move = self.cache.get_or_compute(key, self._forced_move)
+        if move == NO_MOVE:
+            return False
+        self._play_move(*divmod(move, 9))
+        return True
 
     def prefer_new(self):
         if self.board.game_over:
             return None
-        player = self.board.next_player
-        player_pieces = [piece for piece in self.board.pieces if piece.player == player]
-        new_pieces = [piece for piece in player_pieces if piece.location == None]
-        all_locations = [(i, j) for i in range(3) for j in range(3)]
-
-        random.shuffle(new_pieces)
-        random.shuffle(all_locations)
-        for piece in new_pieces:
-            for location in all_locations:
-                try:
-                    self.board.validate_move(piece, location)
-                    self.board.play(player, piece.size, piece.index, location)
-                    return True
-                except ValueError:
-                    continue
-        return False
+        move = self._random_move(new=True)
+        if move is None:
+            return False
+        piece, location = move
+        self.board.play(piece.player, piece.size, piece.index, location)
+        return True
 
     def play(self):
         """Helper function for a normal strategy
         1. Check if game is over
-        2. Try to play a winning move
-        3. If can't win, try to defend
-        4. If can't defend, play a random move
+        2. If there is a tablebase, play its best move
+        3. If there is an opening book, play its move
+        4. Try to play a winning move
+        5. If can't win, try to defend
+        6. If there is no threat, try to make two at once
+           (4 to 6 are cached if the agent has a cache)
+        7. Otherwise play a random move, preferring new pieces
         """
 
         if self.board.game_over:
             return
 
-        won = self.check_winning_move()
-        if won:
+        if self.perfect_play():
+            return
+
+        if self.book_play():
             return
 
-        defended = self.defend()
-        if defended:
+        if self.forced_play():
             return
 
         play_new = self.prefer_new()
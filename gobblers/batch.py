@@ -0,0 +1,238 @@
+"""Simulate many games at once with NumPy.
+
+The games are stored like Position, one row per game:
+
+- ``locations`` (N, 12) holds every piece's square, or ``IN_HAND``
+- ``occupancy`` (N, 9) holds a 6 bit (player, size) field for every square
+- ``turn`` and ``winner`` hold the side to move and the result so far
+
+Every step finds the legal moves of all the games with array operations,
+picks one move for each unfinished game and plays them all together. Wins
+are found by looking the visible masks up in the table of winning masks, and
+threefold repetition is found by comparing zobrist hashes with each game's
+earlier hashes. A game with no legal move is a draw, as in Agent.random_play.
+
+All games move in lockstep, so ply ``i`` of every game is played in step
+``i`` and finished games just sit out the remaining steps.
+
+``line_features`` and ``evaluate`` work out the features of features.py and
+the score of solver.evaluate for every row of such arrays at once, and
+``batch_features`` and ``batch_evaluate`` do it for a list of positions.
+"""
+import numpy as np
+
+from gobblers import position
+from gobblers.position import DRAW, IN_HAND, PLAYERS, move_string, packed
+from gobblers.zobrist import PIECE_KEYS, SIDE_KEY
+
+NO_WINNER = -1
+
+PIECE_PLAYER = np.array(position.PIECE_PLAYER, dtype=np.int8)
+PIECE_SIZE = np.array(position.PIECE_SIZE, dtype=np.int8)
+PIECE_BIT = np.array(position.PIECE_BIT, dtype=np.uint8)
+TOP_SIZE = np.array(position.TOP_SIZE, dtype=np.int8)
+TOP_PLAYER = np.array(
+    [NO_WINNER if player is None else player for player in position.TOP_PLAYER],
+    dtype=np.int8,
+)
+WINNING = np.array(position.WINNING, dtype=bool)
+SQUARE_BITS = 1 << np.arange(9)
+KEYS = np.array(PIECE_KEYS, dtype=np.uint64)
+SIDE = np.uint64(SIDE_KEY)
+LINE_SQUARES = np.array(position.LINES, dtype=np.intp)
+
+# the rows of the (N, 5, 8) arrays from line_features
+VISIBLE_X, VISIBLE_O, EMPTY, GOBBLE_X, GOBBLE_O = range(5)
+
+
+def line_features(locations, occupancy):
+    """An (N, 5, 8) array of the features.py features of every line, with
+    rows VISIBLE_X, VISIBLE_O, EMPTY, GOBBLE_X and GOBBLE_O"""
+    top_player = TOP_PLAYER[occupancy]
+    top_size = TOP_SIZE[occupancy]
+
+    locations = locations.astype(np.intp)
+    on_board = locations < 9
+    here = np.take_along_axis(top_size, np.where(on_board, locations, 0), axis=1)
+    free = (locations == IN_HAND) | (on_board & (here == PIECE_SIZE))
+    sizes = np.where(free, PIECE_SIZE, 0)
+    largest = [sizes[:, :6].max(axis=1), sizes[:, 6:].max(axis=1)]
+
+    squares = [
+        top_player == 0,
+        top_player == 1,
+        top_player == NO_WINNER,
+        (top_player == 1) & (top_size < largest[0][:, None]),
+        (top_player == 0) & (top_size < largest[1][:, None]),
+    ]
+    return np.stack(
+        [rows[:, LINE_SQUARES].sum(axis=2, dtype=np.int8) for rows in squares], axis=1
+    )
+
+
+def evaluate(features, turn):
+    """solver.evaluate for every row of line_features, from the point of view
+    of the side to move"""
+    rows = np.arange(len(turn))
+    mine = features[rows, turn].astype(np.int32)
+    theirs = features[rows, 1 - turn].astype(np.int32)
+    score = np.where(theirs == 0, mine * mine, 0)
+    score -= np.where(mine == 0, theirs * theirs, 0)
+    return score.sum(axis=1)
+
+
+def _arrays(positions):
+    """The locations, occupancy and turn arrays of Positions or Boards"""
+    n = len(positions)
+    locations = np.empty((n, 12), dtype=np.int8)
+    occupancy = np.empty((n, 9), dtype=np.uint8)
+    turn = np.empty(n, dtype=np.intp)
+    for row, pos in enumerate(positions):
+        packed_locations, packed_occupancy, turn[row] = packed(pos)
+        locations[row] = [(packed_locations >> (4 * p)) & 15 for p in range(12)]
+        occupancy[row] = [(packed_occupancy >> (6 * s)) & 63 for s in range(9)]
+    return locations, occupancy, turn
+
+
+def batch_features(positions):
+    """line_features of a list of Positions or Boards"""
+    locations, occupancy, _ = _arrays(positions)
+    return line_features(locations, occupancy)
+
+
+def batch_evaluate(positions):
+    """solver.evaluate of a list of Positions or Boards, as an array"""
+    locations, occupancy, turn = _arrays(positions)
+    return evaluate(line_features(locations, occupancy), turn)
+
+
+def random_policy(simulator, legal):
+    """Pick a uniformly random legal move for every game, as a flat index
+    piece * 9 + square"""
+    flat = legal.reshape(len(legal), -1)
+    noise = simulator.rng.random(flat.shape)
+    noise[~flat] = -1
+    return noise.argmax(axis=1)
+
+
+class BatchSimulator:
+    def __init__(self, games, max_plies=100, seed=None):
+        self.size = games
+        self.max_plies = max_plies
+        self.rng = np.random.default_rng(seed)
+        self.reset()
+
+    def reset(self):
+        n = self.size
+        self.locations = np.full((n, 12), IN_HAND, dtype=np.int8)
+        self.occupancy = np.zeros((n, 9), dtype=np.uint8)
+        self.turn = np.zeros(n, dtype=np.int8)
+        self.winner = np.full(n, NO_WINNER, dtype=np.int8)
+        self.hashes = np.zeros((n, self.max_plies + 1), dtype=np.uint64)
+        self.moves = np.zeros((n, self.max_plies), dtype=np.int16)
+        self.length = np.zeros(n, dtype=np.int32)
+        self.ply = 0
+
+    def visible(self, games=slice(None)):
+        """The (N, 2) visible masks of X and O"""
+        top_player = TOP_PLAYER[self.occupancy[games]]
+        return np.stack(
+            [((top_player == player) * SQUARE_BITS).sum(axis=1) for player in [0, 1]],
+            axis=1,
+        )
+
+    def features(self):
+        """The (N, 5, 8) line_features of every game"""
+        return line_features(self.locations, self.occupancy)
+
+    def evaluate(self):
+        """solver.evaluate of every game, for the side to move"""
+        return evaluate(self.features(), self.turn.astype(np.intp))
+
+    def legal_moves(self):
+        """An (N, 12, 9) mask of the legal moves of every game"""
+        locations = self.locations.astype(np.intp)
+        on_board = locations != IN_HAND
+        squares = np.where(on_board, locations, 0)
+        here = np.take_along_axis(self.occupancy, squares, axis=1)
+
+        # a piece on the board can only move while it is on top
+        movable = ~on_board | (TOP_SIZE[here] == PIECE_SIZE)
+
+        # and lifting it must not show three in a row underneath
+        below = TOP_PLAYER[here ^ PIECE_BIT]
+        below_visible = np.take_along_axis(
+            self.visible(), np.maximum(below, 0).astype(np.intp), axis=1
+        )
+        reveals = on_board & (below >= 0) & WINNING[below_visible | (1 << squares)]
+
+        own = PIECE_PLAYER[None, :] == self.turn[:, None]
+        playing = (self.winner == NO_WINNER)[:, None]
+        pieces = own & movable & ~reveals & playing
+
+        targets = TOP_SIZE[self.occupancy][:, None, :] < PIECE_SIZE[None, :, None]
+        return pieces[:, :, None] & targets
+
+    def _apply(self, games, pieces, squares):
+        starts = self.locations[games, pieces].astype(np.intp)
+        lifted = starts != IN_HAND
+        bits = PIECE_BIT[pieces]
+        self.occupancy[games[lifted], starts[lifted]] ^= bits[lifted]
+        self.occupancy[games, squares] |= bits
+        self.locations[games, pieces] = squares
+
+        keys = KEYS[pieces, squares] ^ SIDE
+        keys[lifted] ^= KEYS[pieces[lifted], starts[lifted]]
+        self.moves[games, self.ply] = pieces * 9 + squares
+        movers = self.turn[games]
+        self.turn[games] ^= 1
+        self.ply += 1
+        hashes = self.hashes[games, self.ply - 1] ^ keys
+        self.hashes[games, self.ply] = hashes
+
+        repeats = (self.hashes[games, : self.ply + 1] == hashes[:, None]).sum(axis=1)
+        self.winner[games[repeats >= 3]] = DRAW
+        visible = self.visible(games)[np.arange(len(games)), movers]
+        won = WINNING[visible]
+        self.winner[games[won]] = movers[won]
+
+    def step(self, policy=random_policy):
+        """Play one move in every unfinished game. Returns False once every
+        game is finished."""
+        playing = self.winner == NO_WINNER
+        if self.ply >= self.max_plies or not playing.any():
+            return False
+        legal = self.legal_moves()
+        has_move = legal.reshape(self.size, -1).any(axis=1)
+        self.winner[playing & ~has_move] = DRAW
+
+        games = np.nonzero(playing & has_move)[0]
+        if len(games) > 0:
+            choices = np.asarray(policy(self, legal))[games]
+            self._apply(games, choices // 9, choices % 9)
+        self.length[playing] = self.ply
+        return True
+
+    def run(self, policy=random_policy):
+        """Play every game to the end, or to max_plies, and return the records"""
+        while self.step(policy):
+            pass
+        return self.records()
+
+    def records(self):
+        """A (moves, winner) pair for each game, with moves written as in
+        Board.moves and winner 'X', 'O', 'Draw' or None if unfinished"""
+        records = []
+        for game in range(self.size):
+            moves = [
+                move_string(int(move) // 9, int(move) % 9)
+                for move in self.moves[game, : self.length[game]]
+            ]
+            winner = int(self.winner[game])
+            if winner == NO_WINNER:
+                records.append((moves, None))
+            elif winner == DRAW:
+                records.append((moves, "Draw"))
+            else:
+                records.append((moves, PLAYERS[winner]))
+        return records
@@ -0,0 +1,242 @@
+"""A benchmark suite for the board and the agents.
+
+Every benchmark runs over a fixed corpus of games, ``corpus.gbr`` next to
+this file, or over games played from fixed seeds, so two runs do the same
+work and their rates can be compared. A run reports, for every benchmark,
+the best time over a few repeats with the games and moves per second.
+
+Results can be saved as a JSON baseline, and a later run compared against
+it; a benchmark whose moves per second dropped by more than the threshold
+is a regression.
+
+    results = run_benchmarks()
+    save_baseline("baseline.json", results)
+    ...
+    regressions = compare(run_benchmarks(), load_baseline("baseline.json"))
+"""
+import json
+import os
+import platform
+import random
+import time
+
+from gobblers.agent import Agent
+from gobblers.board import Board
+from gobblers.records import iter_records, write_records
+from gobblers.tournament import game_seed, play_game
+
+CORPUS = os.path.join(os.path.dirname(__file__), "corpus.gbr")
+BASELINE_VERSION = 1
+
+
+def write_corpus(path=CORPUS, games=200, seed=0):
+    """Play the corpus games, heuristic agent against heuristic agent, and
+    write them to a record file. Only needed to make a new corpus."""
+    if os.path.exists(path):
+        os.remove(path)
+    results = (
+        play_game("heuristic", "heuristic", game_seed(seed, game), game=game)
+        for game in range(games)
+    )
+    return write_records(path, (result.moves for result in results))
+
+
+def load_corpus(path=CORPUS):
+    return list(iter_records(path))
+
+
+def _parse(move):
+    player, size, index, x, y = move.split("-")
+    return player, int(size), int(index), (int(x), int(y))
+
+
+def _midgame_boards(corpus):
+    """A board for every corpus game, stopped halfway through"""
+    boards = []
+    for moves in corpus:
+        board = Board()
+        for move in moves[: len(moves) // 2]:
+            board.push(move)
+        boards.append(board)
+    return boards
+
+
+def bench_play(corpus):
+    games = [[_parse(move) for move in moves] for moves in corpus]
+    start = time.perf_counter()
+    for moves in games:
+        board = Board()
+        for move in moves:
+            board.play(*move)
+    seconds = time.perf_counter() - start
+    return seconds, len(games), sum(len(moves) for moves in games)
+
+
+def bench_validate_move(corpus):
+    boards = _midgame_boards(corpus)
+    probes = [(x, y) for x in range(3) for y in range(3)]
+    count = 0
+    start = time.perf_counter()
+    for board in boards:
+        for gobbler in board.pieces:
+            for location in probes:
+                try:
+                    board.validate_move(gobbler, location)
+                except ValueError:
+                    pass
+                count += 1
+    seconds = time.perf_counter() - start
+    return seconds, len(boards), count
+
+
+def bench_check_win(corpus, repeat=20):
+    boards = _midgame_boards(corpus)
+    start = time.perf_counter()
+    for board in boards:
+        for _ in range(repeat):
+            board._check_win()
+    seconds = time.perf_counter() - start
+    return seconds, len(boards), len(boards) * repeat
+
+
+def bench_replay(corpus):
+    board = Board()
+    start = time.perf_counter()
+    for moves in corpus:
+        board.replay(moves)
+    seconds = time.perf_counter() - start
+    return seconds, len(corpus), sum(len(moves) for moves in corpus)
+
+
+def bench_undo(corpus):
+    boards = []
+    for moves in corpus:
+        board = Board()
+        board.replay(moves)
+        boards.append(board)
+    start = time.perf_counter()
+    for board in boards:
+        board.undo(len(board.moves))
+    seconds = time.perf_counter() - start
+    return seconds, len(corpus), sum(len(moves) for moves in corpus)
+
+
+def bench_reflect(corpus):
+    boards = []
+    for moves in corpus:
+        board = Board()
+        board.replay(moves)
+        boards.append(board)
+    start = time.perf_counter()
+    for board in boards:
+        for type in range(4):
+            board.reflect(type)
+    seconds = time.perf_counter() - start
+    return seconds, 4 * len(corpus), 4 * sum(len(moves) for moves in corpus)
+
+
+def bench_copy(corpus, repeat=20):
+    boards = _midgame_boards(corpus)
+    start = time.perf_counter()
+    for board in boards:
+        for _ in range(repeat):
+            board.copy()
+    seconds = time.perf_counter() - start
+    return seconds, len(boards), len(boards) * repeat
+
+
+def _bench_agent(strategy, games=50, seed=0):
+    moves = 0
+    seconds = 0.0
+    for game in range(games):
+        board = Board()
+        agent = Agent(board, rng=random.Random(game_seed(seed, game)))
+        play = getattr(agent, strategy)
+        start = time.perf_counter()
+        for _ in range(50):
+            if board.game_over:
+                break
+            play()
+        seconds += time.perf_counter() - start
+        moves += len(board.moves)
+    return seconds, games, moves
+
+
+def bench_agent_random(corpus):
+    return _bench_agent("random_play")
+
+
+def bench_agent_heuristic(corpus):
+    return _bench_agent("play")
+
+
+# name -> function taking the corpus and returning (seconds, games, moves)
+BENCHMARKS = {
+    "play": bench_play,
+    "validate_move": bench_validate_move,
+    "check_win": bench_check_win,
+    "replay": bench_replay,
+    "undo": bench_undo,
+    "reflect": bench_reflect,
+    "copy": bench_copy,
+    "agent_random": bench_agent_random,
+    "agent_heuristic": bench_agent_heuristic,
+}
+
+
+def run_benchmarks(names=None, repeat=3, corpus=None):
+    """Run benchmarks, all of them by default, and return a dict from name
+    to the best of repeat runs"""
+    if corpus is None:
+        corpus = load_corpus()
+    names = list(BENCHMARKS) if names is None else names
+    for name in names:
+        if name not in BENCHMARKS:
+            raise ValueError("Unknown benchmark, pick from", sorted(BENCHMARKS))
+
+    results = {}
+    for name in names:
+        seconds, games, moves = min(
+            BENCHMARKS[name](corpus) for _ in range(max(1, repeat))
+        )
+        results[name] = {
+            "seconds": seconds,
+            "games": games,
+            "moves": moves,
+            "games_per_s": games / seconds if seconds else 0.0,
+            "moves_per_s": moves / seconds if seconds else 0.0,
+        }
+    return results
+
+
+def save_baseline(path, results):
+    baseline = {
+        "version": BASELINE_VERSION,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+
+
+def load_baseline(path):
+    with open(path) as f:
+        baseline = json.load(f)
+    if baseline.get("version") != BASELINE_VERSION:
+        raise ValueError("Not a benchmark baseline", path)
+    return baseline["results"]
+
+
+def compare(results, baseline, threshold=0.1):
+    """Every benchmark that got slower than its baseline by more than
+    threshold (0.1 for 10%), as (name, baseline moves/s, moves/s, slowdown)"""
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before = baseline[name]["moves_per_s"]
+        after = result["moves_per_s"]
+        if before and after < before * (1 - threshold):
+            regressions.append((name, before, after, 1 - after / before))
+    return regressions
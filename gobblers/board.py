@@ -1,20 +1,135 @@
+from collections import namedtuple
+
+from gobblers import position
+from gobblers.position import SQUARE_LINES, SQUARES, piece_id
+from gobblers.symmetry import transform_move
+from gobblers.zobrist import PIECE_KEYS, SIDE_KEY
+
+# position.LINES with the squares as (x, y)
+LINES = [[SQUARES[square] for square in line] for line in position.LINES]
+
+# everything needed to put a board back in a position, see Board.snapshot
+BoardSnapshot = namedtuple(
+    "BoardSnapshot",
+    [
+        "locations",
+        "next_player",
+        "game_over",
+        "winner",
+        "hash",
+        "moves",
+        "undo_stack",
+        "repetitions",
+    ],
+)
+
+
 class Board:
-    def __init__(self):
+    def __init__(self, check_consistency=False):
         self.state = [[[] for _ in range(3)] for _ in range(3)]
         self.next_player = "X"
         self.game_over = False
         self.winner = None
         self.moves = []
+        # what each move in moves changed, so that pop can take it back
+        self._undo_stack = []
+        # zobrist hash of the position and how often each hash has been seen
+        self.hash = 0
+        self.repetitions = {0: 1}
+        # how many squares of each line show each player's gobblers
+        self.line_counts = {"X": [0] * 8, "O": [0] * 8}
+        # compare every incremental check against a full scan of the board
+        self.check_consistency = check_consistency
+        # moves, _undo_stack and repetitions may be shared with a copy or a
+        # snapshot, in which case they are copied before they are changed
+        self._shared = False
         self._init_pieces()
 
     def _init_pieces(self):
-        self.pieces = []
-        for player in ["X", "O"]:
-            for size in [1, 2, 3]:
-                self.pieces.append(Gobbler(player, size, 0))
-                self.pieces.append(Gobbler(player, size, 1))
+        # the pieces never change, where they are is kept here by piece id
+        self.pieces = PIECES
+        self.locations = [None] * 12
+        self.covered = [False] * 12
+
+    def _unshare(self):
+        self.moves = list(self.moves)
+        self._undo_stack = list(self._undo_stack)
+        self.repetitions = dict(self.repetitions)
+        self._shared = False
+
+    def copy(self):
+        """A board in the same position that can be played on without changing
+        this one. Only the fixed size state is copied, the move history is
+        shared until one of the boards plays or takes back a move."""
+        board = Board.__new__(Board)
+        board.state = [[list(gobblers) for gobblers in row] for row in self.state]
+        board.next_player = self.next_player
+        board.game_over = self.game_over
+        board.winner = self.winner
+        board.moves = self.moves
+        board._undo_stack = self._undo_stack
+        board.hash = self.hash
+        board.repetitions = self.repetitions
+        board.line_counts = {
+            "X": list(self.line_counts["X"]),
+            "O": list(self.line_counts["O"]),
+        }
+        board.check_consistency = self.check_consistency
+        board.pieces = PIECES
+        board.locations = list(self.locations)
+        board.covered = list(self.covered)
+        board._shared = self._shared = True
+        return board
+
+    __copy__ = copy
+
+    def snapshot(self):
+        """Save the position as a BoardSnapshot, which restore can go back to
+        any number of times"""
+        self._shared = True
+        return BoardSnapshot(
+            tuple(self.locations),
+            self.next_player,
+            self.game_over,
+            self.winner,
+            self.hash,
+            self.moves,
+            self._undo_stack,
+            self.repetitions,
+        )
+
+    def restore(self, snapshot):
+        """Go back to the position of a snapshot, rebuilding the stacks, covered
+        pieces and line counts from where the pieces are"""
+        self.state = [[[] for _ in range(3)] for _ in range(3)]
+        self.line_counts = {"X": [0] * 8, "O": [0] * 8}
+        self.locations = list(snapshot.locations)
+        self.covered = [False] * 12
+        for gobbler in PIECES_BY_SIZE:
+            location = self.locations[gobbler.id]
+            if location is None:
+                continue
+            x, y = location
+            gobblers = self.state[x][y]
+            if len(gobblers) > 0:
+                self.covered[gobbler.id] = True
+            else:
+                self._update_line_counts(x, y, None, gobbler.player)
+            gobblers.append(gobbler)
+
+        self.next_player = snapshot.next_player
+        self.game_over = snapshot.game_over
+        self.winner = snapshot.winner
+        self.hash = snapshot.hash
+        self.moves = snapshot.moves
+        self._undo_stack = snapshot.undo_stack
+        self.repetitions = snapshot.repetitions
+        self._shared = True
 
     def _parse_move(self, player, size, index):
+        piece = PIECE_IDS.get((player, size, index))
+        if piece is not None:
+            return PIECES[piece]
         if player not in ["X", "O"]:
             raise ValueError("Move must start with player 'X' or 'O'")
         if size not in [1, 2, 3]:
@@ -23,25 +138,49 @@ class Board:
             raise ValueError("Move must end index 0 or 1")
         return self.find(player, size, index)
 
+    def _update_line_counts(self, x, y, old_player, new_player):
+        if old_player == new_player:
+            return
+        for line in SQUARE_LINES[3 * x + y]:
+            if old_player is not None:
+                self.line_counts[old_player][line] -= 1
+            if new_player is not None:
+                self.line_counts[new_player][line] += 1
+
     def _check_cover_and_uncover(self, gobbler, location):
         x, y = location
         if len(self.state[x][y]) > 0:
-            self.state[x][y][0].covered = True
-        if gobbler.location is None:
+            self.covered[self.state[x][y][0].id] = True
+            self._update_line_counts(x, y, self.state[x][y][0].player, gobbler.player)
+        else:
+            self._update_line_counts(x, y, None, gobbler.player)
+        if self.locations[gobbler.id] is None:
             return
 
-        x, y = gobbler.location
+        x, y = self.locations[gobbler.id]
         self.state[x][y].remove(gobbler)
         if len(self.state[x][y]) > 0:
-            self.state[x][y][0].covered = False
+            self.covered[self.state[x][y][0].id] = False
+            self._update_line_counts(x, y, gobbler.player, self.state[x][y][0].player)
+        else:
+            self._update_line_counts(x, y, gobbler.player, None)
 
     def _check_three_fold(self):
-        """see if the same move has been played three times before"""
-        most_recent = self.moves[-1]
-        if self.moves.count(most_recent) == 3:
+        """see if the same position has come up three times"""
+        count = self.repetitions.get(self.hash, 0) + 1
+        self.repetitions[self.hash] = count
+        if count == 3:
             self.game_over = True
             self.winner = "Draw"
 
+    def _update_hash(self, gobbler, location):
+        keys = PIECE_KEYS[gobbler.id]
+        if self.locations[gobbler.id] is not None:
+            x, y = self.locations[gobbler.id]
+            self.hash ^= keys[3 * x + y]
+        x, y = location
+        self.hash ^= keys[3 * x + y] ^ SIDE_KEY
+
     def _get_visible_gobblers(self):
         visible = [[None for _ in range(3)] for _ in range(3)]
         for i, row in enumerate(self.state):
@@ -51,6 +190,13 @@ class Board:
         return visible
 
     def _check_win(self):
+        won = 3 in self.line_counts["X"] or 3 in self.line_counts["O"]
+        if self.check_consistency and won != self._scan_win():
+            raise AssertionError("Line counts disagree with the board")
+        return won
+
+    def _scan_win(self):
+        """Look for three in a row by going over the whole board"""
         visible = self._get_visible_gobblers()
         rows = visible
         columns = [[row[i] for row in visible] for i in range(3)]
@@ -65,10 +211,10 @@ class Board:
         return False
 
     def find(self, player, size, index):
-        for piece in self.pieces:
-            if piece.player == player and piece.size == size and piece.index == index:
-                return piece
-        raise ValueError("No piece found", player, size, index)
+        try:
+            return PIECES[PIECE_IDS[(player, size, index)]]
+        except KeyError:
+            raise ValueError("No piece found", player, size, index)
 
     def validate_move(self, gobbler, location):
         if gobbler.player != self.next_player:
@@ -77,7 +223,7 @@ class Board:
         if len(location) != 2:
             raise ValueError("Location must be a tupple of 2 integers between 0 and 2")
 
-        if gobbler.covered:
+        if self.covered[gobbler.id]:
             raise ValueError("This gobbler is covered and cannot move")
 
         if self.game_over:
@@ -95,30 +241,117 @@ class Board:
                     "{}-{} is occupied by a gobbler of the same size".format(x, y)
                 )
 
-        # check if the move reveals three in a row by _check_win with piece removed
-        if gobbler.location is None:
-            return
-        x, y = gobbler.location
-        self.state[x][y].remove(gobbler)
-        is_valid = not self._check_win()
-        self.state[x][y].insert(0, gobbler)
-        if not is_valid:
+        if self._reveals_three(gobbler):
             raise ValueError("This move reveals three in a row")
 
+    def _reveals_three(self, gobbler):
+        """check if lifting the gobbler shows a line with the piece underneath"""
+        location = self.locations[gobbler.id]
+        if location is None:
+            return False
+        x, y = location
+        gobblers = self.state[x][y]
+        reveals = False
+        if len(gobblers) > 1 and gobblers[1].player != gobbler.player:
+            counts = self.line_counts[gobblers[1].player]
+            reveals = any(counts[line] == 2 for line in SQUARE_LINES[3 * x + y])
+
+        if self.check_consistency:
+            gobblers.remove(gobbler)
+            scanned = self._scan_win()
+            gobblers.insert(0, gobbler)
+            if reveals != scanned:
+                raise AssertionError("Line counts disagree with the board")
+        return reveals
+
+    def is_legal(self, gobbler, location):
+        """The same checks as validate_move, but returns False instead of raising"""
+        if (
+            self.game_over
+            or self.covered[gobbler.id]
+            or gobbler.player != self.next_player
+        ):
+            return False
+        x, y = location
+        if x not in [0, 1, 2] or y not in [0, 1, 2]:
+            return False
+        gobblers = self.state[x][y]
+        if len(gobblers) > 0 and not gobbler.can_eat(gobblers[0]):
+            return False
+        return not self._reveals_three(gobbler)
+
+    def legal_moves(self):
+        """Yield every (gobbler, location) pair the next player can play"""
+        if self.game_over:
+            return
+        for gobbler in self.pieces:
+            if gobbler.player != self.next_player or self.covered[gobbler.id]:
+                continue
+            for x in range(3):
+                for y in range(3):
+                    if self.is_legal(gobbler, (x, y)):
+                        yield gobbler, (x, y)
+
     def undo(self, number_of_moves=1):
-        moves = self.moves
         for _ in range(number_of_moves):
-            moves.pop()
-        self.__init__()
-        self.replay(moves)
+            self.pop()
+
+    def push(self, move):
+        """Play a move written like X-2-0-1-1, it can be taken back with pop"""
+        player, size, index, x, y = move.split("-")
+        self.play(player, int(size), int(index), (int(x), int(y)))
+
+    def pop(self):
+        """Take back the last move played and return it"""
+        if self._shared:
+            self._unshare()
+        gobbler, previous_location, game_over, winner, hash = self._undo_stack.pop()
+        self.repetitions[self.hash] -= 1
+        self.hash = hash
+        x, y = self.locations[gobbler.id]
+        gobblers = self.state[x][y]
+        gobblers.pop(0)
+        if len(gobblers) > 0:
+            self.covered[gobblers[0].id] = False
+            self._update_line_counts(x, y, gobbler.player, gobblers[0].player)
+        else:
+            self._update_line_counts(x, y, gobbler.player, None)
+
+        if previous_location is not None:
+            x, y = previous_location
+            gobblers = self.state[x][y]
+            if len(gobblers) > 0:
+                self.covered[gobblers[0].id] = True
+                self._update_line_counts(x, y, gobblers[0].player, gobbler.player)
+            else:
+                self._update_line_counts(x, y, None, gobbler.player)
+            gobblers.insert(0, gobbler)
+
+        self.locations[gobbler.id] = previous_location
+        self.next_player = gobbler.player
+        self.game_over = game_over
+        self.winner = winner
+        return self.moves.pop()
 
     def play(self, player, size, index, location):
         gobbler = self._parse_move(player, size, index)
         self.validate_move(gobbler, location)
+        if self._shared:
+            self._unshare()
         move_string = "{}-{}-{}-{}-{}".format(
             player, size, index, location[0], location[1]
         )
         self.moves.append(move_string)
+        self._undo_stack.append(
+            (
+                gobbler,
+                self.locations[gobbler.id],
+                self.game_over,
+                self.winner,
+                self.hash,
+            )
+        )
+        self._update_hash(gobbler, location)
         self.next_player = "X" if self.next_player == "O" else "O"
         x, y = location
 
@@ -131,21 +364,11 @@ class Board:
             self.game_over = True
             self.winner = gobbler.player
 
-        gobbler.location = location
+        self.locations[gobbler.id] = location
 
     def _reflect_move(self, move, type):
-        player, size, index, x, y = move.split("-")
-        if type == 0:
-            x = str(2 - int(x))
-        if type == 1:
-            x, y = y, x
-        if type == 2:
-            y = str(2 - int(y))
-        if type == 3:
-            x = str(2 - int(x))
-            y = str(2 - int(y))
-            x, y = y, x
-        return "-".join([player, size, index, x, y])
+        # reflections 0-3 are transforms 4-7 of the symmetry tables
+        return transform_move(move, 4 + type)
 
     def reflect(self, type):
         if type not in [0, 1, 2, 3]:
@@ -155,7 +378,7 @@ class Board:
         self.replay(new_moves)
 
     def replay(self, moves):
-        self.__init__()
+        self.__init__(self.check_consistency)
         for move in moves:
             if self.game_over:
                 break
@@ -164,34 +387,11 @@ class Board:
 
     def iter_lines(self):
         """Go through the rows and columns and give useful information about them"""
-
-        indices = [[(i, j) for j in range(3)] for i in range(3)]
-        column_indices = [[(i, j) for i in range(3)] for j in range(3)]
-        diagonals = [
-            [(0, 0), (1, 1), (2, 2)],
-            [(0, 2), (1, 1), (2, 0)],
-        ]
-
-        visible = self._get_visible_gobblers()
-        column_visible = [[row[i] for row in visible] for i in range(3)]
-        diagonal_visible = [
-            [visible[0][0], visible[1][1], visible[2][2]],
-            [visible[0][2], visible[1][1], visible[2][0]],
-        ]
-
-        actual = self.state
-        column_actual = [[row[i] for row in actual] for i in range(3)]
-        diagonal_actual = [
-            [actual[0][0], actual[1][1], actual[2][2]],
-            [actual[0][2], actual[1][1], actual[2][0]],
-        ]
-
-        line_indices = indices + column_indices + diagonals
-        line_visible = visible + column_visible + diagonal_visible
-        line_actual = actual + column_actual + diagonal_actual
-
-        for index, visible, actual in zip(line_indices, line_visible, line_actual):
-            yield (index, visible, actual)
+        state = self.state
+        for line in LINES:
+            actual = [state[x][y] for x, y in line]
+            visible = [gobblers[0].player if gobblers else None for gobblers in actual]
+            yield (line, visible, actual)
 
     def __str__(self):
         """
@@ -234,6 +434,11 @@ class Board:
 
 
 class Gobbler:
+    """One of the 12 pieces, which never changes. Where a piece is and
+    whether it is covered is kept by the Board, indexed by the piece's id."""
+
+    __slots__ = ("player", "size", "index", "id")
+
     def __init__(self, player, size, index):
         if size not in [1, 2, 3]:
             raise ValueError("Size must be 1, 2, or 3")
@@ -242,11 +447,16 @@ class Gobbler:
         if index not in [0, 1]:
             raise ValueError("Index must be 0 or 1")
 
-        self.player = player
-        self.size = size
-        self.index = index
-        self.location = None
-        self.covered = False
+        object.__setattr__(self, "player", player)
+        object.__setattr__(self, "size", size)
+        object.__setattr__(self, "index", index)
+        object.__setattr__(self, "id", piece_id(player, size, index))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("A gobbler can't be changed")
+
+    def __delattr__(self, name):
+        raise AttributeError("A gobbler can't be changed")
 
     def can_eat(self, other):
         return self.size > other.size
@@ -260,10 +470,24 @@ class Gobbler:
         elif self.size == 3:
             return "{}{}{}".format(self.player * 3, self.player * 3, self.player * 3)
 
+    def __repr__(self):
+        return "Gobbler({!r}, {}, {})".format(self.player, self.size, self.index)
+
     def __eq__(self, other):
-        return (
-            self.player == other.player
-            and self.size == other.size
-            and self.index == other.index
-            and self.location == other.location
-        )
+        return isinstance(other, Gobbler) and self.id == other.id
+
+    def __hash__(self):
+        return self.id
+
+
+# every piece in piece id order, shared by all boards
+PIECES = tuple(
+    Gobbler(player, size, index)
+    for player in ["X", "O"]
+    for size in [1, 2, 3]
+    for index in [0, 1]
+)
+# bigger pieces first, so stacks can be built from the bottom up
+PIECES_BY_SIZE = sorted(PIECES, key=lambda piece: -piece.size)
+# (player, size, index) -> piece id
+PIECE_IDS = {(piece.player, piece.size, piece.index): piece.id for piece in PIECES}
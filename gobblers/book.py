@@ -0,0 +1,128 @@
+"""An opening book built from the results of recorded games.
+
+For every position in the first ``plies`` plies of the games, the book
+counts how often each move was played and how it worked out for the player
+who played it (2 points for a win, 1 for a draw). It keeps the best scoring
+move of each position.
+
+Positions are keyed by symmetry.canonical, so one entry covers all 8
+images of a position. Moves are stored in the canonical frame as (piece
+group, from, to), where the group is the player and size, and mapped back
+onto the board with the inverse transform when the book is used.
+
+On disk a book is a small header followed by one fixed size record per
+position. Loading it builds a dict, so lookups are O(1).
+"""
+import struct
+
+from gobblers.position import (
+    PIECE_PLAYER,
+    PLAYERS,
+    Position,
+    locations_of,
+    move_string,
+    parse_move,
+)
+from gobblers.symmetry import INVERSES, LOCATION_MAPS, canonical, transform_key
+
+MAGIC = b"GBBK"
+VERSION = 1
+HEADER = struct.Struct("<4sIII")
+ENTRY = struct.Struct("<QBBBII")
+
+
+class OpeningBook:
+    def __init__(self, plies=8):
+        self.plies = plies
+        # canonical key -> (group, from, to, games, points)
+        self.entries = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    @classmethod
+    def build(cls, games, plies=8, min_games=1):
+        """Build a book from (moves, winner) pairs, with winner "X", "O",
+        "Draw" or None. A game stops counting at its first illegal move.
+        Only moves played at least min_games times are kept."""
+        stats = {}
+        for moves, winner in games:
+            position = Position()
+            for move in moves[:plies]:
+                piece, square = parse_move(move)
+                if not position.is_legal(piece, square):
+                    break
+                locations = position.locations
+                key, _ = canonical(position)
+                start = position.location(piece)
+                # a position with symmetries has several canonical frames,
+                # so take the smallest image of the move among them
+                book_move = min(
+                    (piece // 2, location_map[start], location_map[square])
+                    for transform, location_map in enumerate(LOCATION_MAPS)
+                    if transform_key(locations, position.turn, transform) == key
+                )
+                if winner == PLAYERS[PIECE_PLAYER[piece]]:
+                    points = 2
+                elif winner == "Draw":
+                    points = 1
+                else:
+                    points = 0
+                counts = stats.setdefault(key, {}).setdefault(book_move, [0, 0])
+                counts[0] += 1
+                counts[1] += points
+                position.make(piece, square)
+
+        book = cls(plies)
+        for key, moves in stats.items():
+            # only moves played often enough compete for the best score
+            moves = [item for item in moves.items() if item[1][0] >= min_games]
+            if not moves:
+                continue
+            book_move, (played, points) = max(
+                moves, key=lambda item: (item[1][1] / item[1][0], item[1][0])
+            )
+            book.entries[key] = book_move + (played, points)
+        return book
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, self.plies, len(self.entries)))
+            for key in sorted(self.entries):
+                f.write(ENTRY.pack(key, *self.entries[key]))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        magic, version, plies, count = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Not an opening book", path)
+        if len(data) != HEADER.size + count * ENTRY.size:
+            raise ValueError("The opening book is cut off", path)
+        book = cls(plies)
+        for entry in ENTRY.iter_unpack(data[HEADER.size :]):
+            book.entries[entry[0]] = entry[1:]
+        return book
+
+    def lookup(self, board):
+        """The book move for a Board as a string like X-2-0-1-1, or None"""
+        if len(board.moves) >= self.plies or board.game_over:
+            return None
+        key, transform = canonical(board)
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        group, start, square = entry[:3]
+        location_map = LOCATION_MAPS[INVERSES[transform]]
+        start, square = location_map[start], location_map[square]
+
+        locations, _ = locations_of(board)
+        piece = 2 * group
+        if (locations >> (4 * piece)) & 15 != start:
+            piece += 1
+        if (locations >> (4 * piece)) & 15 != start:
+            return None
+        if not board.is_legal(board.pieces[piece], divmod(square, 3)):
+            return None
+        return move_string(piece, square)
@@ -0,0 +1,225 @@
+"""Caches of results worked out for a position, such as the move an agent
+decided on or a search found.
+
+Both caches map integer keys to results and count their hits, misses and
+evictions. Keys come from ``position_key``, which packs the exact position
+with a kind, so different kinds of results can share one cache.
+
+- ``EvaluationCache`` keeps any value in this process and evicts the least
+  recently used entry once it holds ``size`` of them.
+- ``SharedCache`` keeps integer values in a block of shared memory that
+  every process of a pool can read and write. It is a hash table of buckets
+  of ``WAYS`` slots; a full bucket evicts its least recently used slot.
+  Pickling one, e.g. to hand it to a pool, attaches to the same memory.
+
+Writers to a SharedCache do not lock. Each slot has a check word, so a slot
+read while another process is writing it is a miss and never a wrong value.
+
+    cache = SharedCache(1 << 16)
+    results = run_tournament("heuristic", "heuristic", 100, cache=cache)
+    cache.unlink()
+"""
+from collections import OrderedDict
+from multiprocessing import shared_memory
+import struct
+import time
+
+from gobblers.position import packed
+
+# the kinds of results kept, see position_key
+THREAT_MOVE = 0
+SEARCH_MOVE = 1
+
+# key, value, check word, last use
+SLOT = struct.Struct("<QqQQ")
+WAYS = 4
+MASK = (1 << 64) - 1
+CHECK = 0x9E3779B97F4A7C15
+
+_MISSING = object()
+
+
+def position_key(position, kind=0):
+    """A key for a Position or Board and a kind of result. It is exact, like
+    Position.key, and two positions never share it."""
+    locations, _, turn = packed(position)
+    return locations | turn << 48 | kind << 49
+
+
+class EvaluationCache:
+    def __init__(self, size=1 << 16):
+        if size < 1:
+            raise ValueError("A cache needs room for an entry", size)
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key, default=None):
+        """The value for a key, or default if it is not cached"""
+        try:
+            value = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def get_or_compute(self, key, compute):
+        """The cached value for a key, or else compute() stored under it"""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "entries": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class SharedCache:
+    def __init__(self, size=1 << 16, name=None):
+        """Make a cache with room for size integer values, or with name
+        attach to one made in another process"""
+        if name is None:
+            buckets = max(1, -(-size // WAYS))
+            self.memory = shared_memory.SharedMemory(
+                create=True, size=buckets * WAYS * SLOT.size
+            )
+            self.owner = True
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+            self.owner = False
+        self.buckets = self.memory.size // (WAYS * SLOT.size)
+        self.size = self.buckets * WAYS
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def name(self):
+        return self.memory.name
+
+    def __getstate__(self):
+        return {"name": self.name}
+
+    def __setstate__(self, state):
+        self.__init__(name=state["name"])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        if self.owner:
+            self.unlink()
+
+    def __len__(self):
+        return sum(1 for slot in range(self.size) if self._read(slot) is not None)
+
+    def __contains__(self, key):
+        return self._find(key) is not None
+
+    def _read(self, slot):
+        """The key, value and last use in a slot, or None if it is empty or
+        half written"""
+        offset = slot * SLOT.size
+        key, value, check, used = SLOT.unpack_from(self.memory.buf, offset)
+        if used == 0 or check != key ^ (value & MASK) ^ CHECK:
+            return None
+        return key, value, used
+
+    def _write(self, slot, key, value):
+        check = key ^ (value & MASK) ^ CHECK
+        SLOT.pack_into(
+            self.memory.buf, slot * SLOT.size, key, value, check, time.monotonic_ns()
+        )
+
+    def _bucket(self, key):
+        # the low bits of a key are the first few pieces, so mix in the rest
+        mixed = (key * CHECK) & MASK
+        return (mixed ^ mixed >> 32) % self.buckets * WAYS
+
+    def _find(self, key):
+        first = self._bucket(key)
+        for slot in range(first, first + WAYS):
+            entry = self._read(slot)
+            if entry is not None and entry[0] == key:
+                return slot, entry[1]
+        return None
+
+    def get(self, key, default=None):
+        found = self._find(key)
+        if found is None:
+            self.misses += 1
+            return default
+        slot, value = found
+        # only the last use changes
+        offset = slot * SLOT.size + 24
+        struct.pack_into("<Q", self.memory.buf, offset, time.monotonic_ns())
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """Store an integer value, which has to fit in 64 signed bits"""
+        first = self._bucket(key)
+        oldest = None
+        for slot in range(first, first + WAYS):
+            entry = self._read(slot)
+            if entry is None or entry[0] == key:
+                self._write(slot, key, value)
+                return
+            if oldest is None or entry[2] < oldest[1]:
+                oldest = (slot, entry[2])
+        self._write(oldest[0], key, value)
+        self.evictions += 1
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        self.memory.buf[:] = bytes(self.memory.size)
+
+    def stats(self):
+        """The counts of this process, with the entries every process made"""
+        return {
+            "size": self.size,
+            "entries": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def close(self):
+        self.memory.close()
+
+    def unlink(self):
+        self.memory.unlink()
@@ -0,0 +1,31 @@
+import random
+
+from gobblers.agent import Agent
+from gobblers.board import Board
+from gobblers.tournament import game_seed
+import pytest
+
+
+@pytest.fixture
+def play_games():
+    """A function playing count games and returning their boards. Every game
+    has its own seed, so the tests see the same games on every run.
+
+    strategy is the Agent method playing both sides, "play" for the heuristic
+    agent or "random_play".
+    """
+
+    def play(count, strategy="play", max_moves=50, seed=0):
+        boards = []
+        for game in range(count):
+            board = Board()
+            agent = Agent(board, rng=random.Random(game_seed(seed, game)))
+            move = getattr(agent, strategy)
+            for _ in range(max_moves):
+                if board.game_over:
+                    break
+                move()
+            boards.append(board)
+        return boards
+
+    return play
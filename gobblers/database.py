@@ -0,0 +1,393 @@
+"""A game database that can find every stored game passing through a position.
+
+A database at ``path`` is made of a few files:
+
+- ``path`` is a record file (see records.py) holding the moves
+- ``path.games`` has the offset, length and result of every game
+- ``path.idx.N`` are the index segments. Each covers a run of games,
+  starting with game N, with a (canonical key, game, ply) entry for every
+  position of those games sorted by key, with keys from symmetry.canonical,
+  and then the win/draw/loss counts of every key, also sorted
+- ``path.log`` has the index entries of the games added since the last
+  segment was written, in the order they were added
+
+Segments are memory-mapped and searched by bisection, like a Tablebase, so
+opening a database reads nothing but the log and a query takes a few page
+reads in each segment. Adding a game appends to the records, the log and
+the games file, in that order. Once the log holds ``LOG_LIMIT`` entries it
+is written out as a new segment, and the newest segments are merged while
+the one before is less than twice the size of the last. Segment sizes then
+fall off geometrically, so there are only a few of them and every entry is
+rewritten a logarithmic number of times, however big the archive gets.
+
+Log entries of a game missing from the games file, say after a crash, are
+dropped when the database is opened, and so is a segment left behind by a
+merge that stopped before deleting it.
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+import heapq
+import itertools
+import mmap
+import os
+import struct
+import sys
+
+from gobblers.position import DRAW, PLAYERS, Position, parse_move
+from gobblers.records import END, MAGIC, decode_moves, encode_moves, iter_records
+from gobblers.symmetry import canonical_key
+
+GAME = struct.Struct("<QIB")
+# an entry of the log
+ENTRY = struct.Struct("<QIH")
+
+INDEX_MAGIC = b"GBIX"
+INDEX_VERSION = 2
+# magic, version, first game and game after the last, entries and keys
+INDEX_HEADER = struct.Struct("<4sIQQQQ")
+# 64 bit words of an index entry (key, game << 16 | ply), and of a key's
+# counts (key, X wins, O wins, draws, unfinished)
+ENTRY_WORDS = 2
+COUNT_WORDS = 5
+LOG_LIMIT = 1 << 16
+# entries read or written at a time when merging
+CHUNK = 1 << 14
+
+RESULTS = ["X", "O", "Draw", None]
+
+
+def _result_code(winner):
+    return RESULTS.index(winner)
+
+
+def _write_index(f, start, end, entries, counts):
+    """Write an index segment for games start to end of sorted (key, game,
+    ply) entries and sorted (key, counts) pairs, both given as iterables"""
+    f.write(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, start, end, 0, 0))
+    sizes = []
+    for rows in [
+        ((key, game << 16 | ply) for key, game, ply in entries),
+        ((key, *key_counts) for key, key_counts in counts),
+    ]:
+        size = 0
+        buffer = array("Q")
+        for row in rows:
+            buffer.extend(row)
+            size += 1
+            if len(buffer) >= CHUNK:
+                buffer.tofile(f)
+                buffer = array("Q")
+        buffer.tofile(f)
+        sizes.append(size)
+    f.seek(0)
+    f.write(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, start, end, *sizes))
+
+
+def _sum_counts(counts):
+    """Add up the counts of equal keys in sorted (key, counts) pairs"""
+    for key, group in itertools.groupby(counts, key=lambda item: item[0]):
+        yield key, [sum(column) for column in zip(*(c for _, c in group))]
+
+
+class _Segment:
+    """A memory-mapped index segment"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        size = valid = 0
+        if len(self._map) >= INDEX_HEADER.size:
+            magic, version, start, end, entries, keys = INDEX_HEADER.unpack_from(
+                self._map
+            )
+            valid = magic == INDEX_MAGIC and version == INDEX_VERSION
+            size = INDEX_HEADER.size + 8 * (ENTRY_WORDS * entries + COUNT_WORDS * keys)
+        if not valid or len(self._map) != size:
+            self.close()
+            raise ValueError("Not a database index", path)
+        self.start, self.end = start, end
+        words = memoryview(self._map)[INDEX_HEADER.size :].cast("Q")
+        self._entries = words[: ENTRY_WORDS * entries]
+        self._entry_keys = self._entries[::ENTRY_WORDS]
+        self._counts = words[ENTRY_WORDS * entries :]
+        self._count_keys = self._counts[::COUNT_WORDS]
+
+    def __len__(self):
+        return len(self._entry_keys)
+
+    def close(self):
+        self._entries = self._entry_keys = self._counts = self._count_keys = None
+        self._map.close()
+        self._file.close()
+
+    def find(self, key):
+        keys = self._entry_keys
+        start, end = bisect_left(keys, key), bisect_right(keys, key)
+        words = self._entries[ENTRY_WORDS * start : ENTRY_WORDS * end].tolist()
+        return [(word >> 16, word & 0xFFFF) for word in words[1::ENTRY_WORDS]]
+
+    def counts(self, key):
+        i = bisect_left(self._count_keys, key)
+        if i < len(self._count_keys) and self._count_keys[i] == key:
+            return self._counts[COUNT_WORDS * i + 1 : COUNT_WORDS * (i + 1)].tolist()
+        return [0, 0, 0, 0]
+
+    def iter_entries(self):
+        entries = self._entries
+        for start in range(0, len(entries), ENTRY_WORDS * CHUNK):
+            words = entries[start : start + ENTRY_WORDS * CHUNK].tolist()
+            for i in range(0, len(words), ENTRY_WORDS):
+                yield words[i], words[i + 1] >> 16, words[i + 1] & 0xFFFF
+
+    def iter_counts(self):
+        counts = self._counts
+        for start in range(0, len(counts), COUNT_WORDS * CHUNK):
+            words = counts[start : start + COUNT_WORDS * CHUNK].tolist()
+            for i in range(0, len(words), COUNT_WORDS):
+                yield words[i], words[i + 1 : i + COUNT_WORDS]
+
+
+class GameDatabase:
+    def __init__(self, path):
+        if sys.byteorder != "little":
+            raise ValueError("Databases can only be used on little-endian machines")
+        self.path = str(path)
+        self._records = open(self.path, "a+b")
+        if self._records.tell() == 0:
+            self._records.write(MAGIC)
+            self._records.flush()
+        else:
+            self._records.seek(0)
+            if self._records.read(len(MAGIC)) != MAGIC:
+                self._records.close()
+                raise ValueError("Not a game record file", self.path)
+            self._records.seek(0, os.SEEK_END)
+        self._games = open(self.path + ".games", "a+b")
+        # drop a game that was never finished writing
+        self._count = self._games.tell() // GAME.size
+        self._games.truncate(self._count * GAME.size)
+        self._log = open(self.path + ".log", "a+b")
+        self._map = None
+        self._games_map = None
+        self._segments = []
+        self._open_segments()
+        self._load_log()
+
+    def _segment_path(self, start):
+        return "{}.idx.{}".format(self.path, start)
+
+    def _open_segments(self):
+        directory, name = os.path.split(self.path)
+        prefix = name + ".idx."
+        starts = []
+        for file_name in os.listdir(directory or "."):
+            suffix = file_name[len(prefix) :]
+            if file_name.startswith(prefix) and suffix.isdigit():
+                starts.append(int(suffix))
+        for start in sorted(starts):
+            segment = _Segment(self._segment_path(start))
+            if segment.end <= self._indexed_games:
+                # merged into the segment before it, which was written first
+                segment.close()
+                os.remove(segment.path)
+                continue
+            if segment.start != self._indexed_games:
+                segment.close()
+                self._close_segments()
+                raise ValueError("An index segment is missing", self.path)
+            self._segments.append(segment)
+
+    def _close_segments(self):
+        for segment in self._segments:
+            segment.close()
+        self._segments = []
+
+    @property
+    def _indexed_games(self):
+        return self._segments[-1].end if self._segments else 0
+
+    def _load_log(self):
+        """Read the entries added since the last segment was written"""
+        # key -> [(game, ply), ...] and key -> counts of the logged games
+        self._log_index = {}
+        self._log_counts = {}
+        self._log_entries = []
+        self._log.seek(0)
+        data = self._log.read()
+        whole = data[: len(data) - len(data) % ENTRY.size]
+        size = 0
+        for key, game, ply in ENTRY.iter_unpack(whole):
+            if game >= self._count:
+                break
+            size += ENTRY.size
+            # a segment written just before a crash leaves these
+            if game >= self._indexed_games:
+                self._log_entry(key, game, ply)
+        if size < len(data):
+            # drop the entries of a game that was never finished writing
+            self._log.truncate(size)
+
+    def _log_entry(self, key, game, ply):
+        found = self._log_index.setdefault(key, [])
+        # a game's entries are logged together, so an earlier entry of the
+        # same game for this key would be the last one
+        if not found or found[-1][0] != game:
+            counts = self._log_counts.setdefault(key, [0, 0, 0, 0])
+            counts[self._game_entry(game)[2]] += 1
+        found.append((game, ply))
+        self._log_entries.append((key, game, ply))
+
+    def _game_entry(self, game):
+        """The offset, length and result code of a game"""
+        if not 0 <= game < self._count:
+            raise IndexError("No such game", game)
+        if self._games_map is None or len(self._games_map) < (game + 1) * GAME.size:
+            if self._games_map is not None:
+                self._games_map.close()
+            self._games.flush()
+            self._games_map = mmap.mmap(
+                self._games.fileno(), 0, access=mmap.ACCESS_READ
+            )
+        return GAME.unpack_from(self._games_map, game * GAME.size)
+
+    def __len__(self):
+        return self._count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        for memory in [self._map, self._games_map]:
+            if memory is not None:
+                memory.close()
+        self._map = self._games_map = None
+        self._close_segments()
+        self._records.close()
+        self._games.close()
+        self._log.close()
+
+    def add_game(self, moves, winner=None):
+        """Check a game, store it and index all of its positions. The winner is
+        taken from the moves when the game ends on the board, otherwise the
+        given winner is kept (e.g. "Draw" for a game with no moves left).
+        Returns the new game's id."""
+        position = Position()
+        keys = [canonical_key(position)]
+        for move in moves:
+            if position.winner is not None:
+                raise ValueError("Move after the end of the game", move)
+            piece, square = parse_move(move)
+            if not position.is_legal(piece, square):
+                raise ValueError("Illegal move", move)
+            position.make(piece, square)
+            keys.append(canonical_key(position))
+        if position.winner == DRAW:
+            winner = "Draw"
+        elif position.winner is not None:
+            winner = PLAYERS[position.winner]
+        result = _result_code(winner)
+
+        game = self._count
+        offset = self._records.tell()
+        self._records.write(encode_moves(moves) + bytes([END]))
+        self._records.flush()
+        self._log.write(
+            b"".join(ENTRY.pack(key, game, ply) for ply, key in enumerate(keys))
+        )
+        self._log.flush()
+        self._games.write(GAME.pack(offset, len(moves), result))
+        self._games.flush()
+        self._count += 1
+
+        for ply, key in enumerate(keys):
+            self._log_entry(key, game, ply)
+        if len(self._log_entries) >= LOG_LIMIT:
+            self.merge()
+        return game
+
+    def add_records(self, path):
+        """Add every game of a record file and return how many were added"""
+        count = 0
+        for moves in iter_records(path):
+            self.add_game(moves)
+            count += 1
+        return count
+
+    def _write_segment(self, start, end, entries, counts):
+        path = self._segment_path(start)
+        with open(path + ".tmp", "wb") as f:
+            _write_index(f, start, end, entries, counts)
+        os.replace(path + ".tmp", path)
+        return path
+
+    def merge(self):
+        """Write the logged entries out as a new index segment, empty the log
+        and merge the newest segments while they are of a similar size"""
+        if not self._log_entries:
+            return
+        path = self._write_segment(
+            self._indexed_games,
+            self._count,
+            sorted(self._log_entries),
+            sorted(self._log_counts.items()),
+        )
+        self._segments.append(_Segment(path))
+        self._log.truncate(0)
+        self._log_index = {}
+        self._log_counts = {}
+        self._log_entries = []
+
+        segments = self._segments
+        while len(segments) > 1 and len(segments[-2]) < 2 * len(segments[-1]):
+            first, second = segments[-2:]
+            entries = heapq.merge(first.iter_entries(), second.iter_entries())
+            counts = heapq.merge(first.iter_counts(), second.iter_counts())
+            # the merged segment replaces the first one before the second is
+            # deleted, and a second one left behind is dropped on opening
+            path = first.path
+            with open(path + ".tmp", "wb") as f:
+                _write_index(f, first.start, second.end, entries, _sum_counts(counts))
+            first.close()
+            second.close()
+            os.replace(path + ".tmp", path)
+            os.remove(second.path)
+            segments[-2:] = [_Segment(path)]
+
+    def game(self, game):
+        """The moves of a stored game"""
+        offset, length, _ = self._game_entry(game)
+        if self._map is None or len(self._map) < offset + length:
+            if self._map is not None:
+                self._map.close()
+            self._map = mmap.mmap(self._records.fileno(), 0, access=mmap.ACCESS_READ)
+        return decode_moves(self._map[offset : offset + length])
+
+    def winner(self, game):
+        return RESULTS[self._game_entry(game)[2]]
+
+    def find(self, position):
+        """Every (game, ply) where a stored game reached a Position or Board,
+        or one of its symmetric images"""
+        key = canonical_key(position)
+        found = []
+        for segment in self._segments:
+            found.extend(segment.find(key))
+        return found + self._log_index.get(key, [])
+
+    def stats(self, position):
+        """How the games that reached a Position or Board ended"""
+        key = canonical_key(position)
+        found = [segment.counts(key) for segment in self._segments]
+        found.append(self._log_counts.get(key, [0, 0, 0, 0]))
+        counts = [sum(column) for column in zip(*found)]
+        return {
+            "games": sum(counts),
+            "X": counts[0],
+            "O": counts[1],
+            "Draw": counts[2],
+            "unfinished": counts[3],
+        }
@@ -0,0 +1,66 @@
+"""Line features of a position, worked out in one pass over the squares.
+
+For every one of the 8 lines (in the order of position.LINES, which is also
+the order of Board.iter_lines) the features are:
+
+- ``visible[player][line]``, how many squares of the line show the player
+- ``empty[line]``, how many squares of the line are empty
+- ``gobble[player][line]``, how many squares of the line show the other
+  player with a piece smaller than the biggest piece the player can move
+
+They work on a Position or a Board. batch.py has the same features for
+many positions at once as NumPy arrays.
+"""
+from collections import namedtuple
+
+from gobblers.position import (
+    IN_HAND,
+    O,
+    PIECE_SIZE,
+    SQUARE_LINES,
+    TOP_PLAYER,
+    TOP_SIZE,
+    X,
+    packed,
+)
+
+LineFeatures = namedtuple("LineFeatures", ["visible", "empty", "gobble"])
+
+
+def largest_free(locations, occupancy, player):
+    """The size of the biggest piece a player has in hand or on top of a
+    stack, or 0 if there is none"""
+    for piece in range(6 * player + 5, 6 * player - 1, -1):
+        square = (locations >> (4 * piece)) & 15
+        if square == IN_HAND:
+            return PIECE_SIZE[piece]
+        if square < 9:
+            bits = (occupancy >> (6 * square)) & 63
+            if TOP_SIZE[bits] == PIECE_SIZE[piece]:
+                return PIECE_SIZE[piece]
+    return 0
+
+
+def line_features(position):
+    """The LineFeatures of a Position or Board"""
+    locations, occupancy, _ = packed(position)
+    free = [largest_free(locations, occupancy, player) for player in [X, O]]
+    visible = [[0] * 8, [0] * 8]
+    empty = [0] * 8
+    gobble = [[0] * 8, [0] * 8]
+    for square in range(9):
+        bits = (occupancy >> (6 * square)) & 63
+        player = TOP_PLAYER[bits]
+        lines = SQUARE_LINES[square]
+        if player is None:
+            for line in lines:
+                empty[line] += 1
+            continue
+        counts = visible[player]
+        for line in lines:
+            counts[line] += 1
+        if TOP_SIZE[bits] < free[1 - player]:
+            counts = gobble[1 - player]
+            for line in lines:
+                counts[line] += 1
+    return LineFeatures(visible, empty, gobble)
@@ -0,0 +1,153 @@
+"""Count and time calls to the hot methods of Board and Agent.
+
+Instrumentation is off until ``enable()`` is called, which swaps the
+methods in ``TARGETS`` for wrappers that count the calls, the time spent in
+them and the exceptions they raise (e.g. validate_move rejecting a probed
+move). ``disable()`` puts the original methods back, so when it is off
+there is no overhead at all.
+
+Times include the calls a method makes, so Board.play includes its
+validate_move and _check_win. Stats are kept per process: a worker of a
+multiprocessing pool counts its own calls, and ``snapshot()`` says which
+process it came from.
+
+    with instrumented():
+        Agent(Board()).play_out()
+        print(snapshot_json())
+"""
+import contextlib
+import functools
+import inspect
+import json
+import os
+import time
+
+from gobblers.agent import Agent
+from gobblers.board import Board
+
+TARGETS = [
+    (
+        Board,
+        [
+            "play",
+            "push",
+            "pop",
+            "validate_move",
+            "is_legal",
+            "_check_win",
+            "iter_lines",
+            "undo",
+            "replay",
+        ],
+    ),
+    (
+        Agent,
+        [
+            "play",
+            "random_play",
+            "check_winning_move",
+            "defend",
+            "threaten",
+            "forced_play",
+            "prefer_new",
+        ],
+    ),
+]
+
+# "Class.method" -> [calls, seconds, exceptions]
+STATS = {}
+_originals = {}
+
+
+def _wrap(function, stats):
+    if inspect.isgeneratorfunction(function):
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            stats[0] += 1
+            iterator = function(*args, **kwargs)
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    stats[1] += time.perf_counter() - start
+                    return
+                except Exception:
+                    stats[1] += time.perf_counter() - start
+                    stats[2] += 1
+                    raise
+                stats[1] += time.perf_counter() - start
+                yield item
+
+    else:
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            stats[0] += 1
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            except Exception:
+                stats[2] += 1
+                raise
+            finally:
+                stats[1] += time.perf_counter() - start
+
+    return wrapper
+
+
+def enabled():
+    return bool(_originals)
+
+
+def enable():
+    """Start counting. Stats from before are kept, see reset."""
+    if enabled():
+        return
+    for cls, names in TARGETS:
+        for name in names:
+            key = "{}.{}".format(cls.__name__, name)
+            stats = STATS.setdefault(key, [0, 0.0, 0])
+            function = cls.__dict__[name]
+            _originals[key] = (cls, name, function)
+            setattr(cls, name, _wrap(function, stats))
+
+
+def disable():
+    """Stop counting and put the original methods back"""
+    for cls, name, function in _originals.values():
+        setattr(cls, name, function)
+    _originals.clear()
+
+
+def reset():
+    for stats in STATS.values():
+        stats[:] = [0, 0.0, 0]
+
+
+@contextlib.contextmanager
+def instrumented():
+    """Count calls inside a with block, starting from zero"""
+    reset()
+    enable()
+    try:
+        yield
+    finally:
+        disable()
+
+
+def snapshot():
+    """The stats of this process as a dict"""
+    return {
+        "pid": os.getpid(),
+        "enabled": enabled(),
+        "methods": {
+            key: {"calls": calls, "seconds": seconds, "exceptions": exceptions}
+            for key, (calls, seconds, exceptions) in sorted(STATS.items())
+        },
+    }
+
+
+def snapshot_json():
+    return json.dumps(snapshot())
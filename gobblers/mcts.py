@@ -0,0 +1,204 @@
+"""Monte Carlo tree search agent.
+
+Each iteration walks down the tree picking children by UCT, adds one new
+child, then plays random moves on a Position to the end of the game and
+scores every node on the way back up. All of this happens with make/unmake
+on a single Position, so the Board being played on is never touched until
+the chosen move is pushed.
+
+Moves in the tree are stored as (piece group, from, to), where the group is
+the player and size. This way it does not matter which copy of a piece the
+opponent picked up, and the tree can be kept from one move to the next.
+"""
+import math
+import time
+
+from gobblers.agent import Agent
+from gobblers.position import DRAW, Position, move_string, parse_move
+
+
+def _describe(position, piece, square):
+    return piece // 2, position.location(piece), square
+
+
+def _resolve(position, move):
+    group, start, square = move
+    piece = 2 * group
+    if position.location(piece) != start:
+        piece += 1
+    return piece, square
+
+
+def random_move(position, rng):
+    """A random legal move for the side to move, or None if there are none.
+    Tries a few guesses before falling back to listing every move."""
+    first = 6 * position.turn
+    for _ in range(12):
+        piece = first + rng.randrange(6)
+        square = rng.randrange(9)
+        if position.is_legal(piece, square):
+            return piece, square
+    moves = list(position.legal_moves())
+    if len(moves) == 0:
+        return None
+    return rng.choice(moves)
+
+
+class Node:
+    __slots__ = ("move", "player", "parent", "children", "untried", "visits", "score")
+
+    def __init__(self, move=None, player=None, parent=None):
+        self.move = move
+        # the player who made the move leading here
+        self.player = player
+        self.parent = parent
+        self.children = []
+        # moves not expanded yet, None until the node is first visited
+        self.untried = None
+        self.visits = 0
+        self.score = 0.0
+
+    def child(self, move):
+        for child in self.children:
+            if child.move == move:
+                return child
+        return None
+
+
+class MCTSAgent(Agent):
+    def __init__(
+        self,
+        board,
+        iterations=1000,
+        time_limit=None,
+        exploration=1.4,
+        rollout_plies=60,
+        rng=None,
+    ):
+        super().__init__(board, rng=rng)
+        if iterations is None and time_limit is None:
+            raise ValueError("Give a number of iterations, a time limit, or both")
+        self.iterations = iterations
+        self.time_limit = time_limit
+        self.exploration = exploration
+        self.rollout_plies = rollout_plies
+        self.root = None
+        self._path = []
+
+    def _position(self):
+        """Replay the board on a Position and describe the moves that got there"""
+        position = Position()
+        path = []
+        for move in self.board.moves:
+            piece, square = parse_move(move)
+            path.append(_describe(position, piece, square))
+            position.make(piece, square)
+        return position, path
+
+    def _find_root(self, path):
+        """Reuse the part of the old tree below the current position"""
+        node = self.root
+        if node is None or path[: len(self._path)] != self._path:
+            node = None
+        else:
+            for move in path[len(self._path) :]:
+                node = node.child(move)
+                if node is None:
+                    break
+        if node is None:
+            node = Node()
+        node.parent = None
+        self.root = node
+        self._path = path
+        return node
+
+    def _select(self, node):
+        log_visits = math.log(node.visits)
+        exploration = self.exploration
+        best, best_value = None, None
+        for child in node.children:
+            value = child.score / child.visits + exploration * math.sqrt(
+                log_visits / child.visits
+            )
+            if best_value is None or value > best_value:
+                best, best_value = child, value
+        return best
+
+    def _rollout(self, position):
+        """Play random moves to the end and return the winner, or None"""
+        plies = 0
+        rng = self.rng
+        while position.winner is None and plies < self.rollout_plies:
+            move = random_move(position, rng)
+            if move is None:
+                break
+            position.make(*move)
+            plies += 1
+        winner = position.winner
+        for _ in range(plies):
+            position.unmake()
+        return winner
+
+    def _iterate(self, root, position):
+        node = root
+        depth = 0
+        while node.untried is not None and len(node.untried) == 0 and node.children:
+            node = self._select(node)
+            position.make(*_resolve(position, node.move))
+            depth += 1
+
+        if position.winner is None:
+            if node.untried is None:
+                node.untried = [
+                    _describe(position, piece, square)
+                    for piece, square in position.legal_moves()
+                ]
+                self.rng.shuffle(node.untried)
+            if len(node.untried) > 0:
+                move = node.untried.pop()
+                child = Node(move, position.turn, node)
+                node.children.append(child)
+                position.make(*_resolve(position, move))
+                depth += 1
+                node = child
+
+        winner = self._rollout(position)
+        while node is not None:
+            node.visits += 1
+            if winner == node.player:
+                node.score += 1
+            elif winner is None or winner == DRAW:
+                node.score += 0.5
+            node = node.parent
+
+        for _ in range(depth):
+            position.unmake()
+
+    def search(self):
+        """Run the search and return the most visited (piece, square) move"""
+        position, path = self._position()
+        root = self._find_root(path)
+        deadline = None
+        if self.time_limit is not None:
+            deadline = time.perf_counter() + self.time_limit
+        iteration = 0
+        while self.iterations is None or iteration < self.iterations:
+            if deadline is not None and time.perf_counter() > deadline:
+                break
+            self._iterate(root, position)
+            iteration += 1
+
+        if len(root.children) == 0:
+            return None
+        best = max(root.children, key=lambda child: child.visits)
+        return _resolve(position, best.move)
+
+    def play(self):
+        if self.board.game_over:
+            return
+        move = self.search()
+        if move is None:
+            # no legal moves, let random_play call the draw
+            self.random_play()
+            return
+        self.board.push(move_string(*move))
@@ -0,0 +1,329 @@
+"""A compact, integer-packed position used for fast simulation.
+
+Pieces are numbered 0-11 in the same order as ``Board.pieces``:
+``X-1-0, X-1-1, X-2-0, X-2-1, X-3-0, X-3-1, O-1-0, ..., O-3-1``.
+Squares are numbered 0-8 with square ``3 * x + y`` standing for
+``Board.state[x][y]``.
+
+Since a piece can only ever cover a strictly smaller piece, the stack on a
+square is always ordered by size. The location of every piece is therefore
+enough to recover the stacks, and a position packs into a handful of integers:
+
+- ``locations`` holds 4 bits per piece: the square, ``IN_HAND`` or ``UNUSED``
+- ``occupancy`` holds 6 bits per square, one for every (player, size) pair
+- ``visible`` holds a 9 bit mask of the squares each player shows on top
+"""
+from gobblers.zobrist import PIECE_KEYS, SIDE_KEY
+
+X = 0
+O = 1
+DRAW = 2
+PLAYERS = ["X", "O"]
+
+IN_HAND = 9
+UNUSED = 15
+ALL_IN_HAND = sum(IN_HAND << (4 * piece) for piece in range(12))
+
+PIECE_PLAYER = [piece // 6 for piece in range(12)]
+PIECE_SIZE = [(piece % 6) // 2 + 1 for piece in range(12)]
+PIECE_INDEX = [piece % 2 for piece in range(12)]
+# the bit a piece sets in the 6 bit occupancy field of its square
+PIECE_BIT = [1 << (3 * PIECE_PLAYER[p] + PIECE_SIZE[p] - 1) for p in range(12)]
+
+SQUARES = [(x, y) for x in range(3) for y in range(3)]
+
+LINES = [
+    (0, 1, 2),
+    (3, 4, 5),
+    (6, 7, 8),
+    (0, 3, 6),
+    (1, 4, 7),
+    (2, 5, 8),
+    (0, 4, 8),
+    (2, 4, 6),
+]
+# the indices of the lines through each square
+SQUARE_LINES = [
+    tuple(n for n, line in enumerate(LINES) if square in line) for square in range(9)
+]
+LINE_MASKS = [sum(1 << square for square in line) for line in LINES]
+WINNING = [any(mask & line == line for line in LINE_MASKS) for mask in range(512)]
+
+
+def _top(bits):
+    for size in [3, 2, 1]:
+        for player in [X, O]:
+            if bits & (1 << (3 * player + size - 1)):
+                return player, size
+    return None, 0
+
+
+# the visible player and size for each value of a square's occupancy field
+TOP_PLAYER = [_top(bits)[0] for bits in range(64)]
+TOP_SIZE = [_top(bits)[1] for bits in range(64)]
+
+
+def piece_id(player, size, index):
+    """Convert the (player, size, index) notation into a piece id"""
+    return PLAYERS.index(player) * 6 + (size - 1) * 2 + index
+
+
+def move_string(piece, square):
+    """Write a (piece, square) move in the notation used by Board.moves"""
+    x, y = SQUARES[square]
+    return "{}-{}-{}-{}-{}".format(
+        PLAYERS[PIECE_PLAYER[piece]], PIECE_SIZE[piece], PIECE_INDEX[piece], x, y
+    )
+
+
+def parse_move(move):
+    """Read a move like X-2-0-1-1 into a (piece, square) pair"""
+    try:
+        player, size, index, x, y = move.split("-")
+        size, index, x, y = int(size), int(index), int(x), int(y)
+    except ValueError:
+        raise ValueError("Could not parse move", move)
+    if player not in PLAYERS or size not in [1, 2, 3] or index not in [0, 1]:
+        raise ValueError("Could not parse move", move)
+    if x not in [0, 1, 2] or y not in [0, 1, 2]:
+        raise ValueError("Could not parse move", move)
+    return piece_id(player, size, index), 3 * x + y
+
+
+def locations_of(board):
+    """Pack the piece locations of a Board and say whose turn it is"""
+    locations = 0
+    for piece, location in enumerate(board.locations):
+        if location is None:
+            square = IN_HAND
+        else:
+            square = 3 * location[0] + location[1]
+        locations |= square << (4 * piece)
+    return locations, PLAYERS.index(board.next_player)
+
+
+def packed(position):
+    """The packed locations and occupancy of a Position or Board, and whose
+    turn it is"""
+    if isinstance(position, Position):
+        return position.locations, position.occupancy, position.turn
+    locations, turn = locations_of(position)
+    occupancy = 0
+    for piece in range(12):
+        square = (locations >> (4 * piece)) & 15
+        if square < 9:
+            occupancy |= PIECE_BIT[piece] << (6 * square)
+    return locations, occupancy, turn
+
+
+class Position:
+    __slots__ = (
+        "locations",
+        "occupancy",
+        "visible",
+        "turn",
+        "winner",
+        "history",
+        "hash",
+        "repetitions",
+    )
+
+    def __init__(self):
+        self.locations = ALL_IN_HAND
+        self.occupancy = 0
+        self.visible = [0, 0]
+        self.turn = X
+        self.winner = None
+        # (piece, from, to, previous winner) for every move made
+        self.history = []
+        # zobrist hash of the position and how often each hash has been seen
+        self.hash = 0
+        self.repetitions = {0: 1}
+
+    @classmethod
+    def from_moves(cls, moves):
+        """Build a position from a list of move strings, stopping when the
+        game ends just like Board.replay"""
+        position = cls()
+        for move in moves:
+            if position.winner is not None:
+                break
+            piece, square = parse_move(move)
+            if not position.is_legal(piece, square):
+                raise ValueError("Illegal move", move)
+            position.make(piece, square)
+        return position
+
+    @classmethod
+    def from_board(cls, board):
+        return cls.from_moves(board.moves)
+
+    @classmethod
+    def from_locations(cls, locations, turn=X):
+        """Set up a position from packed locations without any history.
+        Pieces can be left out of the game by giving them the location UNUSED.
+        """
+        position = cls()
+        position.locations = locations
+        position.turn = turn
+        hash = SIDE_KEY if turn else 0
+        occupancy = 0
+        for piece in range(12):
+            square = (locations >> (4 * piece)) & 15
+            if square < 9:
+                occupancy |= PIECE_BIT[piece] << (6 * square)
+                hash ^= PIECE_KEYS[piece][square]
+        position.occupancy = occupancy
+        for square in range(9):
+            position._set_visible(square, (occupancy >> (6 * square)) & 63)
+        position.hash = hash
+        position.repetitions = {hash: 1}
+        if WINNING[position.visible[1 - turn]]:
+            position.winner = 1 - turn
+        return position
+
+    def to_moves(self):
+        return [move_string(piece, to) for piece, _, to, _ in self.history]
+
+    def to_board(self):
+        from gobblers.board import Board
+
+        board = Board()
+        board.replay(self.to_moves())
+        return board
+
+    @property
+    def game_over(self):
+        return self.winner is not None
+
+    @property
+    def key(self):
+        """An integer identifying the pieces on the board and the side to move"""
+        return self.locations | self.turn << 48
+
+    def location(self, piece):
+        return (self.locations >> (4 * piece)) & 15
+
+    def top(self, square):
+        """The piece visible on a square, or None"""
+        bits = (self.occupancy >> (6 * square)) & 63
+        size = TOP_SIZE[bits]
+        if size == 0:
+            return None
+        piece = 6 * TOP_PLAYER[bits] + 2 * (size - 1)
+        if self.location(piece) != square:
+            piece += 1
+        return piece
+
+    def stack(self, square):
+        """The pieces on a square, top first, like Board.state[x][y]"""
+        return [
+            piece
+            for piece in sorted(range(12), key=PIECE_SIZE.__getitem__, reverse=True)
+            if self.location(piece) == square
+        ]
+
+    def _set_visible(self, square, bits):
+        mask = 1 << square
+        player = TOP_PLAYER[bits]
+        visible = self.visible
+        visible[X] &= ~mask
+        visible[O] &= ~mask
+        if player is not None:
+            visible[player] |= mask
+
+    def is_legal(self, piece, square):
+        """Check a move against the same rules as Board.validate_move"""
+        if self.winner is not None or PIECE_PLAYER[piece] != self.turn:
+            return False
+        size = PIECE_SIZE[piece]
+        occupancy = self.occupancy
+        if TOP_SIZE[(occupancy >> (6 * square)) & 63] >= size:
+            return False
+        start = (self.locations >> (4 * piece)) & 15
+        if start == IN_HAND:
+            return True
+        if start == UNUSED:
+            return False
+        bits = (occupancy >> (6 * start)) & 63
+        if TOP_SIZE[bits] != size:
+            # covered
+            return False
+
+        # lifting the piece must not reveal three in a row
+        below = TOP_PLAYER[bits ^ PIECE_BIT[piece]]
+        if below is None:
+            return True
+        return not WINNING[self.visible[below] | (1 << start)]
+
+    def legal_moves(self):
+        """Yield every legal (piece, square) pair for the side to move.
+
+        The two copies of a piece are interchangeable while both are in hand,
+        so only the first copy is offered in that case.
+        """
+        if self.winner is not None:
+            return
+        locations = self.locations
+        first = 6 * self.turn
+        for piece in range(first, first + 6):
+            start = (locations >> (4 * piece)) & 15
+            if start == UNUSED:
+                continue
+            if (
+                start == IN_HAND
+                and PIECE_INDEX[piece] == 1
+                and (locations >> (4 * (piece - 1))) & 15 == IN_HAND
+            ):
+                continue
+            for square in range(9):
+                if self.is_legal(piece, square):
+                    yield piece, square
+
+    def make(self, piece, square):
+        """Play a move without validating it. Undo it with unmake."""
+        start = (self.locations >> (4 * piece)) & 15
+        bit = PIECE_BIT[piece]
+        occupancy = self.occupancy
+        if start != IN_HAND:
+            occupancy ^= bit << (6 * start)
+            self._set_visible(start, (occupancy >> (6 * start)) & 63)
+        occupancy |= bit << (6 * square)
+        self._set_visible(square, (occupancy >> (6 * square)) & 63)
+        self.occupancy = occupancy
+        self.locations ^= (start ^ square) << (4 * piece)
+
+        self.history.append((piece, start, square, self.winner))
+        keys = PIECE_KEYS[piece]
+        hash = self.hash ^ keys[square] ^ SIDE_KEY
+        if start != IN_HAND:
+            hash ^= keys[start]
+        self.hash = hash
+        count = self.repetitions.get(hash, 0) + 1
+        self.repetitions[hash] = count
+        if count == 3:
+            self.winner = DRAW
+        player = PIECE_PLAYER[piece]
+        if WINNING[self.visible[player]]:
+            self.winner = player
+        self.turn ^= 1
+
+    def unmake(self):
+        """Take back the last move made"""
+        piece, start, square, winner = self.history.pop()
+        self.repetitions[self.hash] -= 1
+        keys = PIECE_KEYS[piece]
+        self.hash ^= keys[square] ^ SIDE_KEY
+        if start != IN_HAND:
+            self.hash ^= keys[start]
+
+        bit = PIECE_BIT[piece]
+        occupancy = self.occupancy ^ (bit << (6 * square))
+        self._set_visible(square, (occupancy >> (6 * square)) & 63)
+        if start != IN_HAND:
+            occupancy |= bit << (6 * start)
+            self._set_visible(start, (occupancy >> (6 * start)) & 63)
+        self.occupancy = occupancy
+        self.locations ^= (start ^ square) << (4 * piece)
+        self.winner = winner
+        self.turn ^= 1
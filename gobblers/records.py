@@ -0,0 +1,106 @@
+"""A compact binary format for game records.
+
+Every move is one byte, ``piece << 4 | square``, with pieces and squares
+numbered as in position.py, so ``X-2-0-1-1`` is ``0x24``. A game is its
+moves followed by ``END`` (0xFF). A record file is ``MAGIC`` followed by
+games one after another, so files can be appended to and read as a stream.
+"""
+from gobblers.position import move_string, parse_move
+
+MAGIC = b"GBRC\x01"
+END = 0xFF
+_END = bytes([END])
+
+ENCODE = {}
+DECODE = [None] * 256
+for _piece in range(12):
+    for _square in range(9):
+        _byte = _piece << 4 | _square
+        ENCODE[move_string(_piece, _square)] = _byte
+        DECODE[_byte] = move_string(_piece, _square)
+
+
+def encode_moves(moves):
+    """Pack a list of moves written like X-2-0-1-1 into bytes"""
+    try:
+        return bytes([ENCODE[move] for move in moves])
+    except KeyError:
+        # let parse_move say what is wrong with the move
+        for move in moves:
+            parse_move(move)
+        raise
+
+
+def decode_moves(data):
+    """Unpack bytes from encode_moves into a list of moves"""
+    moves = [DECODE[byte] for byte in data]
+    if None in moves:
+        raise ValueError("Not a move byte", data[moves.index(None)])
+    return moves
+
+
+class RecordWriter:
+    """Write games to a record file. Opening an existing file appends to it.
+    An open binary file, like sys.stdout.buffer, starts a new stream and is
+    left open."""
+
+    def __init__(self, path):
+        if hasattr(path, "write"):
+            self._file, self._owned = path, False
+            self._file.write(MAGIC)
+        else:
+            self._file, self._owned = open(path, "ab"), True
+            if self._file.tell() == 0:
+                self._file.write(MAGIC)
+        self.count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, moves):
+        self._file.write(encode_moves(moves) + _END)
+        self.count += 1
+
+    def write_many(self, games):
+        for moves in games:
+            self.write(moves)
+
+    def close(self):
+        if self._owned:
+            self._file.close()
+        else:
+            self._file.flush()
+
+
+def iter_raw_records(path, chunk_size=1 << 20):
+    """Yield the packed bytes of every game in a record file, reading it in
+    chunks so that files of any size can be read"""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError("Not a game record file", path)
+        rest = b""
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            games = (rest + chunk).split(_END)
+            rest = games.pop()
+            yield from games
+        if rest:
+            raise ValueError("The last game in the file is cut off", path)
+
+
+def iter_records(path, chunk_size=1 << 20):
+    """Yield the moves of every game in a record file"""
+    for data in iter_raw_records(path, chunk_size):
+        yield decode_moves(data)
+
+
+def write_records(path, games):
+    """Append games to a record file and return how many were written"""
+    with RecordWriter(path) as writer:
+        writer.write_many(games)
+        return writer.count
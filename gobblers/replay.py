@@ -0,0 +1,111 @@
+"""Validate and replay large numbers of games.
+
+``Replayer`` checks games one after another on a single Position. Before
+each game it takes back only the moves that differ from the last game, so
+an opening shared by many games is checked once. Games are sorted within a
+batch to make the shared openings line up, and results come back in the
+original order with an error for every bad game instead of stopping at the
+first one.
+"""
+from collections import namedtuple
+import multiprocessing
+
+from gobblers.position import DRAW, PLAYERS, Position, move_string
+from gobblers.records import iter_records
+
+ReplayResult = namedtuple("ReplayResult", ["game", "error", "ply", "winner"])
+
+# every move string and its (piece, square)
+MOVES = {move_string(p, s): (p, s) for p in range(12) for s in range(9)}
+
+
+class Replayer:
+    def __init__(self):
+        self.position = Position()
+        # the moves made on position, all of them valid
+        self.moves = []
+
+    def check(self, moves):
+        """Replay a game and return None if it is valid, or the error and the
+        ply it happened on"""
+        position = self.position
+        made = self.moves
+        common = 0
+        limit = min(len(made), len(moves))
+        while common < limit and made[common] == moves[common]:
+            common += 1
+        while len(made) > common:
+            position.unmake()
+            made.pop()
+
+        for ply in range(common, len(moves)):
+            move = moves[ply]
+            if position.winner is not None:
+                return "Move after the end of the game: {}".format(move), ply
+            pair = MOVES.get(move)
+            if pair is None:
+                return "Could not parse move: {}".format(move), ply
+            if not position.is_legal(*pair):
+                return "Illegal move: {}".format(move), ply
+            position.make(*pair)
+            made.append(move)
+        return None
+
+    @property
+    def winner(self):
+        winner = self.position.winner
+        if winner is None:
+            return None
+        if winner == DRAW:
+            return "Draw"
+        return PLAYERS[winner]
+
+
+def _check_batch(args):
+    start, games = args
+    replayer = Replayer()
+    results = [None] * len(games)
+    for i in sorted(range(len(games)), key=games.__getitem__):
+        failure = replayer.check(games[i])
+        if failure is None:
+            result = ReplayResult(start + i, None, len(games[i]), replayer.winner)
+        else:
+            result = ReplayResult(start + i, failure[0], failure[1], None)
+        results[i] = result
+    return results
+
+
+def _batches(games, batch_size):
+    batch = []
+    start = 0
+    for moves in games:
+        batch.append(list(moves))
+        if len(batch) == batch_size:
+            yield start, batch
+            start += batch_size
+            batch = []
+    if batch:
+        yield start, batch
+
+
+def replay_games(games, processes=1, batch_size=10000):
+    """Check every game in an iterable of move lists and yield a ReplayResult
+    for each, in order. A result has error None for a valid game, and
+    otherwise the error and the ply of the first bad move.
+
+    processes=1 checks in this process, None uses every core.
+    """
+    batches = _batches(games, batch_size)
+    if processes == 1:
+        for batch in batches:
+            yield from _check_batch(batch)
+        return
+
+    with multiprocessing.Pool(processes) as pool:
+        for results in pool.imap(_check_batch, batches):
+            yield from results
+
+
+def replay_record_file(path, processes=1, batch_size=10000):
+    """replay_games over the games of a record file, read as a stream"""
+    return replay_games(iter_records(path), processes, batch_size)
@@ -0,0 +1,341 @@
+"""An asyncio server hosting many games at once.
+
+Clients talk to the server over TCP or a Unix socket, one JSON object per
+line each way. Every request has an ``op`` and may have an ``id``, which is
+sent back with the response. Responses have ``ok`` and, when it is false,
+an ``error``.
+
+- ``{"op": "new", "x": "human", "o": "heuristic", "seed": 1}`` starts a
+  session, each player is "human" or one of tournament.STRATEGIES
+- ``{"op": "move", "session": 1, "move": "X-1-0-1-1"}`` plays a human move
+- ``{"op": "state", "session": 1, "wait": true}`` gives the game so far,
+  with wait it first lets agent-vs-agent games finish
+- ``{"op": "metrics", "session": 1}`` gives move latencies, for the session
+  or, without one, for the whole server
+- ``{"op": "close", "session": 1}`` ends a session
+
+Agent moves are played in a worker pool, so a slow search never holds up
+the other sessions. After a human move the agents reply before the response
+is sent; agent-vs-agent games play on in the background.
+
+If an agent move fails, for example because a worker died, the session
+stays on the agent's turn and its state has the error in ``agent_error``.
+The next ``move`` or ``state`` request tries the agent again, and a pool
+the server made itself is replaced once it is broken.
+"""
+import asyncio
+import collections
+import concurrent.futures
+import itertools
+import json
+import logging
+import random
+import time
+
+from gobblers.board import Board
+from gobblers.tournament import STRATEGIES, game_seed, player_rng
+
+logger = logging.getLogger(__name__)
+
+HUMAN = "human"
+# how errors name the types of request fields
+TYPE_NAMES = {int: "an integer", str: "a string"}
+# how many recent latencies each session keeps for its percentiles
+LATENCY_WINDOW = 1000
+
+
+def _field(request, name, kind, default=None):
+    """A field of a request, which has to be of the given type if it is
+    there. JSON true and false are not integers here."""
+    value = request.get(name, default)
+    if not isinstance(value, kind) or (kind is int and isinstance(value, bool)):
+        raise ValueError("{} must be {}".format(name, TYPE_NAMES[kind]), value)
+    return value
+
+
+class AgentError(Exception):
+    """An agent move could not be played"""
+
+
+def agent_move(strategy, moves, seed):
+    """Play one move of a strategy after the given moves and return it, or
+    None if the agent had no move and called a draw. Runs in a worker."""
+    board = Board()
+    board.replay(moves)
+    STRATEGIES[strategy](board, player_rng(seed, board.next_player))()
+    if len(board.moves) > len(moves):
+        return board.moves[-1]
+    return None
+
+
+class Latency:
+    """Count, mean, max and recent percentiles of move times"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent = collections.deque(maxlen=LATENCY_WINDOW)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.recent.append(seconds)
+
+    def summary(self):
+        recent = sorted(self.recent)
+
+        def percentile(p):
+            if not recent:
+                return 0.0
+            return 1000 * recent[min(len(recent) - 1, int(p * len(recent)))]
+
+        return {
+            "moves": self.count,
+            "mean_ms": 1000 * self.total / self.count if self.count else 0.0,
+            "max_ms": 1000 * self.max,
+            "p50_ms": percentile(0.5),
+            "p95_ms": percentile(0.95),
+        }
+
+
+class Session:
+    def __init__(self, id, players, seed):
+        self.id = id
+        self.board = Board()
+        self.players = players
+        self.seed = seed
+        # one move at a time, whoever asks for it
+        self.lock = asyncio.Lock()
+        self.latency = {HUMAN: Latency(), "agent": Latency()}
+        self.task = None
+        # why the last agent move failed, until one succeeds
+        self.error = None
+
+    def state(self):
+        board = self.board
+        return {
+            "session": self.id,
+            "players": self.players,
+            "moves": board.moves,
+            "next_player": board.next_player,
+            "game_over": board.game_over,
+            "winner": board.winner,
+            "agent_error": self.error,
+        }
+
+
+class GameServer:
+    def __init__(self, executor=None, workers=None, max_sessions=10000, max_moves=200):
+        # only a pool made here is replaced when it breaks
+        self.workers = workers
+        self._owns_executor = executor is None
+        if executor is None:
+            executor = concurrent.futures.ProcessPoolExecutor(workers)
+        self.executor = executor
+        self.agent_failures = 0
+        self.max_sessions = max_sessions
+        self.max_moves = max_moves
+        self.sessions = {}
+        self._ids = itertools.count(1)
+        self.latency = {HUMAN: Latency(), "agent": Latency()}
+        self.ops = {
+            "new": self.new,
+            "move": self.move,
+            "state": self.state,
+            "metrics": self.metrics,
+            "close": self.close_session,
+        }
+
+    def _session(self, request):
+        id = _field(request, "session", int)
+        if id not in self.sessions:
+            raise ValueError("No such session", id)
+        return self.sessions[id]
+
+    def _record(self, session, kind, seconds):
+        session.latency[kind].add(seconds)
+        self.latency[kind].add(seconds)
+
+    async def _advance(self, session):
+        """Let the agents move until it is a human's turn or the game is over"""
+        board = session.board
+        loop = asyncio.get_running_loop()
+        while (
+            not board.game_over
+            and session.players[board.next_player] != HUMAN
+            and len(board.moves) < self.max_moves
+        ):
+            start = time.perf_counter()
+            executor = self.executor
+            try:
+                move = await loop.run_in_executor(
+                    executor,
+                    agent_move,
+                    session.players[board.next_player],
+                    list(board.moves),
+                    game_seed(session.seed, len(board.moves)),
+                )
+            except Exception as error:
+                self._agent_failed(session, executor, error)
+                raise AgentError("The agent could not move", session.error) from error
+            session.error = None
+            if move is None:
+                board.game_over = True
+                board.winner = "Draw"
+            else:
+                board.push(move)
+            self._record(session, "agent", time.perf_counter() - start)
+
+    def _agent_failed(self, session, executor, error):
+        session.error = repr(error)
+        self.agent_failures += 1
+        logger.warning("Session %s: agent move failed: %r", session.id, error)
+        broken = isinstance(error, concurrent.futures.BrokenExecutor)
+        if broken and self._owns_executor and executor is self.executor:
+            logger.warning("Replacing the broken worker pool")
+            self.executor = concurrent.futures.ProcessPoolExecutor(self.workers)
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _play_out(self, session):
+        """Play an agent-vs-agent game in the background. A failed move is
+        logged and kept in the session, for a state request to retry."""
+        async with session.lock:
+            try:
+                await self._advance(session)
+            except AgentError:
+                pass
+
+    async def new(self, request):
+        if len(self.sessions) >= self.max_sessions:
+            raise ValueError("Too many sessions")
+        players = {
+            "X": _field(request, "x", str, HUMAN),
+            "O": _field(request, "o", str, HUMAN),
+        }
+        for player in players.values():
+            if player != HUMAN and player not in STRATEGIES:
+                choices = [HUMAN] + sorted(STRATEGIES)
+                raise ValueError("Unknown player, pick from", choices)
+        seed = _field(request, "seed", int, random.getrandbits(32))
+        session = Session(next(self._ids), players, seed)
+        self.sessions[session.id] = session
+        if HUMAN in players.values():
+            # a failed first move is in the state, and tried again later
+            await self._play_out(session)
+        else:
+            session.task = asyncio.create_task(self._play_out(session))
+        return session.state()
+
+    async def move(self, request):
+        session = self._session(request)
+        async with session.lock:
+            # an agent move that failed before goes first
+            await self._advance(session)
+            board = session.board
+            if board.game_over:
+                raise ValueError("The game is over")
+            if session.players[board.next_player] != HUMAN:
+                raise ValueError("It is not a human's turn")
+            move = request.get("move")
+            if not isinstance(move, str):
+                raise ValueError("A move is a string like X-2-0-1-1")
+            start = time.perf_counter()
+            board.push(move)
+            self._record(session, HUMAN, time.perf_counter() - start)
+            await self._advance(session)
+        return session.state()
+
+    async def state(self, request):
+        session = self._session(request)
+        if session.task is None:
+            async with session.lock:
+                await self._advance(session)
+        else:
+            if session.task.done() and session.error is not None:
+                session.task = asyncio.create_task(self._play_out(session))
+            if request.get("wait"):
+                await asyncio.shield(session.task)
+        return session.state()
+
+    async def metrics(self, request):
+        if "session" in request:
+            latency = self._session(request).latency
+        else:
+            latency = self.latency
+        metrics = {kind: latency[kind].summary() for kind in latency}
+        if "session" not in request:
+            metrics["sessions"] = len(self.sessions)
+            metrics["agent_failures"] = self.agent_failures
+        return metrics
+
+    async def close_session(self, request):
+        session = self._session(request)
+        del self.sessions[session.id]
+        if session.task is not None:
+            session.task.cancel()
+        return {"session": session.id}
+
+    async def handle(self, request):
+        """Answer one request, given as a dict"""
+        response = {}
+        if isinstance(request, dict) and "id" in request:
+            response["id"] = request["id"]
+        try:
+            if not isinstance(request, dict):
+                raise ValueError("A request must be a JSON object")
+            op = request.get("op")
+            op = self.ops.get(op) if isinstance(op, str) else None
+            if op is None:
+                raise ValueError("Unknown op, pick from", sorted(self.ops))
+            response.update(await op(request))
+            response["ok"] = True
+        except (AgentError, TypeError, ValueError) as error:
+            # a bad request gets an error and the connection stays open
+            response["ok"] = False
+            response["error"] = " ".join(str(arg) for arg in error.args)
+        return response
+
+    async def serve_client(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                except json.JSONDecodeError:
+                    response = {"ok": False, "error": "Not a JSON line"}
+                else:
+                    response = await self.handle(request)
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host="127.0.0.1", port=0, path=None):
+        """Start listening on a Unix socket at path, or else on TCP, and
+        return the asyncio server"""
+        if path is not None:
+            return await asyncio.start_unix_server(self.serve_client, path)
+        return await asyncio.start_server(self.serve_client, host, port)
+
+    def close(self):
+        for session in self.sessions.values():
+            if session.task is not None:
+                session.task.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def serve(host="127.0.0.1", port=7777, path=None, workers=None):
+    """Run a GameServer until cancelled"""
+    game_server = GameServer(workers=workers)
+    server = await game_server.start(host, port, path)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        game_server.close()
@@ -0,0 +1,229 @@
+"""Iterative deepening alpha-beta search over Position.
+
+Scores are from the point of view of the side to move. A win is worth
+``WIN`` minus the number of plies it takes, so quicker wins score higher and
+slower losses score higher than quick ones. Positions at the depth limit
+are scored by ``evaluate``.
+"""
+import time
+
+from gobblers.position import (
+    DRAW,
+    LINE_MASKS,
+    PIECE_SIZE,
+    WINNING,
+    Position,
+    move_string,
+)
+
+WIN = 10000
+MAX_DEPTH = 64
+# any score further than this from 0 is a forced win or loss
+WIN_THRESHOLD = WIN - 1000
+
+# the clock is read every CLOCK_MASK + 1 nodes, and before every root move
+CLOCK_MASK = 63
+
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+# COMPLETIONS[mask] has a bit for every square that finishes a line of mask
+COMPLETIONS = [
+    sum(
+        1 << square
+        for square in range(9)
+        if not mask & (1 << square) and WINNING[mask | (1 << square)]
+    )
+    for mask in range(512)
+]
+POPCOUNT = [bin(mask).count("1") for mask in range(512)]
+
+
+class _Timeout(Exception):
+    pass
+
+
+def evaluate(position):
+    """A quick score for lines that only one player shows pieces on"""
+    me = position.visible[position.turn]
+    them = position.visible[1 - position.turn]
+    score = 0
+    for line in LINE_MASKS:
+        mine = POPCOUNT[me & line]
+        theirs = POPCOUNT[them & line]
+        if theirs == 0:
+            score += mine * mine
+        elif mine == 0:
+            score -= theirs * theirs
+    return score
+
+
+def _to_table(score, ply):
+    """Store forced results relative to the node rather than the root"""
+    if score > WIN_THRESHOLD:
+        return score + ply
+    if score < -WIN_THRESHOLD:
+        return score - ply
+    return score
+
+
+def _from_table(score, ply):
+    if score > WIN_THRESHOLD:
+        return score - ply
+    if score < -WIN_THRESHOLD:
+        return score + ply
+    return score
+
+
+class Solver:
+    def __init__(self, table_size=1 << 18):
+        self.table_size = table_size
+        # hash -> (depth, score, flag, best move)
+        self.table = {}
+        self.nodes = 0
+        self._deadline = None
+
+    def _store(self, hash, depth, score, flag, move):
+        table = self.table
+        if hash not in table and len(table) >= self.table_size:
+            # drop the oldest entry
+            del table[next(iter(table))]
+        table[hash] = (depth, score, flag, move)
+
+    def order_moves(self, position, first=None):
+        """Sort moves: the remembered best move, wins, blocks, then big pieces"""
+        wins = COMPLETIONS[position.visible[position.turn]]
+        blocks = COMPLETIONS[position.visible[1 - position.turn]]
+
+        def rank(move):
+            piece, square = move
+            if move == first:
+                group = 0
+            elif wins & (1 << square):
+                group = 1
+            elif blocks & (1 << square):
+                group = 2
+            else:
+                group = 3
+            return group, -PIECE_SIZE[piece]
+
+        return sorted(position.legal_moves(), key=rank)
+
+    def _check_time(self):
+        if self._deadline is not None and time.perf_counter() > self._deadline:
+            raise _Timeout()
+
+    def _negamax(self, position, depth, alpha, beta, ply):
+        self.nodes += 1
+        if self.nodes & CLOCK_MASK == 0:
+            self._check_time()
+
+        winner = position.winner
+        if winner is not None:
+            if winner == DRAW:
+                return 0
+            # the player who just moved won
+            return ply - WIN
+        if depth == 0:
+            return evaluate(position)
+
+        original_alpha = alpha
+        first = None
+        entry = self.table.get(position.hash)
+        if entry is not None:
+            entry_depth, score, flag, first = entry
+            if entry_depth >= depth:
+                score = _from_table(score, ply)
+                if flag == EXACT:
+                    return score
+                if flag == LOWER:
+                    alpha = max(alpha, score)
+                else:
+                    beta = min(beta, score)
+                if alpha >= beta:
+                    return score
+
+        moves = self.order_moves(position, first)
+        if len(moves) == 0:
+            # with no legal move the game is called a draw
+            return 0
+
+        best, best_move = -WIN - 1, None
+        for move in moves:
+            position.make(*move)
+            score = -self._negamax(position, depth - 1, -beta, -alpha, ply + 1)
+            position.unmake()
+            if score > best:
+                best, best_move = score, move
+            if best > alpha:
+                alpha = best
+            if alpha >= beta:
+                break
+
+        if best <= original_alpha:
+            flag = UPPER
+        elif best >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self._store(position.hash, depth, _to_table(best, ply), flag, best_move)
+        return best
+
+    def _search_root(self, position, depth, moves):
+        alpha, beta = -WIN - 1, WIN + 1
+        best, best_move = -WIN - 1, None
+        for move in moves:
+            self._check_time()
+            position.make(*move)
+            score = -self._negamax(position, depth - 1, -beta, -alpha, 1)
+            position.unmake()
+            if score > best:
+                best, best_move = score, move
+            alpha = max(alpha, best)
+        return best_move, best
+
+    def search(self, position, depth=None, time_limit=None):
+        """Search until depth plies are finished or time_limit seconds pass.
+        Returns the best (piece, square) move and its score, or (None, 0) if
+        there is no legal move.
+        """
+        if depth is None and time_limit is None:
+            raise ValueError("Give a depth, a time limit, or both")
+        if position.winner is not None:
+            raise ValueError("The game is over")
+
+        moves = self.order_moves(position)
+        if len(moves) == 0:
+            return None, 0
+
+        self._deadline = None
+        if time_limit is not None:
+            self._deadline = time.perf_counter() + time_limit
+        plies = len(position.history)
+        result = moves[0], 0
+        for current in range(1, (depth or MAX_DEPTH) + 1):
+            try:
+                move, score = self._search_root(position, current, moves)
+            except _Timeout:
+                while len(position.history) > plies:
+                    position.unmake()
+                break
+            result = move, score
+            if abs(score) > WIN_THRESHOLD:
+                break
+            # search the best move first on the next iteration
+            moves.remove(move)
+            moves.insert(0, move)
+        self._deadline = None
+        return result
+
+
+def best_move(board, depth=None, time_limit=None, solver=None):
+    """Search a Board's position and return the best move as a string like
+    X-2-0-1-1 along with its score"""
+    solver = solver or Solver()
+    move, score = solver.search(Position.from_board(board), depth, time_limit)
+    if move is None:
+        return None, score
+    return move_string(*move), score
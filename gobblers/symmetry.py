@@ -0,0 +1,87 @@
+"""The 8 symmetries of the board and symmetry-canonical position keys.
+
+Each transform is a permutation of the squares 0-8 (square ``3 * x + y``).
+Transforms 4-7 are the reflections that ``Board.reflect`` calls 0-3.
+
+``canonical`` maps a position to the smallest key among its 8 images, so
+that tables keyed on it store one entry for each class of equivalent
+positions. The key also forgets which copy of a piece is which.
+"""
+from gobblers.position import packed
+
+_TRANSFORMS = [
+    lambda x, y: (x, y),
+    lambda x, y: (y, 2 - x),
+    lambda x, y: (2 - x, 2 - y),
+    lambda x, y: (2 - y, x),
+    lambda x, y: (2 - x, y),
+    lambda x, y: (y, x),
+    lambda x, y: (x, 2 - y),
+    lambda x, y: (2 - y, 2 - x),
+]
+
+# PERMUTATIONS[t][square] is where transform t sends square
+PERMUTATIONS = [
+    [3 * tx + ty for tx, ty in (f(x, y) for x in range(3) for y in range(3))]
+    for f in _TRANSFORMS
+]
+# INVERSES[t] is the transform that undoes transform t
+INVERSES = [
+    next(u for u in range(8) if all(PERMUTATIONS[u][p[s]] == s for s in range(9)))
+    for p in PERMUTATIONS
+]
+
+# LOCATION_MAPS[t][location] also leaves IN_HAND and UNUSED alone
+LOCATION_MAPS = [p + list(range(9, 16)) for p in PERMUTATIONS]
+
+
+def _pair_table(location_map):
+    """Transform the 8 bits holding both copies of a piece, putting the lower
+    location first"""
+    table = []
+    for pair in range(256):
+        first = location_map[pair & 15]
+        second = location_map[pair >> 4]
+        if second < first:
+            first, second = second, first
+        table.append(first | second << 4)
+    return table
+
+
+PAIR_TABLES = [_pair_table(location_map) for location_map in LOCATION_MAPS]
+
+
+def transform_key(locations, turn, transform):
+    """The key of the image of a position under a transform"""
+    table = PAIR_TABLES[transform]
+    key = turn << 48
+    for shift in range(0, 48, 8):
+        key |= table[(locations >> shift) & 255] << shift
+    return key
+
+
+def canonical(position):
+    """Return the smallest key among the 8 images of a Position or Board,
+    and the transform that produced it"""
+    locations, _, turn = packed(position)
+    best, best_transform = None, 0
+    for transform in range(8):
+        key = transform_key(locations, turn, transform)
+        if best is None or key < best:
+            best, best_transform = key, transform
+    return best, best_transform
+
+
+def canonical_key(position):
+    return canonical(position)[0]
+
+
+def transform_square(square, transform):
+    return PERMUTATIONS[transform][square]
+
+
+def transform_move(move, transform):
+    """Transform a move written like X-2-0-1-1"""
+    player, size, index, x, y = move.split("-")
+    square = PERMUTATIONS[transform][3 * int(x) + int(y)]
+    return "{}-{}-{}-{}-{}".format(player, size, index, square // 3, square % 3)
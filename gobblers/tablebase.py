@@ -0,0 +1,521 @@
+"""Retrograde analysis of the game into an on-disk tablebase.
+
+``build`` (or ``gobblers tablebase``) walks every position reachable from a
+root, one entry for each symmetry class (see symmetry.py), then works
+backwards from the finished games to label every position a win, loss or
+draw for the side to move along with the number of plies to the end with
+best play. Winners take the shortest way to the end and losers the longest.
+Positions that can never be forced to an end are draws, and so are positions
+with no legal move, as in Agent.random_play. Threefold repetition is not
+part of the tablebase.
+
+Positions are numbered by a ``Space``: for every size, where X's and O's
+copies of the piece are is one of a short list of placements, and the index
+of a position is made of its three placements and the side to move. The
+solve keeps two arrays over the whole space in memory-mapped files, about 3
+bytes an index, and the positions still to look at in queues on disk, one
+level at a time. The way back from a position is found by taking a move
+back rather than by remembering parents, so memory does not grow with the
+game. With processes, every level is worked out in a multiprocessing pool.
+
+The file layout is a 24 byte header (with how many copies of every piece
+the space has) followed by the sorted indexes of the solved positions as
+little-endian unsigned 64 bit integers and then one unsigned 16 bit value
+per index, ``result | distance << 2``. ``Tablebase`` memory-maps the file
+and finds positions by binary search, so nothing is loaded up front.
+"""
+from array import array
+from bisect import bisect_left
+import contextlib
+import itertools
+import mmap
+import multiprocessing
+import os
+import struct
+import sys
+import tempfile
+
+from gobblers.position import (
+    IN_HAND,
+    PIECE_SIZE,
+    TOP_SIZE,
+    UNUSED,
+    Position,
+    locations_of,
+    move_string,
+)
+from gobblers.symmetry import canonical_key
+
+DRAW = 0
+WIN = 1
+LOSS = 2
+
+MAGIC = b"GBTB"
+VERSION = 2
+# magic, version, count and the copies of every piece, see Space
+HEADER = struct.Struct("<4sIQ6B2x")
+KEY_MASK = (1 << 48) - 1
+
+# values in the solve's array: a reached position that is not decided yet,
+# which is a draw if it stays that way, and one that was never reached
+REACHED = 3
+UNREACHED = 0
+# indexes read or written at a time
+CHUNK = 1 << 14
+
+
+def position_from_key(key):
+    return Position.from_locations(key & KEY_MASK, key >> 48)
+
+
+def _pairs(copies):
+    """Every way to place the given number of copies of a piece, as the byte
+    holding both copies' locations with the lower one first, the way
+    canonical keys have them"""
+    if copies == 0:
+        return [UNUSED | UNUSED << 4]
+    if copies == 1:
+        return [location | UNUSED << 4 for location in range(IN_HAND + 1)]
+    return [
+        first | second << 4
+        for second in range(IN_HAND + 1)
+        for first in range(second + (second == IN_HAND))
+    ]
+
+
+def _squares(pair):
+    return {location for location in [pair & 15, pair >> 4] if location < 9}
+
+
+class Space:
+    """Numbers the positions of a game with copies[3 * player + size - 1]
+    copies of every piece"""
+
+    def __init__(self, copies=(2, 2, 2, 2, 2, 2)):
+        self.copies = tuple(copies)
+        # for every size, the placements as X's pair | O's pair << 8
+        self.placements = []
+        self.ranks = []
+        for size in range(3):
+            placements = [
+                x | o << 8
+                for x in _pairs(self.copies[size])
+                for o in _pairs(self.copies[3 + size])
+                if not _squares(x) & _squares(o)
+            ]
+            self.placements.append(placements)
+            self.ranks.append({p: rank for rank, p in enumerate(placements)})
+        self.size = 2
+        for placements in self.placements:
+            self.size *= len(placements)
+
+    @classmethod
+    def of(cls, position):
+        """The space of the pieces in play in a Position"""
+        copies = [0] * 6
+        for piece in range(12):
+            if position.location(piece) != UNUSED:
+                copies[3 * (piece // 6) + PIECE_SIZE[piece] - 1] += 1
+        return cls(copies)
+
+    def index(self, key):
+        """The index of a canonical key, or None if it is not in the space"""
+        turn = key >> 48
+        if turn > 1:
+            return None
+        index = 0
+        for size in range(3):
+            shift = 8 * size
+            placement = (key >> shift) & 255 | ((key >> (24 + shift)) & 255) << 8
+            rank = self.ranks[size].get(placement)
+            if rank is None:
+                return None
+            index = index * len(self.placements[size]) + rank
+        return 2 * index + turn
+
+    def key(self, index):
+        """The canonical key of an index"""
+        key = (index & 1) << 48
+        index >>= 1
+        for size in [2, 1, 0]:
+            index, rank = divmod(index, len(self.placements[size]))
+            placement = self.placements[size][rank]
+            shift = 8 * size
+            key |= (placement & 255) << shift | (placement >> 8) << (24 + shift)
+        return key
+
+
+def _children(space, index):
+    """The indexes of the children of a position, or None if it is over"""
+    position = position_from_key(space.key(index))
+    if position.winner is not None:
+        return None
+    children = set()
+    for move in position.legal_moves():
+        position.make(*move)
+        children.add(space.index(canonical_key(position)))
+        position.unmake()
+    return sorted(children)
+
+
+def _parents(space, index):
+    """The indexes of every position with a move to this one, found by
+    taking back a move of the player who moved last"""
+    position = position_from_key(space.key(index))
+    mover = 1 - position.turn
+    parents = set()
+    for piece in range(6 * mover, 6 * mover + 6):
+        square = position.location(piece)
+        if square >= 9 or position.top(square) != piece:
+            continue
+        for start in range(IN_HAND + 1):
+            if start == square or (
+                start < 9
+                and TOP_SIZE[(position.occupancy >> (6 * start)) & 63]
+                >= PIECE_SIZE[piece]
+            ):
+                continue
+            locations = position.locations ^ (start ^ square) << (4 * piece)
+            before = Position.from_locations(locations, mover)
+            if before.winner is None and before.is_legal(piece, square):
+                parents.add(space.index(canonical_key(before)))
+    return sorted(parents)
+
+
+# the space of a pool worker
+_space = None
+
+
+def _init_worker(copies):
+    global _space
+    _space = Space(copies)
+
+
+def _map_chunk(args):
+    function, chunk = args
+    return chunk, [function(_space, index) for index in chunk]
+
+
+class _Queue:
+    """Indexes written to a file in order and read back in chunks"""
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._file = open(path, "wb")
+        self._buffer = array("Q")
+
+    def append(self, index):
+        self._buffer.append(index)
+        self.count += 1
+        if len(self._buffer) >= CHUNK:
+            self._flush()
+
+    def _flush(self):
+        self._buffer.tofile(self._file)
+        self._buffer = array("Q")
+
+    def chunks(self):
+        """Yield the indexes in chunks, and remove the file once they are read"""
+        self._flush()
+        self._file.close()
+        with open(self.path, "rb") as f:
+            while True:
+                chunk = array("Q")
+                try:
+                    chunk.fromfile(f, CHUNK)
+                except EOFError:
+                    pass
+                if chunk:
+                    yield chunk
+                if len(chunk) < CHUNK:
+                    break
+        os.remove(self.path)
+
+
+class Retrograde:
+    """One solve, with its working files in a temporary directory inside
+    directory (the system's by default). processes is as for multiprocessing.Pool."""
+
+    def __init__(self, root=None, directory=None, processes=1):
+        root = root or Position()
+        self.space = Space.of(root)
+        self.root = self.space.index(canonical_key(root))
+        # None for every core, 1 for no pool at all
+        self.processes = processes or multiprocessing.cpu_count()
+        self.reached = 0
+        self._directory = tempfile.TemporaryDirectory(dir=directory)
+        self._maps = []
+        # result | distance << 2 of every decided position, see REACHED
+        self.values = self._array("values", "H")
+        # how many children of a position are not known to be won yet
+        self.counts = self._array("counts", "B")
+
+    def _array(self, name, typecode):
+        f = open(os.path.join(self._directory.name, name), "w+b")
+        # the file is sparse, so only the pages that are written take space
+        f.truncate(self.space.size * array(typecode).itemsize)
+        memory = mmap.mmap(f.fileno(), 0)
+        view = memoryview(memory).cast(typecode)
+        self._maps.append((f, memory, view))
+        return view
+
+    def _queue(self, name):
+        return _Queue(os.path.join(self._directory.name, name))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.values = self.counts = None
+        for f, memory, view in self._maps:
+            view.release()
+            memory.close()
+            f.close()
+        self._maps = []
+        self._directory.cleanup()
+
+    def _map(self, pool, function, queue):
+        """Yield (chunk, results) for every chunk of a queue"""
+        chunks = queue.chunks()
+        if pool is None:
+            for chunk in chunks:
+                yield chunk, [function(self.space, index) for index in chunk]
+            return
+        # a few chunks per worker at a time keeps the queue on disk
+        batch = 4 * self.processes
+        while True:
+            tasks = [(function, chunk) for chunk in itertools.islice(chunks, batch)]
+            if not tasks:
+                break
+            yield from pool.map(_map_chunk, tasks)
+
+    def run(self, progress=None):
+        """Solve every position. progress, if given, is called with the stage,
+        the level and the positions on it as each level finishes."""
+        if self.processes == 1:
+            pool = contextlib.nullcontext()
+        else:
+            pool = multiprocessing.Pool(
+                self.processes, _init_worker, (self.space.copies,)
+            )
+        with pool as workers:
+            finished = self._walk(workers, progress)
+            self._retreat(workers, finished, progress)
+
+    def _walk(self, pool, progress):
+        """Reach every position from the root, counting each one's children,
+        and return a queue of the finished games"""
+        values, counts = self.values, self.counts
+        finished = self._queue("finished")
+        level = self._queue("walk-0")
+        values[self.root] = REACHED
+        self.reached = 1
+        level.append(self.root)
+        depth = 0
+        while level.count:
+            following = self._queue("walk-{}".format(depth + 1))
+            for chunk, results in self._map(pool, _children, level):
+                for index, children in zip(chunk, results):
+                    if children is None:
+                        values[index] = LOSS
+                        finished.append(index)
+                        continue
+                    counts[index] = len(children)
+                    for child in children:
+                        if values[child] == UNREACHED:
+                            values[child] = REACHED
+                            following.append(child)
+            self.reached += following.count
+            if progress is not None:
+                progress("walk", depth, level.count)
+            level = following
+            depth += 1
+        return finished
+
+    def _retreat(self, pool, finished, progress):
+        """Work back from the finished games one ply at a time"""
+        values, counts = self.values, self.counts
+        level = finished
+        distance = 0
+        while level.count:
+            following = self._queue("retreat-{}".format(distance + 1))
+            for chunk, results in self._map(pool, _parents, level):
+                for index, parents in zip(chunk, results):
+                    won = values[index] & 3 == WIN
+                    for parent in parents:
+                        if values[parent] != REACHED:
+                            continue
+                        if won:
+                            counts[parent] -= 1
+                            if counts[parent]:
+                                continue
+                            values[parent] = LOSS | (distance + 1) << 2
+                        else:
+                            values[parent] = WIN | (distance + 1) << 2
+                        following.append(parent)
+            if progress is not None:
+                progress("retreat", distance, level.count)
+            level = following
+            distance += 1
+
+    def items(self):
+        """Yield (index, value) for every reached position in index order"""
+        for start in range(0, self.space.size, CHUNK):
+            chunk = self.values[start : start + CHUNK]
+            if not any(chunk):
+                continue
+            for index, value in enumerate(chunk, start):
+                if value == REACHED:
+                    yield index, DRAW
+                elif value != UNREACHED:
+                    yield index, value
+
+    def write(self, path):
+        _write(path, self.space, self.reached, self.items)
+
+
+def _write(path, space, count, items):
+    """Write count entries to path, reading the (index, value) pairs from
+    items() twice, once for the indexes and once for the values"""
+    if sys.byteorder != "little":
+        raise ValueError("Tablebases can only be written on little-endian machines")
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, count, *space.copies))
+        for column, typecode in [(0, "Q"), (1, "H")]:
+            buffer = array(typecode)
+            for item in items():
+                buffer.append(item[column])
+                if len(buffer) >= CHUNK:
+                    buffer.tofile(f)
+                    buffer = array(typecode)
+            buffer.tofile(f)
+
+
+def solve(root=None, directory=None, processes=1):
+    """Solve every position reachable from root (the empty board by default)
+    and return a dict from canonical key to (result, distance). Only for
+    small games, build writes the whole game straight to a file."""
+    with Retrograde(root, directory, processes) as retrograde:
+        retrograde.run()
+        return {
+            retrograde.space.key(index): (value & 3, value >> 2)
+            for index, value in retrograde.items()
+        }
+
+
+def write_tablebase(path, table, root=None):
+    """Write a dict from canonical key to (result, distance) to path, for the
+    pieces in play at root (the empty board by default)"""
+    space = Space.of(root or Position())
+    entries = []
+    for key, (result, distance) in table.items():
+        index = space.index(key)
+        if index is None:
+            raise ValueError("Not a canonical key of the tablebase's pieces", key)
+        entries.append((index, result | distance << 2))
+    entries.sort()
+    _write(path, space, len(entries), lambda: iter(entries))
+
+
+def build(path, root=None, directory=None, processes=1, progress=None):
+    """Solve from root and write the tablebase to path, see Retrograde"""
+    with Retrograde(root, directory, processes) as retrograde:
+        retrograde.run(progress)
+        retrograde.write(path)
+        return retrograde.reached
+
+
+class Tablebase:
+    def __init__(self, path):
+        if sys.byteorder != "little":
+            raise ValueError("Tablebases can only be read on little-endian machines")
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < HEADER.size:
+            self.close()
+            raise ValueError("Not a tablebase file", path)
+        magic, version, count, *copies = HEADER.unpack_from(self._map)
+        if (
+            magic != MAGIC
+            or version != VERSION
+            or len(self._map) != HEADER.size + 10 * count
+        ):
+            self.close()
+            raise ValueError("Not a tablebase file", path)
+        self.space = Space(copies)
+        view = memoryview(self._map)
+        start = HEADER.size
+        self._indexes = view[start : start + 8 * count].cast("Q")
+        start += 8 * count
+        self._values = view[start : start + 2 * count].cast("H")
+
+    def __len__(self):
+        return len(self._indexes)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self._map is None:
+            return
+        self._indexes = self._values = None
+        self._map.close()
+        self._file.close()
+        self._map = None
+
+    def get(self, key):
+        """The (result, distance) stored for a canonical key, or None"""
+        index = self.space.index(key)
+        if index is None:
+            return None
+        i = bisect_left(self._indexes, index)
+        if i == len(self._indexes) or self._indexes[i] != index:
+            return None
+        value = self._values[i]
+        return value & 3, value >> 2
+
+    def lookup(self, position):
+        """The (result, distance) of a Position or Board for the side to move"""
+        return self.get(canonical_key(position))
+
+    def best_move(self, position):
+        """The best (piece, square) move in a Position, or None if the position
+        or its moves are not in the table"""
+        best, best_rank = None, None
+        for move in position.legal_moves():
+            position.make(*move)
+            if position.winner == 1 - position.turn:
+                entry = (LOSS, 0)
+            else:
+                entry = self.lookup(position)
+            position.unmake()
+            if entry is None:
+                continue
+            result, distance = entry
+            # the child's result is for the opponent
+            if result == LOSS:
+                rank = (0, distance)
+            elif result == DRAW:
+                rank = (1, 0)
+            else:
+                rank = (2, -distance)
+            if best_rank is None or rank < best_rank:
+                best, best_rank = move, rank
+        return best
+
+    def best_board_move(self, board):
+        """The best move for a Board as a string like X-2-0-1-1"""
+        if board.game_over:
+            return None
+        locations, turn = locations_of(board)
+        move = self.best_move(Position.from_locations(locations, turn))
+        if move is None:
+            return None
+        return move_string(*move)
@@ -1,3 +1,6 @@
+import collections
+import random
+
 from gobblers.agent import Agent
 from gobblers.board import Board
 
@@ -79,6 +82,25 @@ def test_defend():
     assert agent.check_winning_move() == False
 
 
+def test_defend_swapped_copies():
+    """An agent looking at a position with two copies of a piece swapped
+    plays the copy it is given, not the one it saw before
+    """
+    moves = ["X-1-0-0-0", "O-2-0-2-2", "X-3-0-2-2", "O-1-0-2-1", "X-1-1-0-1"]
+    board = Board()
+    board.replay(moves)
+    agent = Agent(board)
+    assert not agent.threaten()
+
+    # O's other medium is the one under X's large now, with the same hash
+    before = board.hash
+    board.undo(5)
+    board.replay([move.replace("O-2-0", "O-2-1") for move in moves])
+    assert board.hash == before
+    assert agent.defend()
+    assert board.moves[-1] == "O-2-0-0-0"
+
+
 def test_avoid_revealing_win_early():
     """Regression test for previously broken cases
     These are games where O moves a piece to enable an X win
@@ -263,3 +285,40 @@ def test_game_duration_with_defense():
         defending_moves.append(len(board.moves))
 
     assert sum(defending_moves) > sum(winning_moves)
+
+
+def test_seeded_agents_replay():
+    """Agents with the same seed play the same games, without touching the
+    random module"""
+
+    def game(seed):
+        board = Board()
+        players = {
+            "X": Agent(board, rng=random.Random(seed)),
+            "O": Agent(board, rng=random.Random(seed + 1)),
+        }
+        for _ in range(50):
+            if board.game_over:
+                break
+            players[board.next_player].play()
+        return board.moves
+
+    state = random.getstate()
+    assert game(3) == game(3)
+    assert game(3) != game(4)
+    assert random.getstate() == state
+
+
+def test_random_play_is_uniform():
+    """Every legal move is about as likely as any other"""
+    board = Board()
+    board.replay(["X-3-0-1-1", "O-1-0-0-0"])
+    legal = list(board.legal_moves())
+    counts = collections.Counter()
+    agent = Agent(board, rng=random.Random(0))
+    for _ in range(20 * len(legal)):
+        agent.random_play()
+        counts[board.moves[-1]] += 1
+        board.pop()
+    assert len(counts) == len(legal)
+    assert max(counts.values()) < 3 * min(counts.values())
@@ -0,0 +1,83 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from gobblers.batch import BatchSimulator
+from gobblers.board import Board
+from gobblers.position import Position
+
+
+def test_games_replay_on_board():
+    """Every recorded game is legal on a Board and ends the same way"""
+    simulator = BatchSimulator(200, seed=0)
+    records = simulator.run()
+    assert len(records) == 200
+    for moves, winner in records:
+        board = Board()
+        board.replay(moves)
+        assert board.moves == moves
+        if winner in ["X", "O"]:
+            assert board.winner == winner
+        elif winner == "Draw" and board.winner != "Draw":
+            # no legal moves left, which the agents call a draw
+            assert len(list(board.legal_moves())) == 0
+        else:
+            assert winner == board.winner
+
+
+def test_legal_moves_match_position():
+    """The legal move masks agree with Position.is_legal at every step"""
+    simulator = BatchSimulator(30, seed=1)
+    while True:
+        legal = simulator.legal_moves()
+        for game in range(simulator.size):
+            position = Position.from_moves(simulator.records()[game][0])
+            for piece in range(12):
+                for square in range(9):
+                    expected = position.is_legal(piece, square)
+                    if simulator.winner[game] != -1:
+                        expected = False
+                    assert legal[game, piece, square] == expected
+        if not simulator.step():
+            break
+
+
+def test_seed_and_policy():
+    """The same seed gives the same games, and a policy chooses the moves"""
+    first = BatchSimulator(20, seed=5).run()
+    second = BatchSimulator(20, seed=5).run()
+    assert first == second
+
+    def first_legal(simulator, legal):
+        return legal.reshape(len(legal), -1).argmax(axis=1)
+
+    records = BatchSimulator(3, max_plies=4, seed=0).run(first_legal)
+    assert records[0][0] == ["X-1-0-0-0", "O-1-0-0-1", "X-1-0-0-2", "O-1-0-0-0"]
+    assert records[0][1] is None
+
+
+def test_features_and_evaluate():
+    """The batch features and scores match features.py and solver.evaluate"""
+    from gobblers.batch import batch_evaluate, batch_features
+    from gobblers.features import line_features
+    from gobblers.solver import evaluate
+
+    simulator = BatchSimulator(20, seed=3)
+    positions = []
+    for _ in range(12):
+        simulator.step()
+    for moves, _ in simulator.records():
+        positions.append(Position.from_moves(moves))
+    boards = [position.to_board() for position in positions]
+
+    features = batch_features(positions)
+    assert features.shape == (20, 5, 8)
+    assert (batch_features(boards) == features).all()
+    assert (simulator.features() == features).all()
+    for position, rows in zip(positions, features):
+        expected = line_features(position)
+        assert rows.tolist() == expected.visible + [expected.empty] + expected.gobble
+
+    scores = batch_evaluate(positions)
+    assert scores.tolist() == [evaluate(position) for position in positions]
+    assert (simulator.evaluate() == scores).all()
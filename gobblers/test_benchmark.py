@@ -0,0 +1,44 @@
+from gobblers.benchmark import (
+    BENCHMARKS,
+    compare,
+    load_baseline,
+    load_corpus,
+    run_benchmarks,
+    save_baseline,
+)
+from gobblers.replay import replay_games
+import pytest
+
+
+def test_corpus():
+    """The corpus is a fixed set of valid games"""
+    corpus = load_corpus()
+    assert len(corpus) == 200
+    assert all(result.error is None for result in replay_games(corpus))
+
+
+def test_run_and_compare(tmp_path):
+    """Every benchmark reports its rates, and a baseline saved from a faster
+    run flags the slower one as a regression"""
+    corpus = load_corpus()[:5]
+    results = run_benchmarks(repeat=1, corpus=corpus)
+    assert list(results) == list(BENCHMARKS)
+    for result in results.values():
+        assert result["games"] > 0
+        assert result["moves"] > 0
+        assert result["moves_per_s"] == result["moves"] / result["seconds"]
+
+    path = tmp_path / "baseline.json"
+    save_baseline(path, results)
+    baseline = load_baseline(path)
+    assert baseline == results
+    assert compare(results, baseline) == []
+
+    baseline["play"]["moves_per_s"] *= 2
+    regressions = compare(results, baseline, threshold=0.25)
+    assert [regression[0] for regression in regressions] == ["play"]
+    assert regressions[0][3] == pytest.approx(0.5)
+    assert compare(results, baseline, threshold=0.6) == []
+
+    with pytest.raises(ValueError):
+        run_benchmarks(["nope"], corpus=corpus)
@@ -39,28 +39,33 @@ def test_init_gobbler():
     2. the input arg player is 'X' or 'O'
     3. the index is 0 or 1
     4. the string method shows an arrangement of X or O of the correct size in a 3x3 grid
-    5. covered is False
+    5. a gobbler can't be changed and equals the board's piece with its id
     """
     gobbler = Gobbler("X", 1, 0)
     assert gobbler.player == "X"
     assert gobbler.size == 1
     assert gobbler.index == 0
     assert str(gobbler) == "    X    "
-    assert gobbler.covered == False
+    assert gobbler.id == 0
 
     gobbler = Gobbler("O", 2, 0)
     assert gobbler.player == "O"
     assert gobbler.size == 2
     assert gobbler.index == 0
     assert str(gobbler) == "    OO OO"
-    assert gobbler.covered == False
+    assert gobbler.id == 8
 
     gobbler = Gobbler("X", 3, 1)
     assert gobbler.player == "X"
     assert gobbler.size == 3
     assert gobbler.index == 1
     assert str(gobbler) == "XXXXXXXXX"
-    assert gobbler.covered == False
+    assert gobbler.id == 5
+    assert gobbler == Board().find("X", 3, 1)
+    with pytest.raises(AttributeError):
+        gobbler.size = 2
+    with pytest.raises(AttributeError):
+        gobbler.location = (0, 0)
 
     with pytest.raises(ValueError) as e:
         Gobbler("X", 4, 0)
@@ -80,7 +85,7 @@ def test_play():
     1. the move is added to the moves list
     2. the next_player is updated
     3. the state is updated with the move
-    4. the location is updated on the gobbler that was played
+    4. the board's location of the gobbler that was played is updated
     """
     board = Board()
     board.play("X", 1, 0, (0, 0))
@@ -89,7 +94,7 @@ def test_play():
     assert board.next_player == "O"
     gobbler = board.find("X", 1, 0)
     assert board.state[0][0] == [gobbler]
-    assert gobbler.location == (0, 0)
+    assert board.locations[gobbler.id] == (0, 0)
 
     board.play("O", 2, 1, (1, 0))
     assert board.moves == ["X-1-0-0-0", "O-2-1-1-0"]
@@ -157,12 +162,12 @@ def test_prevent_self_loss():
 def test_covering():
     """When a piece is covered
     1. it remains in the state at that location
-    2. the covered attribute is True
+    2. the board marks it as covered
     3. it is not allowed to move
 
     When a piece is uncovered
     1. it remains in the state at that location
-    2. the covered attribute is False
+    2. the board no longer marks it as covered
     3. it is allowed to move
     """
 
@@ -173,7 +178,7 @@ def test_covering():
     second_gobbler = board.find("O", 2, 1)
 
     assert board.state[0][0] == [second_gobbler, first_gobbler]
-    assert first_gobbler.covered == True
+    assert board.covered[first_gobbler.id] == True
 
     with pytest.raises(ValueError) as e:
         board.play("X", 1, 0, (1, 1))
@@ -185,10 +190,10 @@ def test_covering():
     board.play("O", 2, 1, (1, 1))
 
     assert board.state[0][0] == [first_gobbler]
-    assert first_gobbler.covered == False
+    assert board.covered[first_gobbler.id] == False
 
     board.play("X", 1, 0, (2, 0))
-    assert first_gobbler.location == (2, 0)
+    assert board.locations[first_gobbler.id] == (2, 0)
 
 
 def test_print():
@@ -294,7 +299,7 @@ def test_board_after_reflection():
     board.play("X", 1, 0, (0, 0))
 
     board.reflect(0)
-    assert board.state[2][0][0].location == (2, 0)
+    assert board.locations[board.state[2][0][0].id] == (2, 0)
 
 
 def test_replay():
@@ -306,9 +311,217 @@ def test_replay():
 
     assert board.moves == moves
     assert board.state[0][0][1].player == "X"
-    assert board.state[0][0][1].covered == True
-    assert board.state[0][0][1].location == (0, 0)
+    assert board.covered[board.state[0][0][1].id] == True
+    assert board.locations[board.state[0][0][1].id] == (0, 0)
 
     assert board.state[0][0][0].player == "O"
-    assert board.state[0][0][0].covered == False
-    assert board.state[0][0][0].location == (0, 0)
+    assert board.covered[board.state[0][0][0].id] == False
+    assert board.locations[board.state[0][0][0].id] == (0, 0)
+
+
+def test_legal_moves():
+    """board.legal_moves() yields exactly the moves validate_move accepts
+    and board.is_legal agrees with validate_move without raising
+    """
+    board = Board()
+    assert len(list(board.legal_moves())) == 6 * 9
+
+    board.replay(
+        ["X-1-0-0-0", "O-1-0-0-1", "X-1-1-1-0", "O-1-1-1-1", "X-2-0-0-1", "O-2-0-2-1"]
+    )
+    legal = list(board.legal_moves())
+    for piece in board.pieces:
+        for location in [(i, j) for i in range(3) for j in range(3)]:
+            try:
+                board.validate_move(piece, location)
+                valid = True
+            except ValueError:
+                valid = False
+            assert board.is_legal(piece, location) == valid
+            assert ((piece, location) in legal) == valid
+
+    # moving X-2-0 would reveal three in a row for O
+    assert not board.is_legal(board.find("X", 2, 0), (2, 2))
+    assert board.is_legal(board.find("X", 3, 0), (2, 2))
+    assert not board.is_legal(board.find("X", 3, 0), (3, 2))
+
+
+def test_line_counts():
+    """The board keeps count of each player's visible gobblers on every line
+    1. the counts match the visible gobblers after every move
+    2. with check_consistency every win and reveal check is compared to a full scan
+    """
+    from gobblers.agent import Agent
+
+    board = Board()
+    board.play("X", 1, 0, (0, 0))
+    board.play("O", 2, 0, (0, 0))
+    board.play("X", 1, 1, (1, 1))
+    assert board.line_counts["X"] == [0, 1, 0, 0, 1, 0, 1, 1]
+    assert board.line_counts["O"] == [1, 0, 0, 1, 0, 0, 1, 0]
+
+    board.play("O", 2, 0, (2, 2))
+    assert board.line_counts["X"] == [1, 1, 0, 1, 1, 0, 2, 1]
+    assert board.line_counts["O"] == [0, 0, 1, 0, 0, 1, 1, 0]
+
+    for _ in range(20):
+        board = Board(check_consistency=True)
+        agent = Agent(board)
+        agent.play_out()
+        for player in ["X", "O"]:
+            for n, line in enumerate(board.iter_lines()):
+                assert board.line_counts[player][n] == line[1].count(player)
+
+
+def test_push_pop():
+    """board.push plays a move from its notation and board.pop takes it back
+    1. pop returns the move and restores the state, pieces, turn and winner
+    2. undo uses pop, so the gobblers on the board are the same objects
+    """
+    from gobblers.agent import Agent
+
+    for _ in range(20):
+        board = Board(check_consistency=True)
+        Agent(board).play_out()
+        moves = list(board.moves)
+        pieces = list(board.pieces)
+
+        while len(board.moves) > 0:
+            move = board.moves[-1]
+            assert board.pop() == move
+            expected = Board()
+            expected.replay(board.moves)
+            assert board.state == expected.state
+            assert board.next_player == expected.next_player
+            assert board.game_over == expected.game_over
+            assert board.winner == expected.winner
+            assert board.line_counts == expected.line_counts
+            assert board.locations == expected.locations
+            assert board.covered == expected.covered
+        assert list(board.pieces) == pieces
+
+        for move in moves:
+            board.push(move)
+        assert board.moves == moves
+
+    board = Board()
+    board.push("X-1-0-0-0")
+    board.push("O-2-0-0-0")
+    gobbler = board.find("X", 1, 0)
+    assert board.covered[gobbler.id] == True
+    board.undo()
+    assert board.covered[gobbler.id] == False
+    assert board.state[0][0] == [gobbler]
+    assert board.next_player == "O"
+
+
+def test_hash_and_repetition():
+    """The board keeps a zobrist hash of the position
+    1. the same position has the same hash however it was reached
+    2. the hash includes whose turn it is
+    3. the game is a draw when a position comes up for the third time
+    """
+    from gobblers.position import Position
+    from gobblers.zobrist import hash_locations
+
+    board = Board()
+    assert board.hash == 0
+    board.replay(["X-1-0-0-0", "O-1-0-2-2", "X-2-0-1-1"])
+    other = Board()
+    other.replay(["X-2-0-1-1", "O-1-0-2-2", "X-1-0-0-0"])
+    assert board.hash == other.hash
+    assert board.hash == Position.from_moves(board.moves).hash
+    locations = [None] * 12
+    locations[0], locations[2], locations[6] = 0, 4, 8
+    assert board.hash == hash_locations(locations, 1)
+
+    other.undo()
+    other.push("X-1-1-0-0")
+    assert board.hash == other.hash
+    other.undo()
+    assert board.hash != other.hash
+
+    board = Board()
+    shuffle = ["X-1-0-0-0", "O-1-0-2-2", "X-1-0-0-1", "O-1-0-2-1"]
+    board.replay(shuffle + shuffle + ["X-1-0-0-0"])
+    assert not board.game_over
+    board.push("O-1-0-2-2")
+    assert board.game_over
+    assert board.winner == "Draw"
+    board.pop()
+    assert not board.game_over
+    assert board.repetitions[board.hash] == 2
+
+
+def test_copy():
+    """board.copy() gives an independent board in the same position
+    1. playing on the copy does not change the original, and the other way around
+    2. both boards keep the full history and can still take moves back
+    """
+    from gobblers.agent import Agent
+
+    for _ in range(10):
+        board = Board(check_consistency=True)
+        for _ in range(6):
+            Agent(board).random_play()
+        moves = list(board.moves)
+        state = [[list(gobblers) for gobblers in row] for row in board.state]
+        locations = list(board.locations)
+
+        copy = board.copy()
+        assert copy.moves == moves
+        Agent(copy).play_out()
+        assert board.moves == moves
+        assert board.state == state
+        assert board.locations == locations
+
+        expected = Board()
+        expected.replay(copy.moves)
+        assert copy.state == expected.state
+        assert copy.line_counts == expected.line_counts
+        assert copy.covered == expected.covered
+        assert copy.winner == expected.winner
+
+        if not board.game_over:
+            Agent(board).random_play()
+            assert copy.moves == expected.moves
+            assert len(board.moves) == len(moves) + 1
+        while len(copy.moves) > len(moves):
+            copy.pop()
+        assert copy.state == state
+        assert board.moves[: len(moves)] == moves
+
+
+def test_snapshot_restore():
+    """A snapshot can be restored any number of times, after moves are played
+    or taken back, and brings back the position and its history
+    """
+    board = Board()
+    board.replay(["X-1-0-0-0", "O-2-0-0-0", "X-3-0-0-0", "O-1-0-1-1"])
+    snapshot = board.snapshot()
+    expected = Board()
+    expected.replay(board.moves)
+
+    for moves in [["X-1-1-2-2", "O-2-0-2-2"], ["X-3-0-2-2"]]:
+        board.undo(2)
+        for move in moves:
+            board.push(move)
+        board.restore(snapshot)
+        assert board.moves == expected.moves
+        assert board.state == expected.state
+        assert board.locations == expected.locations
+        assert board.covered == expected.covered
+        assert board.line_counts == expected.line_counts
+        assert board.hash == expected.hash
+        assert board.next_player == "X"
+
+    assert board.pop() == "O-1-0-1-1"
+    assert board.pop() == "X-3-0-0-0"
+    assert board.covered[board.find("O", 2, 0).id] == False
+    board.restore(snapshot)
+    assert len(snapshot.moves) == 4
+    assert board.state[0][0] == [
+        board.find("X", 3, 0),
+        board.find("O", 2, 0),
+        board.find("X", 1, 0),
+    ]
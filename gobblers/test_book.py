@@ -0,0 +1,88 @@
+from gobblers.agent import Agent
+from gobblers.board import Board
+from gobblers.book import OpeningBook
+from gobblers.symmetry import transform_move
+import pytest
+
+
+def test_build():
+    """The book keeps the best scoring move of each position
+    and counts symmetric positions together
+    """
+    games = [
+        (["X-3-0-1-1", "O-1-0-0-0"], "X"),
+        (["X-3-0-1-1", "O-1-0-2-2"], "X"),
+        (["X-1-0-0-0", "O-3-0-1-1"], "O"),
+        (["X-1-0-0-2", "O-3-0-1-1"], "Draw"),
+    ]
+    book = OpeningBook.build(games, plies=2)
+    board = Board()
+    assert book.lookup(board) == "X-3-0-1-1"
+
+    # both corner openings are one position, answered by O in the center
+    board.push("X-1-0-2-0")
+    assert book.lookup(board) == "O-3-0-1-1"
+
+    # corner replies to the center are one position too, played twice
+    board = Board()
+    board.push("X-3-0-1-1")
+    assert book.lookup(board) in ["O-1-0-0-0", "O-1-0-0-2", "O-1-0-2-0", "O-1-0-2-2"]
+    assert len(book) == 3
+    assert sorted(entry[3] for entry in book.entries.values()) == [2, 2, 2]
+
+    board.push("O-1-0-0-0")
+    assert book.lookup(board) is None
+
+
+def test_min_games():
+    """Moves played fewer than min_games times are left out before the best
+    one is picked, so a lucky one-off does not hide a well played move"""
+    games = [(["X-3-0-1-1"], "X")] + [(["X-1-0-0-0"], "X")] * 3
+    games += [(["X-1-0-0-0"], "O")] * 2
+    book = OpeningBook.build(games, plies=1, min_games=2)
+    assert len(book) == 1
+    assert book.lookup(Board()) == "X-1-0-0-0"
+    assert book.entries[next(iter(book.entries))][3:] == (5, 6)
+
+    assert OpeningBook.build(games, plies=1).lookup(Board()) == "X-3-0-1-1"
+    assert len(OpeningBook.build(games, plies=1, min_games=6)) == 0
+
+
+def test_save_load_and_symmetry(tmp_path, play_games):
+    """A saved book loads the same and its moves work on any image of a position"""
+    games = [(board.moves, board.winner) for board in play_games(30)]
+    book = OpeningBook.build(games, plies=6)
+    path = tmp_path / "book.gbk"
+    book.save(path)
+    loaded = OpeningBook.load(path)
+    assert loaded.entries == book.entries
+    assert loaded.plies == 6
+
+    for moves, _ in games:
+        for transform in range(8):
+            board = Board()
+            board.replay([transform_move(move, transform) for move in moves[:5]])
+            move = loaded.lookup(board)
+            assert move is not None
+            board.push(move)
+
+    with open(path, "r+b") as f:
+        f.truncate(30)
+    with pytest.raises(ValueError):
+        OpeningBook.load(path)
+
+
+def test_agent_uses_book():
+    """The agent plays book moves for the first plies and then its own"""
+    games = [(["X-2-0-0-1", "O-2-0-1-0", "X-2-1-1-1", "O-3-0-1-1"], "O")]
+    book = OpeningBook.build(games, plies=3)
+    board = Board()
+    x = Agent(board, book=book)
+    o = Agent(board, book=book)
+    x.play()
+    o.play()
+    x.play()
+    assert board.moves == ["X-2-0-0-1", "O-2-0-1-0", "X-2-1-1-1"]
+    assert not o.book_play()
+    o.play()
+    assert len(board.moves) == 4
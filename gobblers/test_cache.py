@@ -0,0 +1,109 @@
+import pickle
+import random
+
+from gobblers.agent import Agent
+from gobblers.board import Board
+from gobblers.cache import (
+    SEARCH_MOVE,
+    THREAT_MOVE,
+    EvaluationCache,
+    SharedCache,
+    position_key,
+)
+from gobblers.position import Position
+from gobblers.tournament import run_tournament
+import pytest
+
+
+def test_position_key():
+    """A Board and its Position share a key, and kinds keep results apart"""
+    board = Board()
+    board.replay(["X-2-0-1-1", "O-3-0-0-0", "X-1-0-2-2"])
+    position = Position.from_board(board)
+    assert position_key(board) == position_key(position) == position.key
+    assert position_key(board, SEARCH_MOVE) != position_key(board, THREAT_MOVE)
+
+    # swapping the copies of a piece hashes the same but is another key
+    other = Board()
+    other.replay(["X-2-1-1-1", "O-3-0-0-0", "X-1-0-2-2"])
+    assert other.hash == board.hash
+    assert position_key(other) != position_key(board)
+
+
+def test_lru_eviction():
+    """The least recently used entry goes first, and every lookup is counted"""
+    cache = EvaluationCache(2)
+    cache.put(1, "a")
+    cache.put(2, "b")
+    assert cache.get(1) == "a"
+    cache.put(3, "c")
+    assert 2 not in cache
+    assert cache.get(2) is None
+    assert cache.get_or_compute(3, lambda: "never") == "c"
+    assert cache.get_or_compute(4, lambda: "d") == "d"
+    assert len(cache) == 2
+    assert cache.stats() == {
+        "size": 2,
+        "entries": 2,
+        "hits": 2,
+        "misses": 2,
+        "evictions": 2,
+    }
+
+    with pytest.raises(ValueError):
+        EvaluationCache(0)
+
+
+def test_agent_cache():
+    """An agent with a cache plays the same games as one without"""
+    cache = EvaluationCache(1000)
+    for seed in range(5):
+        games = []
+        for agent_cache in [None, cache]:
+            board = Board()
+            agent = Agent(board, cache=agent_cache, rng=random.Random(seed))
+            agent.play_out()
+            games.append(board.moves)
+        assert games[0] == games[1]
+    assert cache.hits > 0
+    assert cache.misses == len(cache)
+
+
+def test_shared_cache():
+    """Entries show in every copy of a shared cache, and a full bucket
+    evicts its least recently used slot"""
+    with SharedCache(8) as cache:
+        assert cache.size == 8
+        cache.put(1, -5)
+        copy = pickle.loads(pickle.dumps(cache))
+        assert copy.get(1) == -5
+        copy.put(2, 7)
+        assert cache.get(2) == 7
+        copy.close()
+
+        for key in range(100, 200):
+            cache.put(key, key)
+        assert cache.evictions > 0
+        assert len(cache) == cache.size
+        # the last key stored is still there
+        assert cache.get(199) == 199
+        cache.clear()
+        assert len(cache) == 0
+
+
+def test_shared_cache_pool():
+    """Pool workers fill one shared cache and the games do not change"""
+    plain = run_tournament("heuristic", "heuristic", 6, processes=1, seed=2)
+    with SharedCache(1 << 12) as cache:
+        pooled = run_tournament(
+            "heuristic", "heuristic", 6, processes=2, seed=2, cache=cache
+        )
+        assert pooled == plain
+        assert len(cache) > 0
+        # this process never played, so every lookup is a hit
+        again = run_tournament(
+            "heuristic", "heuristic", 6, processes=1, seed=2, cache=cache
+        )
+        assert again == plain
+        assert cache.misses == 0
+        assert cache.hits > 0
@@ -0,0 +1,116 @@
+from gobblers import database as database_module
+from gobblers.board import Board
+from gobblers.database import ENTRY, GameDatabase
+from gobblers.position import Position
+from gobblers.records import write_records
+from gobblers.symmetry import transform_move
+import pytest
+
+
+def test_add_and_find(tmp_path, play_games):
+    """Every stored game can be found from any position it passed through
+    1. find gives the game and ply, also for symmetric images of the position
+    2. stats counts each game once, by how it ended
+    3. the moves read back from the memory map match
+    """
+    path = tmp_path / "games.gbr"
+    games = [(board.moves, board.winner) for board in play_games(30)]
+    with GameDatabase(path) as database:
+        for moves, winner in games:
+            database.add_game(moves, winner)
+        assert len(database) == 30
+
+        for game, (moves, winner) in enumerate(games):
+            assert database.game(game) == moves
+            assert database.winner(game) == winner
+            for ply in range(len(moves) + 1):
+                position = Position.from_moves(moves[:ply])
+                assert (game, ply) in database.find(position)
+            mirrored = Position.from_moves([transform_move(m, 5) for m in moves])
+            assert (game, len(moves)) in database.find(mirrored)
+
+        stats = database.stats(Board())
+        assert stats["games"] == 30
+        assert stats["X"] + stats["O"] + stats["Draw"] + stats["unfinished"] == 30
+        assert stats["X"] == sum(winner == "X" for _, winner in games)
+
+        with pytest.raises(ValueError):
+            database.add_game(["X-1-0-0-0", "X-1-1-0-1"])
+        assert len(database) == 30
+
+
+def test_reopen_and_append(tmp_path, play_games):
+    """A database reopens with the same index and keeps growing"""
+    path = tmp_path / "games.gbr"
+    games = [(board.moves, board.winner) for board in play_games(10)]
+    with GameDatabase(path) as database:
+        for moves, winner in games[:5]:
+            database.add_game(moves, winner)
+        stats = database.stats(Position())
+        found = database.find(Position.from_moves(games[4][0]))
+
+    with GameDatabase(path) as database:
+        assert len(database) == 5
+        assert database.stats(Position()) == stats
+        assert database.find(Position.from_moves(games[4][0])) == found
+        for moves, winner in games[5:]:
+            database.add_game(moves, winner)
+        assert database.game(9) == games[9][0]
+
+    # half written log entries of an unfinished game are dropped
+    with open(str(path) + ".log", "ab") as f:
+        f.write(ENTRY.pack(123, 10, 0) + b"\x01\x02")
+    with GameDatabase(path) as database:
+        assert len(database) == 10
+        assert 123 not in database._log_index
+        database.add_game(games[0][0], games[0][1])
+        found = database.find(Position.from_moves(games[0][0]))
+        assert found[-1] == (10, len(games[0][0]))
+
+    records = tmp_path / "more.gbr"
+    write_records(records, [moves for moves, _ in games])
+    with GameDatabase(path) as database:
+        assert database.add_records(records) == 10
+        assert len(database) == 21
+
+
+def test_merge(tmp_path, play_games, monkeypatch):
+    """A full log is written out as an index segment, and the newest
+    segments are merged while they are of a similar size. Every game can
+    still be found, also after reopening the database
+    """
+    monkeypatch.setattr(database_module, "LOG_LIMIT", 100)
+    path = tmp_path / "games.gbr"
+    games = [(board.moves, board.winner) for board in play_games(45)]
+    with GameDatabase(path) as database:
+        for moves, winner in games:
+            database.add_game(moves, winner)
+        stats = database.stats(Board())
+        assert stats["games"] == 45
+        # some games went into the index, the last few are still in the log
+        assert 0 < database._indexed_games < 45
+        assert 0 < len(database._log_entries) < 100
+        sizes = [len(segment) for segment in database._segments]
+        assert len(sizes) == 2
+        assert sizes[0] >= 2 * sizes[1]
+
+    with GameDatabase(path) as database:
+        assert database.stats(Board()) == stats
+        # stop the merge before it deletes the second of the segments
+        with monkeypatch.context() as patch:
+            patch.setattr(database_module.os, "remove", lambda path: None)
+            database.merge()
+        assert database._indexed_games == 45
+        assert database._log_entries == []
+        assert len(database._segments) == 2
+    assert len(list(tmp_path.glob("games.gbr.idx.*"))) == 3
+
+    with GameDatabase(path) as database:
+        assert len(database._segments) == 2
+        assert database.stats(Board()) == stats
+        for game, (moves, winner) in enumerate(games):
+            for ply in range(len(moves) + 1):
+                position = Position.from_moves(moves[:ply])
+                assert database.find(position).count((game, ply)) == 1
+    assert len(list(tmp_path.glob("games.gbr.idx.*"))) == 2
+    assert (tmp_path / "games.gbr.log").stat().st_size == 0
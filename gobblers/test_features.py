@@ -0,0 +1,50 @@
+from gobblers.board import Board
+from gobblers.features import largest_free, line_features
+from gobblers.position import IN_HAND, UNUSED, Position, packed
+
+
+def test_line_features(play_games):
+    """The features match counting the squares of Board.iter_lines, for a
+    Board and for the same Position
+    """
+    for board in play_games(20, "random_play", max_moves=30):
+        features = line_features(board)
+        position = Position.from_board(board)
+        assert line_features(position) == features
+        assert packed(board) == packed(position)
+        locations, occupancy, _ = packed(board)
+        free = [largest_free(locations, occupancy, player) for player in [0, 1]]
+        for n, (_, visible, actual) in enumerate(board.iter_lines()):
+            assert features.visible[0][n] == visible.count("X")
+            assert features.visible[1][n] == visible.count("O")
+            assert features.empty[n] == visible.count(None)
+            for player, other in [(0, "O"), (1, "X")]:
+                assert features.gobble[player][n] == sum(
+                    1
+                    for gobblers in actual
+                    if gobblers
+                    and gobblers[0].player == other
+                    and gobblers[0].size < free[player]
+                )
+
+
+def test_largest_free():
+    """Pieces in hand and on top of a stack can move, covered ones can't"""
+    board = Board()
+    locations, occupancy, _ = packed(board)
+    assert largest_free(locations, occupancy, 0) == 3
+    board.replay(["X-3-0-0-0", "O-1-0-1-1", "X-3-1-1-1"])
+    locations, occupancy, turn = packed(board)
+    assert turn == 1
+    assert largest_free(locations, occupancy, 0) == 3
+    assert largest_free(locations, occupancy, 1) == 3
+
+    # X has no big pieces, and its medium pieces are covered or out of the game
+    pieces = {2: 0, 3: UNUSED, 4: UNUSED, 5: UNUSED, 10: 0}
+    locations = sum(pieces.get(piece, IN_HAND) << (4 * piece) for piece in range(12))
+    position = Position.from_locations(locations)
+    assert largest_free(locations, position.occupancy, 0) == 1
+    assert largest_free(locations, position.occupancy, 1) == 3
+    features = line_features(position)
+    assert features.visible[1] == [1, 0, 0, 1, 0, 0, 1, 0]
+    assert features.gobble[0] == [0] * 8
@@ -0,0 +1,55 @@
+import json
+
+from gobblers import instrument
+from gobblers.__main__ import main
+from gobblers.agent import Agent
+from gobblers.board import Board
+
+
+def test_counts_calls_and_restores_methods():
+    """Calls, time and exceptions are counted only while enabled"""
+    play = Board.play
+    with instrument.instrumented():
+        assert Board.play is not play
+        board = Board()
+        board.push("X-1-0-0-0")
+        board.push("O-1-0-1-1")
+        try:
+            board.validate_move(board.find("X", 1, 1), (0, 0))
+        except ValueError:
+            pass
+        list(board.iter_lines())
+        board.undo()
+        board.replay(["X-1-0-1-1"])
+    assert Board.play is play
+    assert not instrument.enabled()
+
+    methods = instrument.snapshot()["methods"]
+    assert methods["Board.push"]["calls"] == 2
+    assert methods["Board.play"]["calls"] == 3
+    # every play validates its move, plus the rejected probe
+    assert methods["Board.validate_move"]["calls"] == 4
+    assert methods["Board.validate_move"]["exceptions"] == 1
+    assert methods["Board.iter_lines"]["calls"] == 1
+    assert methods["Board.undo"]["calls"] == 1
+    assert methods["Board.replay"]["calls"] == 1
+    assert methods["Board.play"]["seconds"] > 0
+
+    Board().push("X-1-0-0-0")
+    assert instrument.snapshot()["methods"]["Board.push"]["calls"] == 2
+
+
+def test_agent_and_json(tmp_path):
+    """Agent strategies are counted too, and the CLI writes a JSON snapshot"""
+    with instrument.instrumented():
+        Agent(Board()).play_out()
+    methods = instrument.snapshot()["methods"]
+    assert methods["Agent.play"]["calls"] > 0
+    assert methods["Board._check_win"]["calls"] >= methods["Board.play"]["calls"]
+
+    path = tmp_path / "stats.json"
+    arguments = ["--stats", str(path), "simulate", "--games", "2"]
+    assert main(arguments + ["--output", str(tmp_path / "games.jsonl")]) == 0
+    stats = json.loads(path.read_text())
+    assert stats["methods"]["Agent.play"]["calls"] > 0
+    assert not instrument.enabled()
@@ -0,0 +1,90 @@
+import json
+
+from gobblers.__main__ import main
+from gobblers.position import ALL_IN_HAND, PIECE_SIZE, UNUSED, Position
+from gobblers.records import iter_records, write_records
+from gobblers.tablebase import DRAW, Tablebase
+
+
+def test_simulate_jsonl_and_binary(tmp_path, capsys):
+    """simulate writes one JSON line per game, or the same games as records"""
+    assert main(["simulate", "--games", "5", "--agent", "random", "--seed", "3"]) == 0
+    lines = capsys.readouterr().out.splitlines()
+    games = [json.loads(line) for line in lines]
+    assert sorted(game["game"] for game in games) == list(range(5))
+    for game in games:
+        assert game["length"] == len(game["moves"])
+        assert game["winner"] in ["X", "O", "Draw", None]
+
+    path = tmp_path / "games.gbr"
+    arguments = ["simulate", "--games", "5", "--agent", "random", "--seed", "3"]
+    assert main(arguments + ["--format", "binary", "--output", str(path)]) == 0
+    assert list(iter_records(path)) == [game["moves"] for game in games]
+
+
+def test_replay(tmp_path, capsys):
+    """replay checks record and JSONL files and fails on an invalid game"""
+    games = [["X-1-0-0-0", "O-1-0-1-1"], ["X-1-0-0-0", "O-1-0-0-0"], []]
+    path = tmp_path / "games.gbr"
+    write_records(path, games)
+    assert main(["replay", str(path)]) == 1
+    captured = capsys.readouterr()
+    results = [json.loads(line) for line in captured.out.splitlines()]
+    assert [result["error"] for result in results] == [
+        None,
+        "Illegal move: O-1-0-0-0",
+        None,
+    ]
+    assert "3 games checked, 1 invalid" in captured.err
+
+    path = tmp_path / "games.jsonl"
+    path.write_text(
+        json.dumps(games[0]) + "\n" + json.dumps({"moves": games[1]}) + "\n"
+    )
+    assert main(["replay", str(path), "--errors-only"]) == 1
+    results = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [result["game"] for result in results] == [1]
+
+    path.write_text("X-1-0-0-0\n")
+    assert main(["replay", str(path)]) == 2
+
+
+def test_bench(tmp_path, capsys):
+    """bench reports games and moves per second for each stage and for each
+    corpus benchmark, and flags the ones slower than a baseline"""
+    path = tmp_path / "baseline.json"
+    argv = ["bench", "--games", "3", "--agent", "random", "--repeat", "1"]
+    assert main(argv + ["play", "undo", "--save", str(path)]) == 0
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    stages = [line for line in lines if "stage" in line]
+    assert [stage["stage"] for stage in stages] == ["simulate", "replay"]
+    for stage in stages:
+        assert stage["games"] == 3
+        assert stage["moves_per_s"] > 0
+    assert [line.get("benchmark") for line in lines[2:]] == ["play", "undo"]
+
+    baseline = json.loads(path.read_text())
+    baseline["results"]["play"]["moves_per_s"] *= 100
+    path.write_text(json.dumps(baseline))
+    assert main(argv + ["play", "--baseline", str(path)]) == 1
+    assert "play regressed" in capsys.readouterr().err
+    assert main(argv + ["nope"]) == 2
+
+
+def test_tablebase(tmp_path, capsys):
+    """tablebase solves the game with the given sizes into a file"""
+    path = tmp_path / "small.gtb"
+    assert main(["tablebase", str(path), "--sizes", "1"]) == 0
+    assert "396 positions written" in capsys.readouterr().err
+    locations = ALL_IN_HAND
+    for piece in range(12):
+        if PIECE_SIZE[piece] > 1:
+            locations |= UNUSED << (4 * piece)
+    with Tablebase(path) as tablebase:
+        assert len(tablebase) == 396
+        # two pieces each never make a line
+        assert tablebase.lookup(Position.from_locations(locations)) == (DRAW, 0)
+        # the full game is not in it
+        assert tablebase.lookup(Position()) is None
+
+    assert main(["tablebase", str(path), "--sizes", "4"]) == 2
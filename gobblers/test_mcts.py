@@ -0,0 +1,77 @@
+from gobblers.agent import Agent
+from gobblers.board import Board
+from gobblers.mcts import MCTSAgent, _resolve
+from gobblers.position import move_string
+import random
+import time
+import pytest
+
+
+def test_takes_win():
+    """With a winning move on the board the search plays it"""
+    board = Board()
+    board.replay(["X-1-0-0-0", "O-1-0-1-0", "X-1-1-0-1", "O-1-1-1-1"])
+    agent = MCTSAgent(board, iterations=500, rng=random.Random(0))
+    agent.play()
+    assert board.winner == "X"
+
+
+def test_blocks():
+    """When the opponent threatens to win the search blocks"""
+    board = Board()
+    board.replay(["X-1-0-0-0", "O-1-0-1-1", "X-1-1-0-1"])
+    agent = MCTSAgent(board, iterations=1000, rng=random.Random(0))
+    agent.play()
+    assert not Agent(board).check_winning_move()
+
+
+def test_budget_and_tree_reuse():
+    """The search runs for its budget and keeps its tree between moves
+    1. a number of iterations adds exactly that many visits to the root
+    2. after a reply, the new root is the old grandchild with its visits
+    3. a time limit stops the search
+    4. the board is only changed by the chosen move
+    """
+    board = Board()
+    agent = MCTSAgent(board, iterations=300, rng=random.Random(1))
+    agent.play()
+    assert agent.root.visits == 300
+    assert len(board.moves) == 1
+
+    # reply with the move the search expected most
+    played = max(agent.root.children, key=lambda child: child.visits)
+    reply = max(played.children, key=lambda child: child.visits)
+    position, _ = agent._position()
+    board.push(move_string(*_resolve(position, reply.move)))
+    visits = reply.visits
+    agent.search()
+    assert agent.root is reply
+    assert agent.root.visits == visits + 300
+    assert agent.root.parent is None
+
+    agent = MCTSAgent(board, iterations=None, time_limit=0.1)
+    start = time.perf_counter()
+    agent.search()
+    assert time.perf_counter() - start < 0.5
+    assert len(board.moves) == 2
+
+    with pytest.raises(ValueError):
+        MCTSAgent(board, iterations=None)
+
+
+def test_beats_random():
+    """Against random moves the search wins most games"""
+    wins = 0
+    for seed in range(6):
+        board = Board()
+        agent = MCTSAgent(board, iterations=200, rng=random.Random(seed))
+        opponent = Agent(board, rng=random.Random(seed + 100))
+        for _ in range(50):
+            if board.game_over:
+                break
+            if board.next_player == "X":
+                agent.play()
+            else:
+                opponent.random_play()
+        wins += board.winner == "X"
+    assert wins >= 4
@@ -0,0 +1,134 @@
+from gobblers.board import Board
+from gobblers.position import (
+    DRAW,
+    IN_HAND,
+    X,
+    Position,
+    move_string,
+    parse_move,
+    piece_id,
+)
+import pytest
+
+
+def test_piece_ids():
+    """Piece ids follow the order of board.pieces and moves round trip"""
+    board = Board()
+    for i, piece in enumerate(board.pieces):
+        assert piece_id(piece.player, piece.size, piece.index) == i
+
+    assert parse_move("X-2-0-1-1") == (2, 4)
+    assert move_string(2, 4) == "X-2-0-1-1"
+    assert move_string(*parse_move("O-3-1-2-0")) == "O-3-1-2-0"
+
+    with pytest.raises(ValueError):
+        parse_move("Z-2-0-1-1")
+    with pytest.raises(ValueError):
+        parse_move("X-2-0-1-3")
+
+
+def test_round_trip(play_games):
+    """A position converts losslessly to and from a board"""
+    for board in play_games(10, "random_play"):
+        position = Position.from_board(board)
+        assert position.to_moves() == board.moves
+
+        copy = position.to_board()
+        assert copy.moves == board.moves
+        assert copy.winner == board.winner
+        for square in range(9):
+            x, y = divmod(square, 3)
+            expected = [(g.player, g.size, g.index) for g in board.state[x][y]]
+            stack = [
+                (p.player, p.size, p.index)
+                for p in [board.pieces[piece] for piece in position.stack(square)]
+            ]
+            assert stack == expected
+
+
+def test_win_matches_board(play_games):
+    """The winner found by the masks is the same as the board's"""
+    for board in play_games(20, "random_play"):
+        position = Position.from_board(board)
+        if board.winner in ["X", "O"]:
+            assert position.winner == ["X", "O"].index(board.winner)
+        elif board.winner == "Draw":
+            # the agent calls a draw itself when it has no legal move
+            assert position.winner in [None, DRAW]
+        else:
+            assert position.winner is None
+
+
+def test_legal_moves_match_board(play_games):
+    """Every move the board accepts is legal and every other move is not"""
+    for board in play_games(5, "random_play"):
+        replay = Board()
+        position = Position()
+        for move in board.moves:
+            for piece in replay.pieces:
+                for square in range(9):
+                    location = divmod(square, 3)
+                    try:
+                        replay.validate_move(piece, location)
+                        valid = True
+                    except ValueError:
+                        valid = False
+                    index = replay.pieces.index(piece)
+                    assert position.is_legal(index, square) == valid
+
+            legal = set(position.legal_moves())
+            piece, square = parse_move(move)
+            if (
+                piece % 2 == 1
+                and position.location(piece) == IN_HAND
+                and position.location(piece - 1) == IN_HAND
+            ):
+                assert (piece - 1, square) in legal
+            else:
+                assert (piece, square) in legal
+
+            player, size, index, x, y = move.split("-")
+            replay.play(player, int(size), int(index), (int(x), int(y)))
+            position.make(piece, square)
+
+
+def test_make_unmake(play_games):
+    """Unmaking every move returns to the starting position"""
+    for board in play_games(10, "random_play"):
+        position = Position.from_board(board)
+        snapshots = []
+        replay = Position()
+        for move in board.moves:
+            snapshots.append(
+                (replay.locations, replay.occupancy, list(replay.visible), replay.turn)
+            )
+            replay.make(*parse_move(move))
+        assert replay.locations == position.locations
+
+        while replay.history:
+            replay.unmake()
+            expected = snapshots.pop()
+            assert (
+                replay.locations,
+                replay.occupancy,
+                replay.visible,
+                replay.turn,
+            ) == expected
+        assert replay.winner is None
+        assert replay.key == Position().key
+
+
+def test_covering_and_reveal():
+    """Covered pieces cannot move and lifting a piece cannot reveal a line"""
+    position = Position.from_moves(
+        ["X-1-0-0-0", "O-1-0-0-1", "X-1-1-1-0", "O-1-1-1-1", "X-2-0-0-1", "O-2-0-2-1"]
+    )
+    assert position.top(1) == piece_id("X", 2, 0)
+    assert not position.is_legal(piece_id("X", 2, 0), 8)
+    assert position.is_legal(piece_id("X", 3, 0), 8)
+
+    position = Position.from_moves(["X-1-0-0-0", "O-2-0-0-0"])
+    assert position.stack(0) == [piece_id("O", 2, 0), piece_id("X", 1, 0)]
+    assert position.turn == X
+    assert not position.is_legal(piece_id("X", 1, 0), 4)
+    assert position.visible == [0, 1]
@@ -0,0 +1,58 @@
+from gobblers.records import (
+    MAGIC,
+    RecordWriter,
+    decode_moves,
+    encode_moves,
+    iter_raw_records,
+    iter_records,
+    write_records,
+)
+import pytest
+
+
+def test_encode_decode(play_games):
+    """Every move is one byte and converts back to the same notation"""
+    assert encode_moves(["X-1-0-0-0", "X-2-0-1-1", "O-3-1-2-2"]) == bytes(
+        [0x00, 0x24, 0xB8]
+    )
+    for moves in [board.moves for board in play_games(20)]:
+        data = encode_moves(moves)
+        assert len(data) == len(moves)
+        assert decode_moves(data) == moves
+
+    with pytest.raises(ValueError):
+        encode_moves(["X-4-0-0-0"])
+    with pytest.raises(ValueError):
+        decode_moves(bytes([0x09]))
+
+
+def test_stream(tmp_path, play_games):
+    """Games written to a file stream back in order, even in tiny chunks,
+    and writing to an existing file appends to it
+    """
+    path = tmp_path / "games.gbr"
+    games = [board.moves for board in play_games(30)]
+    assert write_records(path, games[:10]) == 10
+    with RecordWriter(path) as writer:
+        for moves in games[10:]:
+            writer.write(moves)
+        writer.write([])
+
+    assert list(iter_records(path)) == games + [[]]
+    assert list(iter_records(path, chunk_size=3)) == games + [[]]
+    assert next(iter_raw_records(path)) == encode_moves(games[0])
+
+    with open(path, "rb") as f:
+        data = f.read()
+    assert data.startswith(MAGIC)
+    assert len(data) == len(MAGIC) + sum(len(moves) + 1 for moves in games) + 1
+
+    with open(path, "ab") as f:
+        f.write(encode_moves(games[0]))
+    with pytest.raises(ValueError):
+        list(iter_records(path))
+
+    with open(path, "wb") as f:
+        f.write(b"X-1-0-0-0\n")
+    with pytest.raises(ValueError):
+        list(iter_records(path))
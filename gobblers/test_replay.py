@@ -0,0 +1,58 @@
+from gobblers.records import write_records
+from gobblers.replay import Replayer, replay_games, replay_record_file
+
+
+def test_replayer_reuses_prefix():
+    """Games sharing an opening only replay the moves after it"""
+    replayer = Replayer()
+    assert replayer.check(["X-1-0-0-0", "O-1-0-1-1", "X-2-0-2-2"]) is None
+    position = replayer.position
+    assert replayer.check(["X-1-0-0-0", "O-1-0-1-1", "X-1-1-2-2"]) is None
+    assert replayer.position is position
+    assert replayer.moves == ["X-1-0-0-0", "O-1-0-1-1", "X-1-1-2-2"]
+    assert len(position.history) == 3
+
+    error, ply = replayer.check(["X-1-0-0-0", "O-1-0-0-0"])
+    assert error == "Illegal move: O-1-0-0-0"
+    assert ply == 1
+    assert replayer.check([]) is None
+    assert position.history == []
+
+
+def test_replay_games(play_games):
+    """Every game gets a result in order, bad games get their error and ply"""
+    boards = play_games(20)
+    games = [board.moves for board in boards]
+    bad = list(games[3])
+    bad.insert(2, bad[0])
+    games[3] = bad
+    games[7] = games[7][:2] + ["X-9-0-0-0"]
+    finished = next(i for i, board in enumerate(boards) if board.winner in ["X", "O"])
+    games.append(boards[finished].moves + ["X-1-0-0-0"])
+
+    results = list(replay_games(games, batch_size=6))
+    assert [result.game for result in results] == list(range(21))
+    for result, board in zip(results, boards):
+        if result.game in [3, 7]:
+            continue
+        assert result.error is None
+        assert result.ply == len(board.moves)
+        if board.winner in ["X", "O"]:
+            assert result.winner == board.winner
+    assert results[3].error.startswith("Illegal move")
+    assert results[3].ply == 2
+    assert results[7].error == "Could not parse move: X-9-0-0-0"
+    assert results[7].ply == 2
+    assert results[20].error.startswith("Move after the end of the game")
+
+    assert list(replay_games(games, processes=2, batch_size=6)) == results
+
+
+def test_replay_record_file(tmp_path, play_games):
+    """A record file is checked as a stream"""
+    games = [board.moves for board in play_games(10)]
+    path = tmp_path / "games.gbr"
+    write_records(path, games)
+    results = list(replay_record_file(path, batch_size=4))
+    assert len(results) == 10
+    assert all(result.error is None for result in results)
@@ -0,0 +1,197 @@
+import asyncio
+import concurrent.futures
+import json
+import os
+
+from gobblers.board import Board
+from gobblers.server import GameServer
+import pytest
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_human_against_agent():
+    """The agent answers every human move before the response is sent,
+    and bad requests get an error instead of a response"""
+
+    async def main():
+        server = GameServer(concurrent.futures.ThreadPoolExecutor(2))
+        state = await server.handle({"op": "new", "x": "human", "o": "heuristic"})
+        assert state["ok"] and state["moves"] == [] and state["next_player"] == "X"
+        session = state["session"]
+
+        state = await server.handle(
+            {"op": "move", "session": session, "move": "X-1-0-1-1", "id": 7}
+        )
+        assert state["id"] == 7
+        assert len(state["moves"]) == 2 and state["next_player"] == "X"
+
+        error = await server.handle(
+            {"op": "move", "session": session, "move": "O-1-0-0-0"}
+        )
+        assert not error["ok"]
+        assert error["error"] == "It is not O's turn"
+        for request in [
+            {"op": "move", "session": 99, "move": "X-1-0-0-0"},
+            {"op": "fly"},
+            {"op": "new", "x": "wizard"},
+            [],
+            # fields of the wrong type
+            {"op": ["new"]},
+            {"op": "state", "session": [session]},
+            {"op": "state", "session": True},
+            {"op": "new", "x": ["random"]},
+            {"op": "new", "seed": "abc"},
+            {"op": "new", "seed": 1.5},
+        ]:
+            assert not (await server.handle(request))["ok"]
+        error = await server.handle({"op": "new", "seed": "abc"})
+        assert error["error"] == "seed must be an integer abc"
+        assert len(server.sessions) == 1
+
+        metrics = await server.handle({"op": "metrics", "session": session})
+        assert metrics["human"]["moves"] == 1
+        assert metrics["agent"]["moves"] == 1
+        assert metrics["agent"]["max_ms"] >= metrics["agent"]["p50_ms"] > 0
+
+        assert (await server.handle({"op": "close", "session": session}))["ok"]
+        assert not (await server.handle({"op": "state", "session": session}))["ok"]
+        server.close()
+
+    run(main())
+
+
+def test_many_agent_games():
+    """Agent-vs-agent games play in the background, all at once, and the same
+    seed gives the same game, even with the agents sharing threads"""
+
+    async def main():
+        server = GameServer(concurrent.futures.ThreadPoolExecutor(4), max_moves=50)
+        sessions = []
+        for game in range(40):
+            state = await server.handle(
+                {"op": "new", "x": "random", "o": "random", "seed": game % 20}
+            )
+            sessions.append(state["session"])
+        states = [
+            await server.handle({"op": "state", "session": session, "wait": True})
+            for session in sessions
+        ]
+        for state in states:
+            board = Board()
+            board.replay(state["moves"])
+            assert board.moves == state["moves"]
+            assert state["game_over"] or len(state["moves"]) == 50
+        assert [state["moves"] for state in states[:20]] == [
+            state["moves"] for state in states[20:]
+        ]
+
+        metrics = await server.handle({"op": "metrics"})
+        assert metrics["sessions"] == 40
+        assert metrics["agent"]["moves"] == sum(len(s["moves"]) for s in states)
+        server.close()
+
+    run(main())
+
+
+def test_agent_failures():
+    """A failed agent move gets an error response, leaves the session on the
+    agent's turn and is tried again by the next request"""
+
+    async def main():
+        server = GameServer(concurrent.futures.ThreadPoolExecutor(2))
+        state = await server.handle({"op": "new", "x": "human", "o": "heuristic"})
+        session = state["session"]
+
+        server.executor.shutdown()
+        error = await server.handle(
+            {"op": "move", "session": session, "move": "X-1-0-1-1"}
+        )
+        assert not error["ok"]
+        assert error["error"].startswith("The agent could not move RuntimeError")
+        state = server.sessions[session].state()
+        assert state["moves"] == ["X-1-0-1-1"]
+        assert state["agent_error"] is not None
+
+        server.executor = concurrent.futures.ThreadPoolExecutor(2)
+        state = await server.handle({"op": "state", "session": session})
+        assert state["ok"] and len(state["moves"]) == 2
+        assert state["agent_error"] is None
+
+        # agent-vs-agent games keep the error, and a state request resumes them
+        server.executor.shutdown()
+        state = await server.handle({"op": "new", "x": "random", "o": "random"})
+        request = {"op": "state", "session": state["session"], "wait": True}
+        state = await server.handle(request)
+        assert state["ok"] and state["moves"] == []
+        assert state["agent_error"] is not None
+        metrics = await server.handle({"op": "metrics"})
+        assert metrics["agent_failures"] == 2
+
+        server.executor = concurrent.futures.ThreadPoolExecutor(2)
+        state = await server.handle(request)
+        assert state["game_over"] or len(state["moves"]) == server.max_moves
+        assert state["agent_error"] is None
+        server.close()
+
+    run(main())
+
+
+def test_broken_pool():
+    """A process pool with a dead worker is replaced"""
+
+    async def main():
+        server = GameServer(workers=1)
+        state = await server.handle({"op": "new", "x": "human", "o": "random"})
+        session = state["session"]
+        broken = server.executor
+        with pytest.raises(concurrent.futures.process.BrokenProcessPool):
+            broken.submit(os._exit, 1).result()
+
+        move = {"op": "move", "session": session, "move": "X-1-0-1-1"}
+        error = await server.handle(move)
+        assert "BrokenProcessPool" in error["error"]
+        assert server.executor is not broken
+        state = await server.handle({"op": "state", "session": session})
+        assert state["ok"] and len(state["moves"]) == 2
+        server.close()
+
+    run(main())
+
+
+def test_socket(tmp_path):
+    """The protocol works over a Unix socket with a process pool, one JSON
+    object per line"""
+
+    async def main():
+        server = GameServer(workers=1)
+        listener = await server.start(path=str(tmp_path / "gobblers.sock"))
+        reader, writer = await asyncio.open_unix_connection(
+            str(tmp_path / "gobblers.sock")
+        )
+
+        async def ask(request):
+            writer.write(json.dumps(request).encode() + b"\n")
+            await writer.drain()
+            return json.loads(await reader.readline())
+
+        state = await ask({"op": "new", "x": "heuristic", "o": "human", "seed": 3})
+        assert state["ok"] and len(state["moves"]) == 1
+        move = "O-3-0-1-1" if state["moves"] != ["X-3-0-1-1"] else "O-3-0-0-0"
+        state = await ask({"op": "move", "session": state["session"], "move": move})
+        assert state["ok"] and len(state["moves"]) == 3
+
+        writer.write(b"not json\n")
+        await writer.drain()
+        assert json.loads(await reader.readline()) == {
+            "ok": False,
+            "error": "Not a JSON line",
+        }
+        writer.close()
+        listener.close()
+        await listener.wait_closed()
+        server.close()
+
+    run(main())
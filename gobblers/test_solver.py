@@ -0,0 +1,90 @@
+from gobblers import solver as solver_module
+from gobblers.board import Board
+from gobblers.position import Position
+from gobblers.solver import CLOCK_MASK, WIN, WIN_THRESHOLD, Solver, best_move
+import time
+import pytest
+
+
+def test_immediate_win():
+    """When there is a winning move the solver finds it with a winning score"""
+    board = Board()
+    board.replay(["X-1-0-0-0", "O-1-0-1-0", "X-1-1-0-1", "O-1-1-1-1"])
+    move, score = best_move(board, depth=2)
+    assert move.endswith("0-2")
+    assert score == WIN - 1
+
+    board.push(move)
+    assert board.winner == "X"
+
+
+def test_block():
+    """When the opponent threatens to win the solver blocks"""
+    position = Position.from_moves(["X-1-0-0-0", "O-1-0-1-1", "X-1-1-0-1"])
+    move, score = Solver().search(position, depth=2)
+    assert score > -WIN_THRESHOLD
+
+    position.make(*move)
+    move, score = Solver().search(position, depth=1)
+    assert score < WIN_THRESHOLD
+
+
+def test_forced_loss():
+    """A double threat is scored as a loss for the player to move"""
+    position = Position.from_moves(
+        ["X-3-0-0-0", "O-1-0-0-1", "X-3-1-1-1", "O-1-1-1-0", "X-2-0-2-0"]
+    )
+    # X threatens to finish both diagonals and O cannot cover 0-0 or 1-1
+    move, score = Solver().search(position, depth=3)
+    assert score < -WIN_THRESHOLD
+
+
+def test_errors():
+    """The solver needs a limit and a game that is not over"""
+    position = Position()
+    with pytest.raises(ValueError):
+        Solver().search(position)
+
+    board = Board()
+    board.replay(["X-1-0-0-0", "O-1-0-1-0", "X-1-1-0-1", "O-1-1-1-1", "X-2-0-0-2"])
+    with pytest.raises(ValueError):
+        best_move(board, depth=2)
+
+
+def test_time_limit_and_table_size():
+    """The search stops close to its time limit and the table stays bounded"""
+    solver = Solver(table_size=1000)
+    position = Position.from_moves(["X-1-0-1-1"])
+    start = time.perf_counter()
+    move, score = solver.search(position, time_limit=0.2)
+    assert time.perf_counter() - start < 1
+    assert move is not None
+    assert len(solver.table) <= 1000
+    # the position is left as it was
+    assert position.to_moves() == ["X-1-0-1-1"]
+
+    for time_limit in [0.01, 0.05]:
+        start = time.perf_counter()
+        move, score = Solver().search(Position(), time_limit=time_limit)
+        assert time.perf_counter() - start < 2 * time_limit + 0.05
+        assert move is not None
+
+
+def test_deadline_checks(monkeypatch):
+    """The clock is read at least every CLOCK_MASK + 1 nodes, so a search
+    stops within that many nodes of its deadline"""
+    solver = Solver()
+    reads = []
+
+    class Clock:
+        @staticmethod
+        def perf_counter():
+            reads.append(solver.nodes)
+            # the deadline passes once 5000 nodes are searched
+            return 0 if solver.nodes < 5000 else 10
+
+    monkeypatch.setattr(solver_module, "time", Clock)
+    move, _ = solver.search(Position(), time_limit=1)
+    assert move is not None
+    assert max(b - a for a, b in zip(reads, reads[1:])) <= CLOCK_MASK + 1
+    assert 5000 <= solver.nodes <= 5000 + CLOCK_MASK + 1
@@ -0,0 +1,71 @@
+from gobblers.agent import Agent
+from gobblers.board import Board
+from gobblers.position import LINES, Position
+from gobblers.symmetry import (
+    INVERSES,
+    PERMUTATIONS,
+    canonical,
+    canonical_key,
+    transform_move,
+)
+
+
+def test_permutations():
+    """There are 8 different transforms and each one sends lines to lines"""
+    assert PERMUTATIONS[0] == list(range(9))
+    assert len(set(tuple(p) for p in PERMUTATIONS)) == 8
+    lines = set(frozenset(line) for line in LINES)
+    for t, permutation in enumerate(PERMUTATIONS):
+        assert sorted(permutation) == list(range(9))
+        for line in lines:
+            assert frozenset(permutation[s] for s in line) in lines
+        inverse = PERMUTATIONS[INVERSES[t]]
+        assert [inverse[permutation[s]] for s in range(9)] == list(range(9))
+
+
+def test_reflections_match_board():
+    """Board.reflect(i) is transform 4 + i"""
+    board = Board()
+    agent = Agent(board)
+    for _ in range(6):
+        agent.random_play()
+    moves = list(board.moves)
+    for i in range(4):
+        assert [board._reflect_move(m, i) for m in moves] == [
+            transform_move(m, 4 + i) for m in moves
+        ]
+
+
+def test_canonical():
+    """Equivalent positions have the same canonical key
+    1. all 8 images of a game give the same key
+    2. the transform returned sends the position to the canonical image
+    3. swapping the two copies of a piece gives the same key
+    4. different positions have different keys
+    """
+    for _ in range(10):
+        board = Board()
+        agent = Agent(board)
+        for _ in range(8):
+            agent.random_play()
+        key, transform = canonical(board)
+        assert canonical_key(Position.from_board(board)) == key
+
+        image = Position.from_moves(
+            [transform_move(move, transform) for move in board.moves]
+        )
+        assert canonical(image) == (key, 0)
+
+        for t in range(8):
+            image = Position.from_moves([transform_move(m, t) for m in board.moves])
+            assert canonical_key(image) == key
+
+    first = Position.from_moves(["X-1-0-0-0", "O-1-0-2-2", "X-1-1-1-1"])
+    second = Position.from_moves(["X-1-1-0-0", "O-1-1-2-2", "X-1-0-1-1"])
+    assert canonical_key(first) == canonical_key(second)
+
+    corner = Position.from_moves(["X-1-0-0-0"])
+    edge = Position.from_moves(["X-1-0-0-1"])
+    center = Position.from_moves(["X-1-0-1-1"])
+    assert len({canonical_key(p) for p in [corner, edge, center]}) == 3
+    assert canonical_key(corner) != canonical_key(Position.from_moves(["X-2-0-0-0"]))
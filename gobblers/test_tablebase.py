@@ -0,0 +1,146 @@
+from gobblers.agent import Agent
+from gobblers.board import Board
+from gobblers.position import ALL_IN_HAND, UNUSED, Position, locations_of
+from gobblers.symmetry import canonical_key
+from gobblers.tablebase import (
+    DRAW,
+    LOSS,
+    WIN,
+    Space,
+    Tablebase,
+    build,
+    position_from_key,
+    solve,
+    write_tablebase,
+)
+import random
+import pytest
+
+
+def small_game():
+    """X plays with two small pieces and a medium one, O with two small ones"""
+    locations = ALL_IN_HAND
+    for piece in [3, 4, 5, 8, 9, 10, 11]:
+        locations = locations & ~(15 << (4 * piece)) | UNUSED << (4 * piece)
+    return Position.from_locations(locations)
+
+
+@pytest.fixture(scope="module")
+def small_table():
+    return solve(small_game())
+
+
+def test_solve_is_consistent(small_table):
+    """Every result follows from the results of the position's children
+    1. a win has a child that is lost in one ply fewer, and none quicker
+    2. a loss has only won children and lasts as long as the longest of them
+    3. a draw has no lost children and at least one drawn child
+    """
+    assert small_table[canonical_key(small_game())] == (WIN, 5)
+    for key, (result, distance) in small_table.items():
+        position = position_from_key(key)
+        children = []
+        for move in position.legal_moves():
+            position.make(*move)
+            children.append(small_table[canonical_key(position)])
+            position.unmake()
+
+        if position.winner is not None:
+            assert (result, distance) == (LOSS, 0)
+        elif result == WIN:
+            assert min(d for r, d in children if r == LOSS) == distance - 1
+        elif result == LOSS:
+            assert all(r == WIN for r, d in children)
+            assert max(d for r, d in children) == distance - 1
+        else:
+            assert all(r != LOSS for r, d in children)
+            assert len(children) == 0 or any(r == DRAW for r, d in children)
+
+
+def test_space():
+    """Every canonical key has an index and the index gives the key back"""
+    space = Space()
+    assert space.size == 2 * 1423**3
+    board = Board()
+    for move in ["X-3-0-1-1", "O-1-0-0-0", "X-2-0-0-0", "O-3-1-2-2"]:
+        board.push(move)
+        key = canonical_key(board)
+        assert space.key(space.index(key)) == key
+    assert space.index(12345) is None
+
+    small = Space.of(small_game())
+    assert small.copies == (2, 1, 0, 2, 0, 0)
+    for index in range(small.size):
+        assert small.index(small.key(index)) == index
+
+
+def test_pool_and_work_directory(small_table, tmp_path):
+    """A pool of workers gives the same table, and the working files go
+    away when the solve is done"""
+    assert solve(small_game(), directory=tmp_path, processes=2) == small_table
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_file_round_trip(small_table, tmp_path):
+    """The table is written sorted and read back through a memory map"""
+    path = tmp_path / "small.gtb"
+    write_tablebase(path, small_table, small_game())
+    with Tablebase(path) as tablebase:
+        assert len(tablebase) == len(small_table)
+        for key, value in small_table.items():
+            assert tablebase.get(key) == value
+        assert tablebase.get(12345) is None
+        assert tablebase.lookup(small_game()) == (WIN, 5)
+
+    with open(path, "wb") as f:
+        f.write(b"nonsense" * 4)
+    with pytest.raises(ValueError):
+        Tablebase(path)
+
+
+def test_perfect_play(small_table, tmp_path):
+    """Following the table wins within the stored distance against any defence"""
+    path = tmp_path / "small.gtb"
+    assert build(path, small_game()) == len(small_table)
+    tablebase = Tablebase(path)
+    for _ in range(20):
+        position = small_game()
+        for ply in range(5):
+            if position.turn == 0:
+                move = tablebase.best_move(position)
+            else:
+                move = random.choice(list(position.legal_moves()))
+            position.make(*move)
+            if position.game_over:
+                break
+        assert position.winner == 0
+    tablebase.close()
+
+
+def test_agent_perfect_play(tmp_path):
+    """An agent with a tablebase plays the table's best move,
+    and falls back to its other strategies when the position is missing
+    """
+    board = Board()
+    board.replay(["X-1-0-0-0", "O-1-0-1-0", "X-1-1-0-1", "O-1-1-1-1"])
+    position = Position.from_locations(*locations_of(board))
+    table = {}
+    for move in position.legal_moves():
+        position.make(*move)
+        if position.game_over:
+            table[canonical_key(position)] = (LOSS, 0)
+        else:
+            table[canonical_key(position)] = (DRAW, 0)
+        position.unmake()
+    path = tmp_path / "board.gtb"
+    write_tablebase(path, table)
+
+    agent = Agent(board, Tablebase(path))
+    assert agent.perfect_play()
+    assert board.winner == "X"
+
+    board = Board()
+    agent = Agent(board, Tablebase(path))
+    assert not agent.perfect_play()
+    agent.play()
+    assert len(board.moves) == 1
@@ -0,0 +1,104 @@
+import random
+
+from gobblers.agent import Agent
+from gobblers.board import Board
+from gobblers.position import Position
+from gobblers.threats import analyze, win_squares, winning_moves
+
+
+def wins_by_search(position):
+    wins = []
+    for piece, square in position.legal_moves():
+        position.make(piece, square)
+        if position.winner == 1 - position.turn:
+            wins.append((piece, square))
+        position.unmake()
+    return wins
+
+
+def blocks_by_search(position):
+    blocks = []
+    for move in position.legal_moves():
+        position.make(*move)
+        if position.winner is None and not wins_by_search(position):
+            blocks.append(move)
+        position.unmake()
+    return blocks
+
+
+def test_matches_search():
+    """Wins and blocks are the same as trying every move on a Position,
+    and the analysis leaves the position as it was
+    """
+    rng = random.Random(1)
+    for _ in range(50):
+        position = Position()
+        for _ in range(30):
+            if position.winner is not None:
+                break
+            key, history = position.key, list(position.history)
+            report = analyze(position)
+            assert position.key == key and position.history == history
+
+            assert sorted(report.wins) == sorted(wins_by_search(position))
+            assert winning_moves(position) == report.wins
+            if report.threats:
+                assert sorted(report.blocks) == sorted(blocks_by_search(position))
+            else:
+                assert report.blocks == []
+            assert set(report.double_threats) <= set(position.legal_moves())
+
+            legal = list(position.legal_moves())
+            if not legal:
+                break
+            position.make(*rng.choice(legal))
+
+
+def test_moving_a_covering_piece_wins():
+    """O wins by moving the big piece at (2, 2) off its own small one,
+    which still shows O on the bottom row
+    """
+    moves = [
+        "X-2-0-1-2",
+        "O-3-0-2-1",
+        "X-3-1-0-0",
+        "O-2-1-1-0",
+        "X-1-1-2-0",
+        "O-1-0-2-2",
+        "X-2-1-2-0",
+        "O-3-1-2-2",
+        "X-3-1-1-0",
+    ]
+    board = Board()
+    board.replay(moves)
+    assert winning_moves(board) == [(11, 6)]
+    assert win_squares(board) == 1 << 6
+
+    assert Agent(board).check_winning_move()
+    assert board.moves[-1] == "O-3-1-2-0"
+    assert board.winner == "O"
+
+
+def test_blocks_and_double_threats():
+    """Every block leaves the opponent without a win, and a double threat
+    leaves two squares to win on"""
+    board = Board()
+    board.replay(["X-1-0-0-0", "O-1-0-1-0", "X-1-1-0-1"])
+    report = analyze(board)
+    assert report.wins == []
+    assert {square for _, square in report.threats} == {2}
+    assert len(report.blocks) > 0
+    for piece, square in report.blocks:
+        gobbler = board.pieces[piece]
+        copy = board.copy()
+        copy.play(gobbler.player, gobbler.size, gobbler.index, divmod(square, 3))
+        assert winning_moves(copy) == []
+
+    # X playing in the corner at (0, 2) threatens both (0, 1) and (2, 2)
+    board = Board()
+    board.replay(["X-1-0-0-0", "O-1-0-1-0", "X-1-1-1-2", "O-1-1-2-1"])
+    report = analyze(board)
+    assert report.wins == [] and report.threats == []
+    assert (2, 2) in report.double_threats
+    board.play("X", 2, 0, (0, 2))
+    assert win_squares(board, 0) == 1 << 1 | 1 << 8
@@ -0,0 +1,54 @@
+from gobblers.board import Board
+from gobblers.tournament import (
+    play_game,
+    run_tournament,
+    summarize,
+    wilson_interval,
+)
+import pytest
+
+
+def test_play_game():
+    """A game records its winner, length and moves, and replays to the same end"""
+    result = play_game("heuristic", "random", seed=7)
+    assert result.length == len(result.moves)
+    board = Board()
+    board.replay(result.moves)
+    assert board.moves == result.moves
+    if board.game_over:
+        assert board.winner == result.winner
+
+    assert play_game("heuristic", "random", seed=7) == result
+
+    with pytest.raises(ValueError):
+        play_game("nobody", "random", seed=7)
+
+
+def test_tournament_is_reproducible():
+    """The same seed gives the same games with one process or several"""
+    single = run_tournament("heuristic", "random", 12, processes=1, seed=3)
+    pooled = run_tournament("heuristic", "random", 12, processes=2, seed=3)
+    assert single == pooled
+    assert [result.game for result in single] == list(range(12))
+    assert len(set(result.seed for result in single)) == 12
+
+    other = run_tournament("heuristic", "random", 12, processes=1, seed=4)
+    assert other != single
+
+
+def test_summary():
+    """The summary counts every outcome and gives intervals around the rates"""
+    results = run_tournament("heuristic", "random", 20, processes=1)
+    summary = summarize(results)
+    assert summary["games"] == 20
+    total = (
+        summary["x_wins"] + summary["o_wins"] + summary["draws"] + summary["unfinished"]
+    )
+    assert total == 20
+    low, high = summary["x_wins_interval"]
+    assert low <= summary["x_wins_rate"] <= high
+
+    assert wilson_interval(0, 0) == (0.0, 1.0)
+    low, high = wilson_interval(50, 100)
+    assert low == pytest.approx(0.4038, abs=1e-3)
+    assert high == pytest.approx(0.5962, abs=1e-3)
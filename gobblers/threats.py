@@ -0,0 +1,181 @@
+"""Find wins, forced blocks and double threats from the line masks.
+
+Everything here works on the packed locations and occupancy of a Position
+or Board (see position.packed) and never changes the position it is given.
+A move is followed through the visible masks directly: lifting a piece
+shows whatever it covered, so a piece that covers one of its own can move
+off a line and still leave that line complete. The piece's size and the
+sizes on top of the other squares say where it can go.
+
+Moves are (piece, square) pairs numbered as in position.py. As in
+Position.legal_moves, only the first copy of a piece is offered while both
+copies are in hand.
+"""
+from collections import namedtuple
+
+from gobblers.position import (
+    IN_HAND,
+    PIECE_BIT,
+    PIECE_INDEX,
+    PIECE_SIZE,
+    TOP_PLAYER,
+    TOP_SIZE,
+    UNUSED,
+    WINNING,
+    packed,
+)
+from gobblers.solver import COMPLETIONS, POPCOUNT
+
+ThreatReport = namedtuple(
+    "ThreatReport", ["wins", "threats", "blocks", "double_threats"]
+)
+
+# the squares of each bit of a 9 bit mask
+MASK_SQUARES = [
+    [square for square in range(9) if mask & (1 << square)] for mask in range(512)
+]
+
+
+def _squares(occupancy, visible=None, open_to=None, squares=range(9)):
+    """The visible masks of both players, and for every size the squares a
+    piece of that size can be played on. Given the masks from before a move,
+    only the squares the move changed need to be looked at again."""
+    visible = [0, 0] if visible is None else list(visible)
+    open_to = [0, 0, 0, 0] if open_to is None else list(open_to)
+    for square in squares:
+        mask = 1 << square
+        bits = (occupancy >> (6 * square)) & 63
+        visible[0] &= ~mask
+        visible[1] &= ~mask
+        player = TOP_PLAYER[bits]
+        if player is not None:
+            visible[player] |= mask
+        top = TOP_SIZE[bits]
+        for size in [1, 2, 3]:
+            if size > top:
+                open_to[size] |= mask
+            else:
+                open_to[size] &= ~mask
+    return visible, open_to
+
+
+def _lifts(locations, occupancy, player, visible, open_to):
+    """Yield (piece, mine, targets) for every piece a player can move: the
+    player's visible mask once the piece is picked up, and the squares it
+    can go to"""
+    for piece in range(6 * player, 6 * player + 6):
+        start = (locations >> (4 * piece)) & 15
+        mine = visible[player]
+        targets = open_to[PIECE_SIZE[piece]]
+        if start == UNUSED:
+            continue
+        if start == IN_HAND:
+            if (
+                PIECE_INDEX[piece] == 1
+                and (locations >> (4 * (piece - 1))) & 15 == IN_HAND
+            ):
+                continue
+        else:
+            bits = (occupancy >> (6 * start)) & 63
+            if TOP_SIZE[bits] != PIECE_SIZE[piece]:
+                # covered
+                continue
+            lifted = 1 << start
+            mine &= ~lifted
+            below = TOP_PLAYER[bits ^ PIECE_BIT[piece]]
+            if below == player:
+                mine |= lifted
+            elif below is not None and WINNING[visible[below] | lifted]:
+                continue
+            targets &= ~lifted
+        yield piece, mine, targets
+
+
+def _make(locations, occupancy, piece, square):
+    """The packed locations and occupancy after a move"""
+    start = (locations >> (4 * piece)) & 15
+    bit = PIECE_BIT[piece]
+    if start != IN_HAND:
+        occupancy ^= bit << (6 * start)
+    occupancy |= bit << (6 * square)
+    locations ^= (start ^ square) << (4 * piece)
+    return locations, occupancy
+
+
+def _wins(locations, occupancy, player, visible, open_to):
+    # picking a piece up never adds to a player's visible squares, so there
+    # is no win without a line that is one square short already
+    if COMPLETIONS[visible[player]] == 0:
+        return []
+    return [
+        (piece, square)
+        for piece, mine, targets in _lifts(
+            locations, occupancy, player, visible, open_to
+        )
+        for square in MASK_SQUARES[COMPLETIONS[mine] & targets]
+    ]
+
+
+def winning_moves(position, player=None):
+    """Every move that wins at once for a player, the side to move by default.
+    For the other player it is the moves it would win with if it were to move."""
+    if position.winner is not None:
+        return []
+    locations, occupancy, turn = packed(position)
+    if player is None:
+        player = turn
+    return _wins(locations, occupancy, player, *_squares(occupancy))
+
+
+def win_squares(position, player=None):
+    """A 9 bit mask of the squares a player could win on with one move"""
+    mask = 0
+    for _, square in winning_moves(position, player):
+        mask |= 1 << square
+    return mask
+
+
+def analyze(position):
+    """A ThreatReport for the side to move of a Position or Board:
+
+    - wins, the moves that win at once
+    - threats, the moves the opponent would win with if it were to move
+    - blocks, when there are threats, the moves that leave the opponent
+      without a win
+    - double_threats, the moves that leave the opponent without a win and
+      leave two or more squares to win on next move
+    """
+    if position.winner is not None:
+        return ThreatReport([], [], [], [])
+    locations, occupancy, player = packed(position)
+    visible, open_to = _squares(occupancy)
+    wins = []
+    threats = _wins(locations, occupancy, 1 - player, visible, open_to)
+    blocks = []
+    double_threats = []
+    for piece, lifted, targets in _lifts(
+        locations, occupancy, player, visible, open_to
+    ):
+        for square in MASK_SQUARES[targets]:
+            mine = lifted | (1 << square)
+            if WINNING[mine]:
+                wins.append((piece, square))
+                continue
+            # only look further when there is something to block, or when
+            # the move leaves two squares that would complete a line
+            if not threats and POPCOUNT[COMPLETIONS[mine]] < 2:
+                continue
+            start = (locations >> (4 * piece)) & 15
+            after = _make(locations, occupancy, piece, square)
+            changed = [square] if start == IN_HAND else [start, square]
+            masks = _squares(after[1], visible, open_to, changed)
+            if _wins(*after, 1 - player, *masks):
+                continue
+            if threats:
+                blocks.append((piece, square))
+            squares = 0
+            for _, target in _wins(*after, player, *masks):
+                squares |= 1 << target
+            if POPCOUNT[squares] >= 2:
+                double_threats.append((piece, square))
+    return ThreatReport(wins, threats, blocks, double_threats)
@@ -0,0 +1,172 @@
+"""Self-play tournaments spread over a multiprocessing pool.
+
+Every game gets its own seed, derived from the tournament seed and the
+game's number, so a tournament gives the same games however many processes
+play it and in whatever order they finish. Each player of a game draws
+from its own random.Random, seeded from the game's seed, and nothing uses
+the random module's global state, so games can also be played side by side
+in threads.
+
+A cache (see cache.py) given to a tournament is shared by every agent of a
+process; a SharedCache is shared by the whole pool.
+"""
+from collections import namedtuple
+import math
+import multiprocessing
+import random
+
+from gobblers.agent import Agent
+from gobblers.board import Board
+from gobblers.cache import SEARCH_MOVE, position_key
+from gobblers.mcts import MCTSAgent
+from gobblers.position import PLAYERS, move_string, parse_move
+from gobblers.solver import Solver, best_move
+
+GameResult = namedtuple("GameResult", ["game", "seed", "winner", "length", "moves"])
+
+
+# the search depth of the solver strategy
+SOLVER_DEPTH = 3
+# cached by the solver strategy when the search found no move
+NO_MOVE = -1
+
+
+def _random(board, rng, cache=None):
+    return Agent(board, rng=rng).random_play
+
+
+def _heuristic(board, rng, cache=None):
+    return Agent(board, cache=cache, rng=rng).play
+
+
+def _mcts(board, rng, cache=None):
+    return MCTSAgent(board, iterations=200, rng=rng).play
+
+
+def _solver(board, rng, cache=None):
+    solver = Solver()
+
+    def search():
+        move, _ = best_move(board, depth=SOLVER_DEPTH, solver=solver)
+        if move is None:
+            return NO_MOVE
+        piece, square = parse_move(move)
+        return 9 * piece + square
+
+    def play():
+        if cache is None:
+            move = search()
+        else:
+            move = cache.get_or_compute(position_key(board, SEARCH_MOVE), search)
+        if move == NO_MOVE:
+            Agent(board, rng=rng).random_play()
+        else:
+            board.push(move_string(*divmod(move, 9)))
+
+    return play
+
+
+# each strategy takes a board, a random.Random and an optional cache and
+# returns a function that plays one move on the board
+STRATEGIES = {
+    "random": _random,
+    "heuristic": _heuristic,
+    "mcts": _mcts,
+    "solver": _solver,
+}
+
+
+def game_seed(seed, game):
+    """The seed for one game of a tournament"""
+    return random.Random(seed * 1000003 + game).getrandbits(32)
+
+
+def player_rng(seed, player):
+    """The random.Random of one player of a game, so neither player's moves
+    depend on how many numbers the other drew"""
+    return random.Random(game_seed(seed, PLAYERS.index(player)))
+
+
+def play_game(x, o, seed, max_moves=50, game=0, cache=None):
+    """Play one game between two strategy names and return a GameResult"""
+    if x not in STRATEGIES or o not in STRATEGIES:
+        raise ValueError("Unknown strategy, pick from", sorted(STRATEGIES))
+    board = Board()
+    players = {
+        "X": STRATEGIES[x](board, player_rng(seed, "X"), cache),
+        "O": STRATEGIES[o](board, player_rng(seed, "O"), cache),
+    }
+    for _ in range(max_moves):
+        if board.game_over:
+            break
+        players[board.next_player]()
+    return GameResult(game, seed, board.winner, len(board.moves), list(board.moves))
+
+
+# the cache of a pool worker, handed over once rather than with every game
+_worker_cache = None
+
+
+def _init_worker(cache):
+    global _worker_cache
+    _worker_cache = cache
+
+
+def _play_game(args):
+    return play_game(*args, cache=_worker_cache)
+
+
+def play_games(x, o, games, processes=None, seed=0, max_moves=50, cache=None):
+    """Yield the GameResult of every game as it finishes.
+    processes=1 plays in this process, None uses every core."""
+    tasks = [(x, o, game_seed(seed, game), max_moves, game) for game in range(games)]
+    if processes == 1:
+        for task in tasks:
+            yield play_game(*task, cache=cache)
+        return
+
+    processes = processes or multiprocessing.cpu_count()
+    # big chunks keep the workers busy without much back and forth
+    chunksize = max(1, games // (processes * 4))
+    with multiprocessing.Pool(processes, _init_worker, (cache,)) as pool:
+        for result in pool.imap_unordered(_play_game, tasks, chunksize):
+            yield result
+
+
+def run_tournament(x, o, games, processes=None, seed=0, max_moves=50, cache=None):
+    """Play every game and return the results in game order"""
+    results = list(play_games(x, o, games, processes, seed, max_moves, cache))
+    results.sort(key=lambda result: result.game)
+    return results
+
+
+def wilson_interval(successes, trials, z=1.96):
+    """A confidence interval for a rate, 95% by default"""
+    if trials == 0:
+        return 0.0, 1.0
+    rate = successes / trials
+    denominator = 1 + z * z / trials
+    center = (rate + z * z / (2 * trials)) / denominator
+    spread = (
+        z * math.sqrt(rate * (1 - rate) / trials + z * z / (4 * trials * trials))
+    ) / denominator
+    return max(0.0, center - spread), min(1.0, center + spread)
+
+
+def summarize(results, z=1.96):
+    """Count the outcomes and give each one's rate with a confidence interval"""
+    results = list(results)
+    counts = {"X": 0, "O": 0, "Draw": 0, None: 0}
+    for result in results:
+        counts[result.winner] += 1
+    games = len(results)
+    summary = {
+        "games": games,
+        "mean_length": sum(r.length for r in results) / games if games else 0.0,
+    }
+    for name, winner in [("x_wins", "X"), ("o_wins", "O"), ("draws", "Draw")]:
+        summary[name] = counts[winner]
+        summary[name + "_rate"] = counts[winner] / games if games else 0.0
+        summary[name + "_interval"] = wilson_interval(counts[winner], games, z)
+    summary["unfinished"] = counts[None]
+    return summary
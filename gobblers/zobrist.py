@@ -0,0 +1,29 @@
+"""Zobrist keys for hashing positions.
+
+Every position is fully described by where each of the 12 pieces is (the
+stack order on a square follows from the sizes) and whose turn it is. The
+hash of a position is the xor of one key for every piece on the board, with
+``SIDE_KEY`` mixed in when it is O's turn. Pieces in hand contribute nothing,
+so the empty board with X to move hashes to 0. The two copies of a piece
+share their keys, so swapping them does not change the hash.
+
+The keys come from a fixed seed, so hashes are stable between processes and
+can be stored on disk.
+"""
+import random
+
+_rng = random.Random(20230601)
+
+# PIECE_KEYS[piece][square] with pieces and squares numbered as in position.py
+_keys = [[_rng.getrandbits(64) for _ in range(9)] for _ in range(6)]
+PIECE_KEYS = [_keys[piece // 2] for piece in range(12)]
+SIDE_KEY = _rng.getrandbits(64)
+
+
+def hash_locations(locations, turn):
+    """Hash a list of 12 piece locations (None or IN_HAND for pieces in hand)"""
+    value = SIDE_KEY if turn else 0
+    for piece, square in enumerate(locations):
+        if square is not None and 0 <= square < 9:
+            value ^= PIECE_KEYS[piece][square]
+    return value
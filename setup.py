@@ -6,7 +6,11 @@ setup(
     name='gobblers',
     version='0.0.1',
     packages=find_packages(),
+    package_data={'gobblers': ['corpus.gbr']},
     install_requires=[ ],
+    extras_require={
+        'numpy': ['numpy']
+    },
     entry_points={
         'console_scripts': [
             'gobblers = gobblers.__main__:main'